@@ -30,6 +30,15 @@ def get_marks(args):
 
 args = parse_args(PARSER)
 shape = shape_from_args(args)
+shape.use_symmetry = args.symmetry
+shape.stream_points = args.stream_points
+shape.clip_cells = args.clip_cells
+shape.reuse_structure = args.reuse_structure
+shape.warm_start_filter = args.warm_start
+shape.memoized_face_translations.max_bytes = None if args.cache_mb <= 0 else args.cache_mb*2**20
+shape.memoized_voronoi_diagrams.max_entries = None if args.diagram_cache_size <= 0 else args.diagram_cache_size
+if args.cache_dir is not None:
+    shape.load_translation_cache(args.cache_dir)
 marks = get_marks(args)
 
 if args.center_pt:
@@ -54,5 +63,10 @@ shape.interactive_vornoi_plot(diameter=args.diameter if args.diameter > 0 else N
                               do_filter=do_filter,
                               font_size=args.font_size,
                               ignore_points_on_locus=args.ignore_points,
+                              prune_face_paths=args.prune_paths,
+                              bound_distance=args.bound_distance,
+                              auto_diameter=args.auto_diameter,
                               mark_points=marks,
                               )
+if args.cache_dir is not None:
+    shape.save_translation_cache(args.cache_dir)
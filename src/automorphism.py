@@ -0,0 +1,228 @@
+import numpy as np
+
+from src.path_trie import PathTrie
+
+
+class Automorphism:
+    def __init__(self, face_map, affine_maps, bound_maps):
+        """
+        symmetry of a shape: sends each face to a face by an isometry, in a way that respects how faces are glued
+            so a face path from F to G with translation (T,s) goes to a face path from face_map[F] to face_map[G],
+            with translation (R_G T R_F^-1, ...)
+        :param face_map: dict of (face name -> face name of image)
+        :param affine_maps: dict of (face name -> (R,t)), a point x on the face goes to Rx+t on the image face
+        :param bound_maps: dict of (face name -> list), the i-th bound of a face goes to the bound_maps[fn][i]-th bound
+            of the image face
+        """
+        self.face_map = face_map
+        self.affine_maps = affine_maps
+        self.bound_maps = bound_maps
+
+    def map_point(self, fn, p):
+        """
+        :param fn: face name
+        :param p: column vector on face fn
+        :return: (face name, column vector) of the image of p
+        """
+        R, t = self.affine_maps[fn]
+        return self.face_map[fn], R@p + t
+
+    def preimage_face(self, fn):
+        """
+        :param fn: face name
+        :return: face name that is sent to fn
+        """
+        return [F for F, G in self.face_map.items() if G == fn][0]
+
+    def pull_back_point(self, fn, p):
+        """
+        inverse of map_point
+        :param fn: face name of the image face
+        :param p: column vector on face fn
+        :return: (face name, column vector) that map_point sends to (fn,p)
+        """
+        source_fn = self.preimage_face(fn)
+        R, t = self.affine_maps[source_fn]
+        return source_fn, R.T@(p - t)
+
+    def map_bound_path(self, faces, source_fn, bound_path):
+        """
+        :param faces: dict of (face name -> Face) of the shape
+        :param source_fn: face name that bound_path starts at
+        :param bound_path: list of (Bound, Face) from the source face
+        :return: list of (Bound, Face) from the image of the source face
+        """
+        out = []
+        F = faces[source_fn]
+        for (bound, H) in bound_path:
+            i = [k for k, (bnd, _) in enumerate(F.bounds) if bnd is bound][0]
+            out.append(faces[self.face_map[F.name]].bounds[self.bound_maps[F.name][i]])
+            F = H
+        return out
+
+    def map_trie(self, trie, faces):
+        """
+        image of every path in a PathTrie
+            the image has the same nodes (so the same node indices), only the faces, bounds, and translations change
+        :param trie: PathTrie
+        :param faces: dict of (face name -> Face) of the shape
+        :return: PathTrie starting at the image of trie.root
+        """
+        face_names = list(faces)
+        arrays = trie.to_arrays(faces)
+        # translations of each face as stacked arrays, indexed by face index
+        R = np.stack([self.affine_maps[fn][0] for fn in face_names])
+        t = np.stack([self.affine_maps[fn][1] for fn in face_names])
+        root = int(arrays['root'])
+        node_faces = arrays['faces']
+
+        # x' on image of root is R_root^T (x' - t_root) on root, which goes to Tx+s on the node face,
+        # and R(Tx+s)+t on the image of the node face
+        T = np.einsum('nij,njk,lk->nil', R[node_faces], arrays['T'], R[root])
+        s = R[node_faces]@arrays['s'] + t[node_faces] - T@t[root]
+
+        face_idx = {fn: i for i, fn in enumerate(face_names)}
+        image_idx = np.array([face_idx[self.face_map[fn]] for fn in face_names])
+        bounds = arrays['bounds'].copy()
+        parent_faces = node_faces[arrays['parents'][1:]]
+        bounds[1:] = [self.bound_maps[face_names[f]][b] for f, b in zip(parent_faces, arrays['bounds'][1:])]
+
+        arrays.update({'root': np.array(image_idx[root]),
+                       'faces': image_idx[node_faces],
+                       'bounds': bounds,
+                       'T': T,
+                       's': s,
+                       })
+        return PathTrie.from_arrays(faces, arrays)
+
+    def map_voronoi_diagram(self, faces, source_fn, sink_fn, voronoi_diagram):
+        """
+        image of a result of ConvexPolyhderon.get_voronoi_diagram
+            for p on the source face, this is the result for the image of p on the image of the source face,
+            and the image of the sink face
+        :param faces: dict of (face name -> Face) of the shape
+        :param source_fn: face name of source of voronoi_diagram
+        :param sink_fn: face name of sink of voronoi_diagram
+        :param voronoi_diagram: (point_pair_to_segment, (relevant_points, relevant_bound_paths, relevant_cells))
+        :return: the same, on the image of the sink face
+        """
+        if voronoi_diagram is None:
+            return None
+        R, t = self.affine_maps[sink_fn]
+        point_pair_to_segment, (relevant_points, relevant_bound_paths, relevant_cells) = voronoi_diagram
+
+        def map_row(a):
+            return (R@a.reshape((-1, 1)) + t).flatten()
+
+        def map_segment(seg_type, a, b):
+            if seg_type == 'ray':
+                # b is the direction of the ray, so it is only rotated
+                return map_row(a), (R@b.reshape((-1, 1))).flatten()
+            return map_row(a), map_row(b)
+
+        return ({pair: (seg_type, map_segment(seg_type, a, b))
+                 for pair, (seg_type, (a, b)) in point_pair_to_segment.items()},
+                ([R@p + t for p in relevant_points],
+                 [None if pth is None else self.map_bound_path(faces, source_fn, pth) for pth in relevant_bound_paths],
+                 [[(map_row(a), map_row(b)) for (a, b) in cell] for cell in relevant_cells],
+                 ))
+
+
+def _fit_isometry(V, W, tol):
+    """
+    finds the isometry x -> Rx+t that sends each column of V to the same column of W
+    :param V: (dimension,k) array
+    :param W: (dimension,k) array
+    :param tol: tolerance
+    :return: (R,t), or None if there is no such isometry
+    """
+    v_mean = V.mean(axis=1, keepdims=True)
+    w_mean = W.mean(axis=1, keepdims=True)
+    U, _, Vt = np.linalg.svd((W - w_mean)@(V - v_mean).T)
+    R = U@Vt
+    t = w_mean - R@v_mean
+    if np.max(np.linalg.norm(R@V + t - W, axis=0)) > tol:
+        return None
+    return R, t
+
+
+def find_automorphism(faces, source_fn, image_fn, tol):
+    """
+    looks for an automorphism of a shape that sends source face to image face
+        tries each isometry between the two faces, and extends it to neighboring faces across each bound
+        this works since the whole automorphism is determined by what it does on one face
+    :param faces: dict of (face name -> Face) of the shape
+    :param source_fn: face name
+    :param image_fn: face name
+    :param tol: tolerance
+    :return: Automorphism, or None if there is none
+    """
+    if faces[source_fn].get_vertices() is None or faces[image_fn].get_vertices() is None:
+        # faces that are not closed yet
+        return None
+    V = np.concatenate([v for (v, _) in faces[source_fn].get_vertices()], axis=1)
+    W = np.concatenate([v for (v, _) in faces[image_fn].get_vertices()], axis=1)
+    k = V.shape[1]
+    if W.shape[1] != k:
+        return None
+    for shift in range(k):
+        for direction in (1, -1):
+            isometry = _fit_isometry(V, W[:, [(shift + direction*i)%k for i in range(k)]], tol)
+            if isometry is None:
+                continue
+            automorphism = _extend_isometry(faces, source_fn, image_fn, isometry, tol)
+            if automorphism is not None:
+                return automorphism
+    return None
+
+
+def _extend_isometry(faces, source_fn, image_fn, isometry, tol):
+    """
+    extends an isometry from source face to image face to the whole shape
+    :return: Automorphism, or None if it does not extend
+    """
+    face_map = {source_fn: image_fn}
+    affine_maps = {source_fn: isometry}
+    bound_maps = dict()
+    edge_arrays = dict()  # face name -> (k,2,dimension) array of the endpoints of the edge of each bound
+    queue = [source_fn]
+    while queue:
+        fn = queue.pop()
+        F, G = faces[fn], faces[face_map[fn]]
+        R, t = affine_maps[fn]
+        for H in (F, G):
+            if H.name not in edge_arrays:
+                edge_arrays[H.name] = np.array([[v.flatten() for v in H.get_edge(bnd)] for (bnd, _) in H.bounds])
+        # image of each edge of F, to be matched (in either direction) with an edge of G
+        images = np.einsum('ij,kej->kei', R, edge_arrays[fn]) + t.flatten()
+        G_edges = edge_arrays[G.name]
+        dists = np.minimum(np.linalg.norm(images[:, np.newaxis] - G_edges[np.newaxis], axis=-1).max(axis=-1),
+                           np.linalg.norm(images[:, np.newaxis] - G_edges[np.newaxis, :, ::-1], axis=-1).max(axis=-1))
+        bound_maps[fn] = []
+        for i, (bound, H) in enumerate(F.bounds):
+            matches = np.flatnonzero(dists[i] <= tol)
+            if len(matches) != 1:
+                return None
+            bound_maps[fn].append(int(matches[0]))
+            image_bound, image_H = G.bounds[matches[0]]
+
+            # y on H is x=T^-1(y-c) on F, then Rx+t on G, then the image bound puts it on the image of H
+            Ti = np.linalg.inv(bound.T)
+            c = bound.shift_point(np.zeros((F.dimension, 1)))
+            RH = image_bound.T@R@Ti
+            tH = image_bound.shift_point(t - R@Ti@c)
+            if H.name in face_map:
+                RH_old, tH_old = affine_maps[H.name]
+                if (face_map[H.name] != image_H.name or
+                        np.max(np.abs(RH - RH_old)) > tol or
+                        np.linalg.norm(tH - tH_old) > tol):
+                    return None
+            else:
+                if image_H.name in face_map.values():
+                    return None
+                face_map[H.name] = image_H.name
+                affine_maps[H.name] = (RH, tH)
+                queue.append(H.name)
+    if len(face_map) != len(faces):
+        return None
+    return Automorphism(face_map, affine_maps, bound_maps)
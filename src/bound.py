@@ -1,5 +1,7 @@
 import numpy as np
 
+from src.predicates import exact_array
+
 
 class Bound:
     def __init__(self, m, b, s, T, si, dimension=None, name=None, identifier=''):
@@ -27,6 +29,8 @@ class Bound:
         self.T = T
         self.si = si
         self.dimension = self.check_valid(dimension)
+        self._inverse = None
+        self._exact = None
         if name is None:
             base_id = str(tuple(self.m.flatten())) + str(self.b) + str(tuple(self.s.flatten())) + str(
                 tuple(self.T.flatten())) + str(tuple(self.si.flatten())) + str(self.dimension)
@@ -97,8 +101,14 @@ class Bound:
         """
         shifts point x to equivalent x' on face according to bound
         :param x: column vector (np array of dimension (self.dimension,1))
+            if x is an object array of Fractions (see exact_array), this is computed exactly
         :return: column vector (np array of dimension (self.dimension,1))
         """
+        if x.dtype == object:
+            if self._exact is None:
+                self._exact = (exact_array(self.T), exact_array(self.s), exact_array(self.si))
+            T, s, si = self._exact
+            return T@(x + s) + si
         return self.T@(x + self.s) + self.si
 
     def shift_vec(self, v):
@@ -112,13 +122,16 @@ class Bound:
     def get_inverse_bound(self):
         """
         :return: inverse bound, from neighboring face to this face
-        """
-
-        Ti = np.linalg.inv(self.T)
-        m = -self.m@Ti
-        b = -self.b - np.dot(self.m, self.s) - np.dot(self.m@Ti, self.si)
-        b = b.flatten()[0]
-        return Bound(m, b, -self.si, Ti, -self.s, self.dimension, name=self.name)
+            computed once, since paths of faces are checked backwards many times
+        """
+        if self._inverse is None:
+            Ti = np.linalg.inv(self.T)
+            m = -self.m@Ti
+            b = -self.b - np.dot(self.m, self.s) - np.dot(self.m@Ti, self.si)
+            b = b.flatten()[0]
+            self._inverse = Bound(m, b, -self.si, Ti, -self.s, self.dimension, name=self.name)
+            self._inverse._inverse = self
+        return self._inverse
 
     def concatenate_with(self, T=None, s=None):
         """
@@ -0,0 +1,201 @@
+import numpy as np
+
+
+def path_edges(source, path):
+    """
+    edges crossed by a bound path, in coordinates of the sink face
+    :param source: source Face
+    :param path: list of (bound, F) representing the path of bounds from source face to sink face
+    :return: (L,2,dimension) array, entry l is the endpoints of the l-th edge crossed
+    """
+    dim = source.dimension
+    E = np.zeros((0, 2, dim))
+    face = source
+    for bnd, F in path:
+        a, b = face.get_edge(bnd)
+        E = np.concatenate((E, np.stack((a.T, b.T), axis=1)), axis=0)
+        E = bnd.shift_point(E.reshape((-1, dim)).T).T.reshape((-1, 2, dim))
+        face = F
+    return E
+
+
+def within_windows(C, X, W, mask, tol):
+    """
+    checks whether straight lines from copies of p to points cross every edge of their paths
+        this is when each point is in the wedge at the copy spanned by the endpoints of each edge
+    :param C: (N,2) array of copies of p
+    :param X: (N,2) array of points
+    :param W: (N,L,2,2) array of edges of the path of each copy (see path_edges), padded to the same length
+    :param mask: (N,L) boolean array of which edges are not padding
+    :param tol: tolerance (distance from the sides of the wedges)
+    :return: (N,) boolean array
+    """
+    A = W[:, :, 0, :] - C[:, np.newaxis, :]
+    B = W[:, :, 1, :] - C[:, np.newaxis, :]
+    D = (X - C)[:, np.newaxis, :]
+
+    def cross(u, v):
+        return u[..., 0]*v[..., 1] - u[..., 1]*v[..., 0]
+
+    side = np.sign(cross(A, B))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        inside = ((side*cross(A, D) >= -tol*np.linalg.norm(A, axis=2)) &
+                  (side*cross(D, B) >= -tol*np.linalg.norm(B, axis=2)))
+    return np.all(inside | ~mask, axis=1)
+
+
+class CompiledCutLocus:
+    def __init__(self, T, s, kept, paths, diagram, windows, filtered_windows, tol):
+        """
+        cut locus on a sink face as an explicit function of p, for one combinatorial structure
+            every copy of p is T_k p + s_k, so the line between the cells of two copies is
+                {x : (c_j-c_i).x = (|c_j|^2-|c_i|^2)/2}, with coefficients quadratic in p (affine if T_k are rotations)
+            and every vertex of a cell is where two of these lines (or edges of the face) meet
+            evaluate computes every vertex at once, and checks that the structure is still right
+        :param T: (K,2,2) array of translations of every copy of p (see get_stacked_voronoi_translations)
+        :param s: (K,2) array of shifts of every copy of p
+        :param kept: translation index of each copy with a cell
+        :param paths: bound path of each copy with a cell
+        :param diagram: ClippedVoronoi of the copies with a cell, at some p
+        :param windows: list of path_edges of the path of each copy with a cell
+        :param filtered_windows: dict of (translation index -> list of path_edges of each alternative path),
+            for copies that were filtered out, but take part of the sink face
+        :param tol: tolerance for paths
+        """
+        self.T = T
+        self.s = s
+        self.kept = np.array(kept, dtype=int)
+        self.paths = paths
+        self.tol = tol
+        face = diagram.face
+        if face.bound_M is None:
+            face._create_bound_arrays()
+        self.bound_M = face.bound_M
+        self.bound_b = face.bound_b.flatten()
+        polygon = diagram.polygon
+        n_edges = len(polygon)
+
+        # each line is n.x=b, where n=A p+a and b=p.Q p+w.p+beta
+        # lines 0 to n_edges-1 are the edges of the face, and the rest are between two copies
+        edge_normals = (np.roll(polygon, -1, axis=0) - polygon)@np.array([[0, -1], [1, 0]])
+        A = [np.zeros((2, 2))]*n_edges
+        a = list(edge_normals)
+        Q = [np.zeros((2, 2))]*n_edges
+        w = [np.zeros(2)]*n_edges
+        beta = list(np.sum(edge_normals*polygon, axis=1))
+        line_idxs = dict()
+
+        def line(i, label):
+            if label < 0:
+                return -1 - label
+            key = (i, label)
+            if key not in line_idxs:
+                line_idxs[key] = len(a)
+                ki, kj = self.kept[i], self.kept[label]
+                A.append(T[kj] - T[ki])
+                a.append(s[kj] - s[ki])
+                Q.append((T[kj].T@T[kj] - T[ki].T@T[ki])/2)
+                w.append(s[kj]@T[kj] - s[ki]@T[ki])
+                beta.append((s[kj]@s[kj] - s[ki]@s[ki])/2)
+            return line_idxs[key]
+
+        vertex_lines = []  # pair of lines that meet at each vertex
+        owners = []  # copy whose cell each vertex is on
+        self.cells = []  # indices of the vertices of each cell, in order
+        self.orientations = []
+        ridges = dict()
+        for i in range(len(kept)):
+            V, labels = diagram.cells[i]
+            start = len(vertex_lines)
+            for t in range(len(V)):
+                vertex_lines.append((line(i, labels[t - 1]), line(i, labels[t])))
+                owners.append(i)
+            cell = np.arange(start, start + len(V))
+            self.cells.append(cell)
+            self.orientations.append(np.sign(np.sum(V[:, 0]*np.roll(V[:, 1], -1) - np.roll(V[:, 0], -1)*V[:, 1])))
+            for t, j in enumerate(labels):
+                if j >= 0 and (min(i, j), max(i, j)) not in ridges:
+                    ridges[(min(i, j), max(i, j))] = (cell[t], cell[(t + 1)%len(V)])
+        self.A, self.a, self.Q, self.w, self.beta = (np.array(arr) for arr in (A, a, Q, w, beta))
+        self.vertex_lines = np.array(vertex_lines, dtype=int)
+        self.owners = np.array(owners, dtype=int)
+        self.ridges = ridges
+
+        L = max([len(W) for W in windows], default=0)
+        self.windows = np.zeros((len(kept), L, 2, 2))
+        self.window_mask = np.zeros((len(kept), L), dtype=bool)
+        for i, W in enumerate(windows):
+            self.windows[i, :len(W)] = W
+            self.window_mask[i, :len(W)] = True
+        self.filtered_windows = filtered_windows
+
+    def vertices(self, p):
+        """
+        :param p: column vector, point on source face
+        :return: (copies of p, (n,2) array of every vertex of every cell)
+        """
+        p = p.flatten()
+        C = self.T@p + self.s
+        N = self.A@p + self.a
+        B = np.einsum('i,lij,j->l', p, self.Q, p) + self.w@p + self.beta
+        N1, N2 = N[self.vertex_lines[:, 0]], N[self.vertex_lines[:, 1]]
+        B1, B2 = B[self.vertex_lines[:, 0]], B[self.vertex_lines[:, 1]]
+        det = N1[:, 0]*N2[:, 1] - N1[:, 1]*N2[:, 0]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            X = np.stack((B1*N2[:, 1] - B2*N1[:, 1], N1[:, 0]*B2 - N2[:, 0]*B1), axis=1)/det[:, np.newaxis]
+        return C, X
+
+    def evaluate(self, p):
+        """
+        the cut locus for p, if it has the same structure
+            checks that every vertex is in the face, every cell is still convex in the same orientation,
+            no other copy is closer to any vertex than its cell's copy, within tol
+                (except filtered copies that are still invalid),
+            and straight lines from each copy to the vertices of its cell follow its path
+            since cells are convex, these mean the cells are exactly the cells of the copies in the face
+        :param p: column vector, point on source face
+        :return: (list of points, bound paths, cells, dict of cut locus segments), as reuse_cut_locus_structure,
+            or None if the structure is different at p
+        """
+        C, X = self.vertices(p)
+        if not np.all(np.isfinite(X)):
+            return None
+        if np.any(X@self.bound_M.T > self.bound_b + 1e-9*(1 + np.abs(self.bound_b))):
+            return None
+        for cell, orientation in zip(self.cells, self.orientations):
+            V = X[cell]
+            E = np.roll(V, -1, axis=0) - V
+            turns = E[:, 0]*np.roll(E[:, 1], -1) - E[:, 1]*np.roll(E[:, 0], -1)
+            if np.any(orientation*turns < -1e-9*(1 + np.sum(E*E, axis=1))):
+                return None
+        owner_copies = C[self.kept[self.owners]]
+        r = np.linalg.norm(X - owner_copies, axis=1)
+        D = np.linalg.norm(X[:, np.newaxis, :] - C[np.newaxis, :, :], axis=2)
+        conflicts = D < r[:, np.newaxis] - 1e-9*(1 + r[:, np.newaxis])
+        # as in reuse_cut_locus_structure, other copies that take part of the face within tolerance also count
+        others = np.setdiff1d(np.arange(len(C)), self.kept)
+        conflicts[:, others] = D[:, others] < r[:, np.newaxis] + self.tol - 1e-9*(1 + r[:, np.newaxis])
+        for k in np.flatnonzero(np.any(conflicts, axis=0)):
+            if k not in self.filtered_windows:
+                return None
+            # the copy is still filtered out if every path misses some point of its cell
+            X_k = X[conflicts[:, k]]
+            C_k = np.tile(C[k], (len(X_k), 1))
+            if all(np.all(within_windows(C_k,
+                                         X_k,
+                                         np.tile(W[np.newaxis], (len(X_k), 1, 1, 1)),
+                                         np.ones((len(X_k), len(W)), dtype=bool),
+                                         self.tol))
+                   for W in self.filtered_windows[k]):
+                return None
+        if self.windows.shape[1] and not np.all(within_windows(owner_copies,
+                                                               X,
+                                                               self.windows[self.owners],
+                                                               self.window_mask[self.owners],
+                                                               self.tol)):
+            return None
+        points = [C[[k]].T for k in self.kept]
+        cells = [[(X[cell[t]], X[cell[(t + 1)%len(cell)]]) for t in range(len(cell))] for cell in self.cells]
+        point_pair_to_segment = {pair: ('segment', (X[u], X[v])) for pair, (u, v) in self.ridges.items()
+                                 if np.linalg.norm(X[v] - X[u]) > self.tol}
+        return points, list(self.paths), cells, point_pair_to_segment
@@ -0,0 +1,110 @@
+from collections import OrderedDict
+from types import MappingProxyType
+
+import numpy as np
+
+# default number of cut loci a shape keeps
+DEFAULT_MAX_ENTRIES = 1024
+# default size of the grid p is rounded to in keys
+DEFAULT_QUANTUM = 1e-9
+
+
+def _freeze_array(arr):
+    # a view, so arrays that are still used elsewhere stay writeable
+    arr = np.asarray(arr).view()
+    arr.flags.writeable = False
+    return arr
+
+
+def freeze_voronoi_diagram(voronoi_diagram):
+    """
+    read only version of a result of ConvexPolyhderon.get_voronoi_diagram, so it can be shared between callers
+        arrays are not writeable, lists are tuples, and the segment dict is a mappingproxy
+    :param voronoi_diagram: (point_pair_to_segment, (relevant_points, relevant_bound_paths, relevant_cells)), or None
+    :return: the same, read only
+    """
+    if voronoi_diagram is None:
+        return None
+    point_pair_to_segment, (relevant_points, relevant_bound_paths, relevant_cells) = voronoi_diagram
+    return (MappingProxyType({pair: (seg_type, (_freeze_array(a), _freeze_array(b)))
+                              for pair, (seg_type, (a, b)) in point_pair_to_segment.items()}),
+            (tuple(_freeze_array(pt) for pt in relevant_points),
+             tuple(tuple(pth) if isinstance(pth, list) else pth for pth in relevant_bound_paths),
+             tuple(tuple((_freeze_array(a), _freeze_array(b)) for (a, b) in cell) for cell in relevant_cells),
+             ))
+
+
+class DiagramCache:
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, quantum=DEFAULT_QUANTUM):
+        """
+        memo of ConvexPolyhderon.get_voronoi_diagram, with keys made by key
+            values are read only (see freeze_voronoi_diagram), and may be None if there is no cut locus
+        evicts the least recently used keys once there are more than max_entries
+        cleared with the translation cache when the faces or bounds of the shape change (see Shape.check_face_graph)
+        :param max_entries: number of cut loci to keep, None if unbounded
+        :param quantum: p is rounded to a grid of this size in keys
+        """
+        self.max_entries = max_entries
+        self.quantum = quantum
+        self.entries = OrderedDict()  # key -> voronoi diagram, least recently used first
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def key(self, p, *args):
+        """
+        :param p: column vector
+        :param args: anything else that changes the cut locus (faces, diameter, flags), must be hashable
+        :return: key for p and args
+        """
+        return (tuple(np.round(np.ravel(p)/self.quantum).astype(np.int64)),) + args
+
+    def lookup(self, key):
+        """
+        gets a value, counting a hit or a miss
+        :param key: from key
+        :return: (whether key is cached, voronoi diagram)
+        """
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return True, self.entries[key]
+        self.misses += 1
+        return False, None
+
+    def store(self, key, voronoi_diagram):
+        """
+        :param key: from key
+        :param voronoi_diagram: result of get_voronoi_diagram
+        :return: read only voronoi diagram that was stored
+        """
+        value = freeze_voronoi_diagram(voronoi_diagram)
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if self.max_entries is not None:
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats(self):
+        """
+        :return: dict of counters, and the fraction of lookups that were hits
+        """
+        lookups = self.hits + self.misses
+        return {'entries': len(self.entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits/lookups if lookups else 0.,
+                'evictions': self.evictions,
+                }
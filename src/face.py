@@ -1,7 +1,12 @@
 import itertools
 import numpy as np
+from scipy.optimize import linprog
+from scipy.spatial import HalfspaceIntersection, QhullError
 
 from src.bound import Bound
+from src.predicates import EPS, exact_array, halfspaces_contain
+from src.window import Window
+from src.utils import point_segment_distance
 
 
 class Face:
@@ -13,7 +18,7 @@ class Face:
         :param bounds_faces: list of (Bound,Face) to initialize boundaries
             Note: usually start with an empty face, then create bounds later
         :param basepoint: point inside face, if None, uses 0
-            this is basically only used for ordering vertices
+            this is basically only used for ordering vertices, and as a point inside the face to make them
         """
         self.name = name
         self.bounds = []
@@ -22,6 +27,12 @@ class Face:
         self.dimension = None
         self.bound_M = None
         self.bound_b = None
+        self.bound_rhs = None
+        self.bound_err = None
+        self.exact_bounds = None
+        self.edges = None
+        self.grown_edges = None
+        self.adjacency = None
         self.double_face_edge = []
 
         if bounds_faces is not None:
@@ -36,7 +47,7 @@ class Face:
         """
         adds boundary to face F into self
         :param bound: Bound
-        :param update: whether to update internal bound arrays and vertices
+        :param update: whether to update internal bound arrays, and have vertices made again when they are next used
         :param F: Face
         """
         if F in [Fp for (_, Fp) in self.bounds]:
@@ -47,7 +58,11 @@ class Face:
             self.basepoint = np.zeros((self.dimension, 1))
         if update:
             self._create_bound_arrays()
-            self._create_vertices()
+            # vertices are made by get_vertices, so adding many bounds does not make them each time
+            self.vertices = None
+            self.edges = None
+            self.grown_edges = None
+            self.adjacency = None
 
     def _order_vertices(self):
         """
@@ -81,6 +96,51 @@ class Face:
             # out.append(((v1, v2), self.bounds[row][1]))
         return out
 
+    def get_edge(self, bound):
+        """
+        returns the edge of the face that lies on bound
+        :param bound: Bound of this face
+        :return: (v,v') column vectors, endpoints of the edge
+        """
+        if self.edges is None:
+            self.edges = {bnd: edge for (edge, (bnd, _)) in self.get_path_and_faces()}
+        return self.edges[bound]
+
+    def get_grown_edge(self, bound):
+        """
+        returns the part of the line of an edge that is within the face with tolerance
+            this is the edge, extended a little past each vertex to where the line leaves the tolerance band
+            of the neighboring edge, so lines through it are the lines that can cross the edge within tolerance
+        :param bound: Bound of this face
+        :return: (v,v') column vectors, endpoints of the grown edge, in the same order as get_edge
+        """
+        if self.grown_edges is None:
+            self.grown_edges = dict()
+        if bound not in self.grown_edges:
+            self.grown_edges[bound] = self._grow_edge(bound)
+        return self.grown_edges[bound]
+
+    def _grow_edge(self, bound):
+        """
+        computes get_grown_edge
+        """
+        if self.bound_M is None:
+            self._create_bound_arrays()
+        a, b = self.get_edge(bound)
+        d = (b - a).flatten()
+        Md = self.bound_M@d
+        gap = (self.bound_rhs - self.bound_M@a).flatten()
+        # a+td is within bound k iff t Md_k <= gap_k, bounds parallel to the edge (including its own) do not limit t
+        parallel = np.abs(Md) <= EPS*np.linalg.norm(d)*np.linalg.norm(self.bound_M, axis=1)
+        with np.errstate(divide='ignore'):
+            t = gap/Md
+        t0 = min(np.max(t[~parallel & (Md < 0)], initial=-np.inf), 0.)
+        t1 = max(np.min(t[~parallel & (Md > 0)], initial=np.inf), 1.)
+        if not np.isfinite(t0) or not np.isfinite(t1):
+            # the face is not bounded along the edge
+            return a, b
+        return a + t0*d.reshape((-1, 1)), a + t1*d.reshape((-1, 1))
+
     def within_bounds(self, p):
         """
         returns if point p is inside face
@@ -89,7 +149,40 @@ class Face:
         """
         if self.bound_M is None:
             self._create_bound_arrays()
-        return np.all(self.bound_M@p <= self.bound_b + self.tol)
+        # the float error is small compared to how far most points are from the bounds,
+        #   so the exact check is only needed for points that are close to some bound (with tolerance)
+        p = np.reshape(p, (-1, 1))
+        gap = self.bound_rhs - self.bound_M@p
+        err = self.bound_err*(1 + np.abs(p).max())
+        if (gap > err).all():
+            return True
+        if (gap < -err).any():
+            return False
+        return bool(np.all(halfspaces_contain(np.reshape(p, (1, -1)), self.bound_M, self.bound_b[:, 0], self.tol)))
+
+    def within_bounds_batch(self, P):
+        """
+        within_bounds for many points at once
+        :param P: (N,self.dimension) array of points
+            if P is an object array of Fractions (see exact_array), this is computed exactly
+        :return: (N,) boolean array
+        """
+        if self.bound_M is None:
+            self._create_bound_arrays()
+        if P.dtype == object:
+            M, b, tol = self._get_exact_bound_arrays()
+            return np.all(P@M.T <= b + tol, axis=1)
+        return np.all(halfspaces_contain(P, self.bound_M, self.bound_b[:, 0], self.tol), axis=1)
+
+    def bound_margins(self, P):
+        """
+        how far outside of the face points are, according to the bounds (with tolerance)
+        :param P: (N,self.dimension) array of points
+        :return: (N,) array, positive for points outside the face
+        """
+        if self.bound_M is None:
+            self._create_bound_arrays()
+        return np.max(P@self.bound_M.T - self.bound_b[:, 0] - self.tol, axis=1)
 
     def bound_of_face(self, F):
         """
@@ -110,11 +203,26 @@ class Face:
         """
         self.bound_M = np.array([bound.m[0] for (bound, _) in self.bounds])
         self.bound_b = np.array([[bound.b] for (bound, _) in self.bounds])
+        self.bound_rhs = self.bound_b + self.tol
+        # bound on the float error of M p-b-tol, times 1+max|p| (see halfspaces_contain)
+        self.bound_err = (self.dimension + 2)*EPS*max(np.max(np.sum(np.abs(self.bound_M), axis=1)),
+                                                      np.max(np.abs(self.bound_rhs)))
+        self.exact_bounds = None
+
+    def _get_exact_bound_arrays(self):
+        """
+        :return: M, b (flattened), and tolerance as Fractions, for exact versions of bound methods
+        """
+        if self.exact_bounds is None:
+            self.exact_bounds = (exact_array(self.bound_M), exact_array(self.bound_b[:, 0]), exact_array(self.tol))
+        return self.exact_bounds
 
     def _create_vertices(self):
         """
         creates all vertices of the face
         vertices are a list of (vertex: column vector, indices of bounds that create it: tuple)
+            uses a half-space intersection if the face is bounded (see _intersect_halfspaces),
+            otherwise (e.g. while bounds are still being added) tries every set of self.dimension bounds
         """
         self.vertices = []
         if self.bound_M is None:
@@ -123,22 +231,103 @@ class Face:
         if n < self.dimension:
             # print("WARNING: no vertices since not enough boundaries")
             return
-        for rows in itertools.combinations(range(n), self.dimension):
-            sub_M = self.bound_M[rows, :]
-            sub_b = self.bound_b[rows, :]
-            if abs(np.linalg.det(sub_M)) > self.tol:
-                vertex = np.linalg.inv(sub_M)@sub_b
-                if self.within_bounds(vertex):
-                    self.vertices.append((vertex, rows))
+        vertices = self._intersect_halfspaces()
+        if vertices is not None:
+            self.vertices = vertices
+        else:
+            for rows in itertools.combinations(range(n), self.dimension):
+                sub_M = self.bound_M[rows, :]
+                sub_b = self.bound_b[rows, :]
+                if abs(np.linalg.det(sub_M)) > self.tol:
+                    vertex = np.linalg.inv(sub_M)@sub_b
+                    if self.within_bounds(vertex):
+                        self.vertices.append((vertex, rows))
         self._order_vertices()
 
+    def _interior_point(self):
+        """
+        point well inside the face, the basepoint if it is more than tolerance from every bound,
+            otherwise the center of the largest ball in the face
+        :return: column vector, or None if the face has no ball of radius more than tolerance
+        """
+        norms = np.linalg.norm(self.bound_M, axis=1)
+        if np.all(self.bound_b[:, 0] - self.bound_M@self.basepoint[:, 0] > self.tol*norms):
+            return self.basepoint
+        # maximize r such that M x+r|M_i|<=b, with r<=1 in case the face is unbounded
+        c = np.zeros(self.dimension + 1)
+        c[-1] = -1
+        res = linprog(c,
+                      A_ub=np.hstack((self.bound_M, norms.reshape((-1, 1)))),
+                      b_ub=self.bound_b[:, 0],
+                      bounds=[(None, None)]*self.dimension + [(None, 1)],
+                      )
+        if not res.success or res.x[-1] <= self.tol:
+            return None
+        return res.x[:-1].reshape((-1, 1))
+
+    def _intersect_halfspaces(self):
+        """
+        vertices of a bounded face with qhull (see scipy.spatial.HalfspaceIntersection)
+            this takes about n log n time for n bounds in low dimensions, instead of n^self.dimension
+            qhull intersects the half-spaces as a convex hull of their duals (M_i/(b_i-M_i c) for an interior point c),
+            which contains the origin iff the face is bounded
+        :return: list of (vertex: column vector, indices of bounds that create it: tuple) as _create_vertices,
+            or None if the face is unbounded or not full dimensional
+        """
+        interior = self._interior_point()
+        if interior is None:
+            return None
+        try:
+            hs = HalfspaceIntersection(np.hstack((self.bound_M, -self.bound_b)), interior[:, 0])
+        except QhullError:
+            return None
+        if not (np.all(np.isfinite(hs.intersections)) and
+                np.all(-hs.dual_equations[:, -1] > EPS*np.max(np.linalg.norm(hs.dual_points, axis=1)))):
+            return None
+        vertices = []
+        for rows in hs.dual_facets:
+            rows = tuple(sorted(rows))
+            # solve with the bounds themselves, as qhull finds vertices less precisely
+            vertex = np.linalg.lstsq(self.bound_M[rows, :], self.bound_b[rows, :], rcond=None)[0]
+            vertices.append((vertex, rows))
+        # same order as trying every set of bounds, which is kept if there are more than 2 dimensions
+        return sorted(vertices, key=lambda vertex_rows: vertex_rows[1])
+
     def get_vertices(self):
         """
         grabs all vertices of the face
-        :return: list of (vertex: column vector, indices of bounds that create it: tuple)
+        :return: list of (vertex: column vector, indices of bounds that create it: tuple),
+            None if the face has no bounds
         """
+        if self.vertices is None and self.bounds:
+            self._create_vertices()
         return self.vertices
 
+    def get_bound_adjacency(self):
+        """
+        which bounds of the face meet at a face of dimension self.dimension-2 (at a vertex in 2 dimensions)
+        :return: list of sets, entry i is the indices of the bounds adjacent to bound i
+        """
+        if self.adjacency is None:
+            shared = dict()  # pair of bounds -> vertices on both
+            for v, rows in self.get_vertices():
+                for pair in itertools.combinations(sorted(rows), 2):
+                    shared.setdefault(pair, []).append(v)
+            self.adjacency = [set() for _ in self.bounds]
+            for (i, j), V in shared.items():
+                V = np.concatenate(V, axis=1)
+                if np.linalg.matrix_rank(V - V[:, [0]], tol=self.tol) >= self.dimension - 2:
+                    self.adjacency[i].add(j)
+                    self.adjacency[j].add(i)
+        return self.adjacency
+
+    def get_circumradius(self):
+        """
+        radius of smallest circle around basepoint that contains the face
+        :return: scalar
+        """
+        return max(np.linalg.norm(v - self.basepoint) for (v, _) in self.get_vertices())
+
     def get_closest_point(self, p):
         """
         returns the closest point in the face to p
@@ -188,6 +377,35 @@ class Face:
             return None
         return q
 
+    def get_exit_points(self, P, V):
+        """
+        get_exit_point for many rays at once
+        :param P: (N,self.dimension) array of starting points
+        :param V: (N,self.dimension) array of directions
+            if P and V are object arrays of Fractions (see exact_array), this is computed exactly
+        :return: ((N,self.dimension) array of exit points, (N,) boolean array of whether each exit point exists)
+        """
+        if self.bound_M is None:
+            self._create_bound_arrays()
+        if P.dtype == object:
+            bound_M, bound_b, tol = self._get_exact_bound_arrays()
+        else:
+            bound_M, bound_b, tol = self.bound_M, self.bound_b[:, 0], self.tol
+        # the exit point of each ray is P+Vt, t starts at 1 and moves back each time the ray leaves a bound
+        MP = P@bound_M.T
+        MV = V@bound_M.T
+        b = bound_b + tol
+        t = np.ones(len(P), dtype=MP.dtype)
+        exists = ~np.all(MP + MV <= b, axis=1)
+        for k in range(len(self.bounds)):
+            # goes from inside bound to outside bound
+            crossing = exists & (MP[:, k] <= b[k]) & (MP[:, k] + MV[:, k]*t > b[k])
+            if np.any(crossing):
+                t[crossing] = (bound_b[k] - MP[crossing, k])/MV[crossing, k]
+        # lines that end outside the face, and never enter the face
+        exists &= np.all(MP + MV*t[:, np.newaxis] <= b, axis=1)
+        return P + V*t[:, np.newaxis], exists
+
     def line_within_bounds(self, p, q, ignore_points):
         """
         returns if any part of the line p->q is within the face
@@ -211,7 +429,12 @@ class Face:
             return np.linalg.norm(p - q) > self.tol
         else:
             # enough to test whether either of the endpoints are within the bounds or if the line exits the face
-            return self.within_bounds(p) or self.within_bounds(q) or (self.get_exit_point(p, q - p) is not None)
+            #   the exit point is tested from both ends, since near a vertex of the face, a line that only crosses
+            #   the tolerance band can be found from one end and not the other, and p->q should be the same as q->p
+            return (self.within_bounds(p) or
+                    self.within_bounds(q) or
+                    self.get_exit_point(p, q - p) is not None or
+                    self.get_exit_point(q, p - q) is not None)
 
     def get_ray_within_bounds(self, p, direction):
         """
@@ -263,25 +486,108 @@ class Face:
         self.add_boundary(B1, f2)
         f2.add_boundary(B1.get_inverse_bound(), self)
 
-    def face_paths_to(self, fn, visited_names=None, diameter=None):
+    def face_paths_to(self, fn, visited_names=None, diameter=None, prune=False, max_dist=None):
         """
         returns all paths to specified face using DFS
 
         :param fn: name of target face
         :param visited_names: set of faces we have already visited
         :param diameter: longest path of faces to consider (None if infinite)
+        :param prune: whether to skip paths of faces that no straight line can pass through
+            keeps track of the window of lines that cross every edge so far, and stops when it is empty
+            only valid in 2 dimensions
+        :param max_dist: longest geodesic to consider (None if infinite)
+            skips paths whose next edge is farther than this from every point of the first face
         :return: (Bound,Face) list of 'edges' and 'next Faces'
         """
+        for (path, _) in self._face_paths(fn=fn,
+                                          visited_names=visited_names,
+                                          diameter=diameter,
+                                          prune=prune,
+                                          max_dist=max_dist,
+                                          ):
+            yield path
+
+    def face_paths(self, diameter=None, prune=False, max_dist=None):
+        """
+        returns all paths to every face using one DFS
+            this is the same as face_paths_to for every face, but shares the work on common prefixes
+
+        :param diameter: longest path of faces to consider (None if infinite)
+        :param prune: whether to skip paths of faces that no straight line can pass through
+        :param max_dist: longest geodesic to consider (None if infinite)
+        :return: ((Bound,Face) list of 'edges' and 'next Faces', lower bound on length of a geodesic along the path)
+            the path ends at its last face (or at self if empty)
+        """
+        return self._face_paths(fn=None, diameter=diameter, prune=prune, max_dist=max_dist)
+
+    def _face_paths(self,
+                    fn,
+                    visited_names=None,
+                    diameter=None,
+                    prune=False,
+                    max_dist=None,
+                    window=None,
+                    source_disk=None,
+                    reach=0.,
+                    ):
+        """
+        DFS for face_paths_to and face_paths
+
+        :param fn: name of target face (None if every face is a target)
+            paths stop at the target, otherwise they continue through every face
+        :param window: Window of lines that reach this face along the current path (None if this is the first face)
+        :param source_disk: (center, radius) of a disk containing the first face, center in coordinates of this face
+            (None if this is the first face)
+        :param reach: lower bound on the length of a geodesic along the current path
+        :return: ((Bound,Face) list, reach)
+        """
         if visited_names is None:
             visited_names = {self.name}
         visited_names.add(self.name)
-        if self.name == fn:
-            yield []
-        elif diameter is not None and diameter <= 0:
+        if max_dist is not None and source_disk is None:
+            source_disk = (self.basepoint, self.get_circumradius())
+        if fn is None or self.name == fn:
+            yield [], reach
+            if fn is not None:
+                return
+        if diameter is not None and diameter <= 0:
             return
-        else:
-            for (bound, f) in self.bounds:
-                if not f.name in visited_names:
-                    for path in f.face_paths_to(fn, visited_names=visited_names.copy(),
-                                                diameter=None if diameter is None else diameter - 1):
-                        yield [(bound, f)] + path
+        for (bound, f) in self.bounds:
+            if not f.name in visited_names:
+                next_window = None
+                next_disk = None
+                next_reach = reach
+                if prune or max_dist is not None:
+                    a, b = self.get_edge(bound)
+                if max_dist is not None:
+                    center, radius = source_disk
+                    next_reach = max(reach, point_segment_distance(center, a, b) - radius)
+                    if next_reach > max_dist + self.tol:
+                        # any geodesic along this path is longer than max_dist
+                        continue
+                    next_disk = (bound.shift_point(center), radius)
+                if prune:
+                    # check_if_valid lets lines cross the line of an edge anywhere within tolerance of the faces,
+                    #   so lines through the grown edge are kept, as well as lines that pass near its endpoints
+                    #   (twice as near as the ends of the grown edge, see Window.cross), or cells in the tolerance band
+                    #   would be lost
+                    a_tol, b_tol = self.get_grown_edge(bound)
+                    margin = 2*max(np.linalg.norm(a_tol - a), np.linalg.norm(b_tol - b))
+                    if window is None:
+                        next_window = Window(entry=(a_tol, b_tol), tol=self.tol)
+                    else:
+                        next_window = window.cross(a, b, self.basepoint, margin=margin)
+                        if next_window.is_empty():
+                            continue
+                    next_window = next_window.shift(bound)
+                for (path, path_reach) in f._face_paths(fn,
+                                                        visited_names=visited_names.copy(),
+                                                        diameter=None if diameter is None else diameter - 1,
+                                                        prune=prune,
+                                                        max_dist=max_dist,
+                                                        window=next_window,
+                                                        source_disk=next_disk,
+                                                        reach=next_reach,
+                                                        ):
+                    yield [(bound, f)] + path, path_reach
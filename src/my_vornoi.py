@@ -1,5 +1,5 @@
 import numpy as np
-from scipy.spatial import Voronoi
+from scipy.spatial import Voronoi, QhullError, cKDTree
 from src.face import Face
 
 
@@ -11,54 +11,521 @@ def _adjust_bounds(ax, points):
     ax.set_ylim(xy_min[1], xy_max[1])
 
 
-def voronoi_diagram_calc(points, face: Face = None):
-    vor = Voronoi(points)
-    if vor.points.shape[1] != 2:
-        raise ValueError("Voronoi diagram is not 2-D")
-
-    center = vor.points.mean(axis=0)
+def polyline(segments):
+    """
+    segments as one polyline, with nan between segments, so that all of them are plotted with one call
+    :param segments: (R,2,2) array of (a,b) of each segment
+    :return: (2,3R) array of x and y coordinates
+    """
+    segments = np.reshape(segments, (-1, 2, 2))
+    return np.concatenate((segments, np.full((len(segments), 1, 2), np.nan)), axis=1).reshape((-1, 2)).T
+
+
+class VoronoiRidges:
+    def __init__(self, pairs, ends, is_ray):
+        """
+        lines of a Voronoi diagram as arrays, instead of a dict of tuples
+        :param pairs: (R,2) int array, indices of the two points that make each line
+        :param ends: (R,2,2) float array, (a,b) of each segment, or (a,direction) of each ray
+        :param is_ray: (R,) boolean array of which lines are rays
+        """
+        self.pairs = pairs
+        self.ends = ends
+        self.is_ray = is_ray
+
+    def __len__(self):
+        return len(self.pairs)
+
+    @staticmethod
+    def from_voronoi(vor):
+        """
+        :param vor: scipy.spatial.Voronoi
+        :return: VoronoiRidges of every line of the diagram
+        """
+        if vor.points.shape[1] != 2:
+            raise ValueError("Voronoi diagram is not 2-D")
+        # pairs of points that create each line
+        pairs = np.asarray(vor.ridge_points, dtype=int).reshape((-1, 2))
+        # two indices of vertices of the vornoi diagram that create each line
+        #   if there is an infinite vertex, there is a -1 here
+        simplices = np.asarray(vor.ridge_vertices, dtype=int).reshape((-1, 2))
+        is_ray = np.any(simplices < 0, axis=1)
+        ends = np.empty((len(pairs), 2, 2))
+        # finite end Voronoi vertex of rays
+        ends[:, 0] = vor.vertices[np.where(simplices[:, 0] >= 0, simplices[:, 0], simplices[:, 1])]
+        ends[~is_ray, 1] = vor.vertices[simplices[~is_ray, 1]]
+        if np.any(is_ray):
+            center = vor.points.mean(axis=0)
+            t = vor.points[pairs[is_ray, 1]] - vor.points[pairs[is_ray, 0]]  # tangent
+            t /= np.linalg.norm(t, axis=1)[:, np.newaxis]
+            n = np.stack((-t[:, 1], t[:, 0]), axis=1)  # normal
+            midpoint = vor.points[pairs[is_ray]].mean(axis=1)
+            direction = np.sign(np.sum((midpoint - center)*n, axis=1))[:, np.newaxis]*n
+            if vor.furthest_site:
+                direction = -direction
+            ends[is_ray, 1] = direction
+        return VoronoiRidges(pairs, ends, is_ray)
+
+    @staticmethod
+    def from_dict(point_pair_to_type_and_line):
+        """
+        :param point_pair_to_type_and_line: dict in the format of voronoi_ridges or voronoi_diagram_calc
+        :return: VoronoiRidges of the same lines, in the same order
+        """
+        pairs = np.array(list(point_pair_to_type_and_line), dtype=int).reshape((-1, 2))
+        ends = np.array([(np.ravel(a), np.ravel(b)) for (_, (a, b)) in point_pair_to_type_and_line.values()],
+                        dtype=float).reshape((-1, 2, 2))
+        is_ray = np.array([seg_type == 'ray' for (seg_type, _) in point_pair_to_type_and_line.values()], dtype=bool)
+        return VoronoiRidges(pairs, ends, is_ray)
+
+    def to_dict(self):
+        """
+        :return: dict of (pair of point indices -> ('segment', (a, b)) or ('ray', (a, direction))), as voronoi_ridges
+        """
+        return {(i, j): ('ray' if ray else 'segment', (ends[0], ends[1]))
+                for (i, j), ends, ray in zip(self.pairs.tolist(), self.ends, self.is_ray)}
+
+    def segments(self):
+        """
+        :return: (R,2,2) array of (a,b) of each line, rays are cut to (a,a+direction)
+        """
+        out = self.ends.copy()
+        out[self.is_ray, 1] += self.ends[self.is_ray, 0]
+        return out
 
-    point_pair_to_type_and_line = dict()
+    def polyline(self):
+        """
+        :return: polyline of every line (see polyline), rays are cut as in segments
+        """
+        return polyline(self.segments())
+
+    def point_segments(self):
+        """
+        segments of the cell of each point (see segments)
+        :return: dict of (point index -> list of (a,b)), points in order of their first line,
+            and lines in order for each point
+        """
+        seg = self.segments()
+        flat = self.pairs.flatten()
+        order = np.argsort(flat, kind='stable')
+        pts, first, counts = np.unique(flat, return_index=True, return_counts=True)
+        groups = np.split(order//2, np.cumsum(counts)[:-1])
+        return {int(pts[u]): [(seg[k, 0], seg[k, 1]) for k in groups[u]] for u in np.argsort(first)}
+
+    def clip(self, face: Face):
+        """
+        restricts every line to a face at once, the same as Face.get_segment_within_bounds on each segment
+            (and Face.get_ray_within_bounds on each ray), but one bound at a time for every line
+            ends within tolerance of the face are kept, and ends outside are moved to where the line crosses a bound,
+            never past the ends of the line
+        :param face: Face to clip to
+        :return: VoronoiRidges of the segments that meet the face
+        """
+        if face.bound_M is None:
+            face._create_bound_arrays()
+        M, bt = face.bound_M, face.bound_b[:, 0] + face.tol
+        P = self.ends[:, 0]
+        V = np.where(self.is_ray[:, np.newaxis], self.ends[:, 1], self.ends[:, 1] - P)
+        # rays are made longer until they end outside the face
+        inside = self.is_ray & np.all((P + V)@M.T <= bt, axis=1)
+        while inside.any():
+            V[inside] *= 2
+            inside[inside] = np.all((P[inside] + V[inside])@M.T <= bt, axis=1)
+        Q = np.where(self.is_ray[:, np.newaxis], P + V, self.ends[:, 1])
+        MP, MQ = P@M.T, Q@M.T
+        p_in = np.all(MP <= bt, axis=1)
+        q_in = np.all(MQ <= bt, axis=1)
+        s_end, end_ok = _exit_parameters(MP, MQ - MP, face)
+        s_start, start_ok = _exit_parameters(MQ, MP - MQ, face)
+        t0 = np.where(p_in, 0., 1 - s_start)
+        t1 = np.where(q_in, 1., s_end)
+        start_ok |= p_in
+        end_ok |= q_in
+        # if only one end was found (due to tolerance), the line is just that point
+        keep = start_ok | end_ok
+        t0, t1 = np.where(start_ok, t0, t1), np.where(end_ok, t1, t0)
+        P, Q, V, t0, t1 = P[keep], Q[keep], V[keep], t0[keep], t1[keep]
+        # ends in the face are kept exactly
+        start = np.where((t0 == 0)[:, np.newaxis], P, P + V*t0[:, np.newaxis])
+        end = np.where((t1 == 1)[:, np.newaxis], Q, P + V*t1[:, np.newaxis])
+        return VoronoiRidges(self.pairs[keep], np.stack((start, end), axis=1), np.zeros(len(P), dtype=bool))
+
+
+def _exit_parameters(MA, MD, face: Face):
+    """
+    Face.get_exit_point for many lines a+sd (0<=s<=1), starting at a and going to the end a+d
+        the end is moved to where the line crosses each bound that a is within and the end is not, in order of the bounds
+    :param MA: (N,m) array of face.bound_M a for each line
+    :param MD: (N,m) array of face.bound_M d for each line
+    :param face: Face
+    :return: ((N,) array of s at the exit point, (N,) boolean array of whether the exit point is within the face)
+    """
+    b = face.bound_b[:, 0]
+    bt = b + face.tol
+    s = np.ones(len(MA))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        s_cross = (b - MA)/MD
+    for k in range(MA.shape[1]):
+        s = np.where((MA[:, k] <= bt[k]) & (MA[:, k] + MD[:, k]*s > bt[k]), s_cross[:, k], s)
+    s = np.clip(s, 0., 1.)
+    return s, np.all(MA + MD*s[:, np.newaxis] <= bt, axis=1)
+
+
+def voronoi_ridges(vor):
+    """
+    lines of a scipy Voronoi diagram
+    :param vor: scipy.spatial.Voronoi
+    :return: dict of (pair of point indices -> ('segment', (a, b)) or ('ray', (a, direction)))
+    """
+    return VoronoiRidges.from_voronoi(vor).to_dict()
 
-    for pointidx, simplex in zip(vor.ridge_points, vor.ridge_vertices):  # iterates through all lines
-        # pointidx: two indices of points that create this line
-        # simplex: two indices of vertices of the vornoi diagram that create this line
-        #       if there is an infinite vertex, there is a -1 here
-        simplex = np.asarray(simplex)
 
-        if np.all(simplex >= 0):
-            point_pair_to_type_and_line[tuple(pointidx)] = ('segment',
-                                                            (vor.vertices[simplex[0]], vor.vertices[simplex[1]]))
+def clip_ridges(point_pair_to_type_and_line, face: Face):
+    """
+    restricts lines of a Voronoi diagram to a face
+    :param point_pair_to_type_and_line: output of voronoi_ridges
+    :param face: Face to clip to
+    :return: dict of (pair of point indices -> ('segment', (a, b))), only the lines that meet the face
+    """
+    return VoronoiRidges.from_dict(point_pair_to_type_and_line).clip(face).to_dict()
 
-        else:
-            i = simplex[simplex >= 0][0]  # finite end Voronoi vertex
 
-            t = vor.points[pointidx[1]] - vor.points[pointidx[0]]  # tangent
-            t /= np.linalg.norm(t)
-            n = np.array([-t[1], t[0]])  # normal
+def voronoi_diagram_calc(points, face: Face = None, as_arrays=False):
+    """
+    :param points: (n,2) array of points
+    :param face: Face to clip the diagram to, if None, the full diagram (with rays)
+    :param as_arrays: whether to return VoronoiRidges instead of a dict
+    :return: dict of (pair of point indices -> ('segment', (a, b)) or ('ray', (a, direction))), or VoronoiRidges
+    """
+    ridges = VoronoiRidges.from_voronoi(Voronoi(points))
+    if face is not None:
+        ridges = ridges.clip(face)
+    if as_arrays:
+        return ridges
+    return ridges.to_dict()
+
+
+class StreamingVoronoi:
+    def __init__(self, points):
+        """
+        voronoi diagram of a set of points that grows and shrinks
+            qhull's incremental mode cannot use option Qbb, and without it, far away points make its vertices wrong,
+                so both adding and removing points recompute only the cells around them,
+                from a (non-incremental) qhull diagram of these points and their neighbors
+            added points only take area from cells with a vertex closer to an added point than to their own point
+                (or a ray going towards an added point), so only these cells and the new ones are recomputed
+                (new ridges are only between these points, and ridges they had before)
+            removed points only give area to their neighbors, so only the cells of their neighbors are recomputed
+                (new ridges are only between neighbors of removed points)
+        points keep the index they were added with, even after other points are removed
+        :param points: (n,2) array of initial points, at least 3 not on a line
+        """
+        self.points = np.array(points, dtype=float)
+        self.active = np.ones(len(self.points), dtype=bool)
+        self.ridges = dict()  # pair of point indices -> line, as in voronoi_ridges
+        self.neighbors = dict()  # point index -> set of indices of points that share a ridge with it
+        self._rebuild()
+
+    def _rebuild(self):
+        """
+        replaces the ridges with the lines of a qhull diagram of every active point
+        """
+        idx = np.flatnonzero(self.active)
+        self.ridges = dict()
+        self.neighbors = {i: set() for i in idx}
+        self._add_ridges(voronoi_ridges(Voronoi(self.points[idx])), idx)
+
+    def _add_ridges(self, point_pair_to_type_and_line, idx, only=None):
+        """
+        adds lines of a diagram of some of the points
+        :param point_pair_to_type_and_line: output of voronoi_ridges
+        :param idx: index in self.points of each point of that diagram
+        :param only: if not None, set of point indices, only adds ridges of these points
+        """
+        for (i, j), ridge in point_pair_to_type_and_line.items():
+            i, j = idx[i], idx[j]
+            if only is not None and i not in only and j not in only:
+                continue
+            self.ridges[(i, j)] = ridge
+            self.neighbors[i].add(j)
+            self.neighbors[j].add(i)
+
+    def _recompute(self, changed, local):
+        """
+        replaces the ridges of some points with the lines of a qhull diagram of these points and their neighbors
+            if qhull fails on these points (too few of them, or all on a line), rebuilds the whole diagram instead
+        :param changed: set of indices of active points whose cells changed
+        :param local: set of indices of active points, every point that may share a ridge with a point of changed
+        :return: set of indices of points whose cells were recomputed
+        """
+        self.ridges = {(i, j): ridge for (i, j), ridge in self.ridges.items() if i not in changed and j not in changed}
+        for j in changed:
+            self.neighbors[j] = set()
+        for k in local - changed:
+            self.neighbors[k] -= changed
+        local = np.array(sorted(local), dtype=int)
+        try:
+            point_pair_to_type_and_line = voronoi_ridges(Voronoi(self.points[local]))
+        except QhullError:
+            self._rebuild()
+            return set(self.neighbors)
+        self._add_ridges(point_pair_to_type_and_line, local, only=changed)
+        return changed
+
+    def _conflicts(self, points):
+        """
+        points whose cells may lose area to new points
+            a vertex of a cell is taken by a new point if it is closer to it than to the point of the cell,
+            and a ray if it goes towards a new point, and since cells are convex, a cell loses area only if one is
+            vertices and rays within rounding of these count as taken, since recomputing more cells is still exact
+        :param points: (n,2) array of new points
+        :return: set of indices of active points
+        """
+        if not self.ridges:
+            return set()
+        pairs = np.array(list(self.ridges), dtype=int)
+        ends = np.array([(np.ravel(a), np.ravel(b)) for (_, (a, b)) in self.ridges.values()], dtype=float)
+        is_ray = np.array([seg_type == 'ray' for (seg_type, _) in self.ridges.values()], dtype=bool)
+        X = np.concatenate((ends[:, 0], ends[~is_ray, 1]), axis=0)
+        owners = np.concatenate((pairs, pairs[~is_ray]), axis=0)
+        r = np.linalg.norm(X - self.points[owners[:, 0]], axis=1)
+        d, _ = cKDTree(points).query(X)
+        taken = d <= r + 1e-9*(1 + r)
+        D = ends[is_ray, 1]
+        ray_owners = pairs[is_ray]
+        towards = np.max(D@points.T, axis=1) - np.sum(D*self.points[ray_owners[:, 0]], axis=1)
+        scale = 1 + np.max(np.abs(points)) + np.max(np.abs(self.points[ray_owners]), initial=0)
+        taken_rays = towards > -1e-9*scale
+        return set(owners[taken].flatten().tolist()) | set(ray_owners[taken_rays].flatten().tolist())
+
+    def add_points(self, points):
+        """
+        adds points and updates the cells around them
+        :param points: (n,2) array of points to add
+        :return: (array of indices of the added points, set of indices of points whose cells changed)
+            the added points are always in the set of changed points
+        """
+        points = np.asarray(points, dtype=float).reshape((-1, 2))
+        idxs = np.arange(len(self.points), len(self.points) + len(points))
+        conflicts = self._conflicts(points)
+        self.points = np.concatenate((self.points, points), axis=0)
+        self.active = np.concatenate((self.active, np.ones(len(points), dtype=bool)))
+        added = set(idxs.tolist())
+        for i in added:
+            self.neighbors[i] = set()
+        changed = conflicts | added
+        local = changed.union(*(self.neighbors[j] for j in conflicts))
+        return idxs, self._recompute(changed, local)
+
+    def remove_points(self, idxs):
+        """
+        removes points and updates the cells around them
+        :param idxs: indices of points to remove
+        :return: set of indices of points whose cells changed
+        """
+        removed = set(int(i) for i in idxs)
+        self.active[list(removed)] = False
+        changed = set().union(*(self.neighbors[i] for i in removed)) - removed
+        local = changed.union(*(self.neighbors[j] for j in changed)) - removed
+        self.ridges = {(i, j): ridge for (i, j), ridge in self.ridges.items() if i not in removed and j not in removed}
+        for i in removed:
+            del self.neighbors[i]
+        if not changed:
+            # the removed points had no cells
+            return changed
+        return self._recompute(changed, local)
+
+    def cell(self, i):
+        """
+        :param i: index of active point
+        :return: list of (a,b) line segments making up its cell, rays are cut to unit length segments
+        """
+        segments = []
+        for j in self.neighbors[i]:
+            seg_type, (a, b) = self.ridges[(i, j)] if (i, j) in self.ridges else self.ridges[(j, i)]
+            if seg_type == 'segment':
+                segments.append((a, b))
+            elif seg_type == 'ray':
+                segments.append((a, a + b))
+            else:
+                raise NotImplementedError
+        return segments
 
-            midpoint = vor.points[pointidx].mean(axis=0)
-            direction = np.sign(np.dot(midpoint - center, n))*n
 
-            if (vor.furthest_site):
-                direction = -direction
-            point_pair_to_type_and_line[tuple(pointidx)] = ('ray',
-                                                            (vor.vertices[i], direction)
-                                                            )
-    if face is not None:
+def clip_polygon(V, labels, n, c, label):
+    """
+    clips a convex polygon to the half-plane n.x<=c
+    :param V: (k,2) array of vertices of polygon, in order
+    :param labels: (k,) array, labels[i] is the label of the edge from V[i] to V[i+1]
+    :param n: (2,) array
+    :param c: scalar
+    :param label: label of the new edge along the line n.x=c
+    :return: (vertices, labels) of clipped polygon, or None if it is empty
+    """
+    side = V@n - c
+    inside = side <= 0
+    if np.all(inside):
+        return V, labels
+    if not np.any(inside):
+        return None
+    out_V = []
+    out_labels = []
+    k = len(V)
+    for i in range(k):
+        j = (i + 1)%k
+        if inside[i]:
+            out_V.append(V[i])
+            out_labels.append(labels[i])
+            if not inside[j]:
+                # the edge leaves the half-plane, and the polygon follows the line back to where it enters
+                out_V.append(V[i] + (V[j] - V[i])*side[i]/(side[i] - side[j]))
+                out_labels.append(label)
+        elif inside[j]:
+            # the edge enters the half-plane
+            out_V.append(V[i] + (V[j] - V[i])*side[i]/(side[i] - side[j]))
+            out_labels.append(labels[i])
+    return np.array(out_V), np.array(out_labels)
+
+
+class ClippedVoronoi:
+    def __init__(self, points, face: Face):
+        """
+        voronoi cells of a set of points, restricted to a (2d) face, without a voronoi diagram of every point
+            each cell is the face clipped by the bisectors of the other points, closest first,
+            stopping once the next point is more than twice as far as the farthest vertex of the cell so far
+            (the bisector of a point this far cannot cut the cell)
+            points that are provably farther from every point of the face than some other point are not clipped at all
+        every cell is a bounded polygon, and its edges are labeled by the index of the point on the other side,
+            or -(e+1) for edge e of the face (from its e-th vertex to the next) if no bisector is on that edge
+            as with the tolerance of Face.within_bounds, cells that only meet the face within tolerance
+            are the vertices of the face they meet (a segment or a single point)
+        points keep their index after other points are removed
+        :param points: (n,2) array of points
+        :param face: Face, with vertices in order
+        """
+        self.points = np.array(points, dtype=float)
+        self.face = face
+        self.active = np.ones(len(self.points), dtype=bool)
+        self.polygon = np.array([v.flatten() for (v, _) in face.get_vertices()])
+        self.cells = dict()  # index of point -> (vertices, labels) of its cell, only for nonempty cells
+        self.emptied = dict()  # index of point with an empty cell -> set of indices of points that clipped it
+        self.flat = set()  # indices of points whose cells only meet the face within tolerance
+        self.culled = np.zeros(len(self.points), dtype=bool)
+        self._update_culled()
+        for i in np.flatnonzero(self.active & ~self.culled):
+            self._set_cell(i)
+
+    def _update_culled(self):
+        """
+        culls points that are farther from the face than r, where every point of the face is at most r from some point
+            since distance to a point is convex, r can be the distance from a point to its farthest vertex of the face
+            the signed distance to the bounds of the face is at most the distance to the face
+        :return: array of indices of points that are no longer culled
+        """
+        active = np.flatnonzero(self.active)
+        P = self.points[active]
+        r = np.min(np.max(np.linalg.norm(P[:, np.newaxis, :] - self.polygon[np.newaxis, :, :], axis=2), axis=1))
+        if self.face.bound_M is None:
+            self.face._create_bound_arrays()
+        lower = np.max(P@self.face.bound_M.T - self.face.bound_b.T, axis=1)
+        culled = np.zeros(len(self.points), dtype=bool)
+        culled[active] = lower > r + self.face.tol
+        unculled = np.flatnonzero(self.culled & ~culled)
+        self.culled = culled
+        return unculled
+
+    def _set_cell(self, i):
+        """
+        clips the cell of point i, and records it if it is nonempty
+        :param i: index of point
+        """
+        p = self.points[i]
+        others = np.flatnonzero(self.active)
+        others = others[others != i]
+        dists = np.linalg.norm(self.points[others] - p, axis=1)
+        order = np.argsort(dists, kind='stable')
+        V = self.polygon
+        labels = -1 - np.arange(len(V))
+        self.cells.pop(i, None)
+        self.emptied.pop(i, None)
+        self.flat.discard(i)
+        flat = False
+        for k, (j, dist) in enumerate(zip(others[order], dists[order])):
+            if dist > 2*np.max(np.linalg.norm(V - p, axis=1)):
+                break
+            q = self.points[j]
+            n, c = q - p, (np.dot(q, q) - np.dot(p, p))/2
+            # points closer to p than q
+            clipped = clip_polygon(V, labels, n, c, j)
+            if clipped is None:
+                on_line = V@n - c <= self.face.tol*np.linalg.norm(n)
+                if not on_line.any():
+                    # any of the points so far may have cut off the last piece
+                    self.emptied[i] = set(int(j) for j in others[order[:k + 1]])
+                    return
+                # the cell only meets the bisector within tolerance, so it is the part of the cell on the bisector
+                #   (as a voronoi cell that meets the face within tolerance)
+                V, labels = V[on_line], np.full(np.sum(on_line), j)
+                flat = True
+                continue
+            V, labels = clipped
+            # edges of the face on the bisector are between the cells of p and q
+            on_line = np.abs(V@n - c) <= self.face.tol*np.linalg.norm(n)
+            labels = np.where((labels < 0) & on_line & np.roll(on_line, -1), j, labels)
+        self.cells[i] = (V, labels)
+        if flat:
+            self.flat.add(i)
+
+    def remove_points(self, idxs):
+        """
+        removes points, and clips again the cells that had an edge with them
+            (removing a point only changes the cells that share an edge with it, or that it helped empty)
+        :param idxs: indices of points to remove
+        :return: set of indices of points whose cells changed
+        """
+        removed = set(int(i) for i in idxs)
+        self.active[list(removed)] = False
+        for i in removed:
+            self.cells.pop(i, None)
+            self.emptied.pop(i, None)
+            self.flat.discard(i)
+        changed = {i for i, (_, labels) in self.cells.items() if removed.intersection(labels)}
+        changed.update(i for i, clippers in self.emptied.items() if removed.intersection(clippers))
+        changed.update(int(i) for i in self._update_culled())
+        for i in changed:
+            self._set_cell(i)
+        return changed
+
+    def cell(self, i):
+        """
+        :param i: index of point
+        :return: list of (a,b) line segments making up the cell of point i in the face (empty if the cell is empty)
+        """
+        if i not in self.cells:
+            return []
+        V, _ = self.cells[i]
+        return [(V[k], V[(k + 1)%len(V)]) for k in range(len(V))]
+
+    def ridges(self, tol=0.):
+        """
+        the cut locus: edges between two cells
+        :param tol: edges shorter than this are left out
+        :return: dict of (pair of point indices -> ('segment', (a, b))), as in voronoi_diagram_calc
+        """
         out = dict()
-        for point_pair in point_pair_to_type_and_line:
-            segtype, (a, b) = point_pair_to_type_and_line[point_pair]
-            if segtype == 'segment':
-                new_seg = face.get_segment_within_bounds(a, b)
-            elif segtype == 'ray':
-                new_seg = face.get_ray_within_bounds(a, b)
-            else:
-                raise Exception(segtype)
-            if new_seg is not None:
-                out[point_pair] = ('segment', new_seg)
+        for i, (V, labels) in self.cells.items():
+            # consecutive edges with the same label are on the same bisector (cells are convex)
+            starts = [k for k in range(len(V)) if labels[k] != labels[k - 1]]
+            runs = [(k, V[k], V[starts[(t + 1)%len(starts)]]) for t, k in enumerate(starts)] or [(0, V[0], V[-1])]
+            for k, a, b in runs:
+                j = labels[k]
+                pair = (min(i, j), max(i, j))
+                if j < 0 or np.linalg.norm(b - a) <= tol:
+                    continue
+                # the edge may also be on the other cell, as a segment or a single point
+                if pair not in out or np.linalg.norm(b - a) > np.linalg.norm(np.subtract(*out[pair][1])):
+                    out[pair] = ('segment', (a, b))
         return out
-    return point_pair_to_type_and_line
 
 
 from src.utils import within_bounds, get_correct_end_points
@@ -272,10 +739,10 @@ if __name__ == '__main__':
         elif segtype == 'ray':
             plt.arrow(a[0], a[1], b[0], b[1], color='black', head_width=.1)
     if fc is not None:
-        vxs = np.zeros((len(fc.vertices) + 1, 2))
-        for i, (vx, _) in enumerate(fc.vertices):
+        vxs = np.zeros((len(fc.get_vertices()) + 1, 2))
+        for i, (vx, _) in enumerate(fc.get_vertices()):
             vxs[i, :] = vx.flatten()
 
-        vxs[-1, :] = fc.vertices[0][0].flatten()
+        vxs[-1, :] = fc.get_vertices()[0][0].flatten()
         plt.plot(vxs[:, 0], vxs[:, 1])
     plt.show()
@@ -0,0 +1,260 @@
+import numpy as np
+
+from src.utils import group_close_rows
+
+
+class BoundPath:
+    def __init__(self, trie, node):
+        """
+        list of (Bound, Face) from the root of a PathTrie to a node
+            only walks up the trie when the elements are actually used
+        :param trie: PathTrie
+        :param node: index of node in trie
+        """
+        self.trie = trie
+        self.node = node
+        self._edges = None
+
+    def edges(self):
+        """
+        :return: list of (Bound, Face) from root to node
+        """
+        if self._edges is None:
+            edges = []
+            node = self.node
+            while node > 0:
+                edges.append(self.trie.edge(node))
+                node = self.trie.parents[node]
+            self._edges = edges[::-1]
+        return self._edges
+
+    def __len__(self):
+        return self.trie.depths[self.node]
+
+    def __getitem__(self, item):
+        return self.edges()[item]
+
+    def __iter__(self):
+        return iter(self.edges())
+
+
+def bound_path_key(bound_path, source):
+    """
+    hashable key of a bound path, which only depends on the faces and bounds along the path
+        BoundPaths are made again on each lookup, and tries are made again when the translation tables are evicted,
+        so the key is the same for a list and for the BoundPath of any PathTrie with the same path
+    :param bound_path: BoundPath, or list of (bound, F)
+    :param source: source Face of the path
+    :return: (source face name,) for the empty path, otherwise (key of the path without its last edge,
+        index of its last bound in the bounds of the face it leaves)
+    """
+    if isinstance(bound_path, BoundPath):
+        return bound_path.trie.path_key(bound_path.node)
+    key = (source.name,)
+    face = source
+    for bound, F in bound_path:
+        key = (key, next(k for k, (bnd, _) in enumerate(face.bounds) if bnd is bound))
+        face = F
+    return key
+
+
+class PathTrie:
+    def __init__(self, root):
+        """
+        trie of face paths starting at the root face
+            each node is a path, stored as its parent node and the last (Bound, Face) of the path
+            each node also keeps the composed translation of its path (for a point p on root, Tp+s is its copy),
+            which is computed once from the translation of its parent,
+            and a lower bound on the length of a geodesic along the path (see Face.face_paths)
+        node 0 is the empty path
+        :param root: Face that every path starts on
+        """
+        self.root = root
+        self.faces = None  # only set for tries loaded with from_arrays, which store edges as bound indices
+        self.bound_indices = None
+        self.path_keys = None  # bound_path_key of each node, made by path_key when first needed
+        self.parents = [-1]
+        self.edges = [None]
+        self.depths = [0]
+        self.reaches = [0.]
+        self.face_names = [root.name]
+        self.T = [np.identity(root.dimension)]
+        self.s = [np.zeros((root.dimension, 1))]
+
+    def __len__(self):
+        return len(self.parents)
+
+    def add_child(self, parent, bound, F, reach=0.):
+        """
+        adds the path of parent extended by bound into face F
+        :param parent: index of parent node
+        :param bound: Bound crossed from the last face of parent
+        :param F: Face that the path ends on
+        :param reach: lower bound on the length of a geodesic along the path
+        :return: index of new node
+        """
+        T, s = bound.concatenate_with(self.T[parent], self.s[parent])
+        self.parents.append(parent)
+        self.edges.append((bound, F))
+        self.depths.append(self.depths[parent] + 1)
+        self.reaches.append(reach)
+        self.face_names.append(F.name)
+        self.T.append(T)
+        self.s.append(s)
+        return len(self.parents) - 1
+
+    def compress(self):
+        """
+        stores the nodes as arrays once the trie is built
+            T is (n,dimension,dimension), s is (n,dimension,1), parents, depths, and reaches are (n,)
+        """
+        self.parents = np.array(self.parents, dtype=int)
+        self.depths = np.array(self.depths, dtype=int)
+        self.reaches = np.array(self.reaches)
+        self.T = np.stack(self.T)
+        self.s = np.stack(self.s)
+
+    def nbytes(self):
+        """
+        approximate memory used by a compressed trie
+            the node arrays, plus a pointer for each node in the lists of face names and edges (and keys, if made)
+        :return: number of bytes
+        """
+        size = sum(arr.nbytes for arr in (self.parents, self.depths, self.reaches, self.T, self.s))
+        if self.edges is None:
+            size += self.bound_indices.nbytes
+        else:
+            size += 8*len(self.edges)
+        if self.path_keys is not None:
+            # a pointer and a pair for each node
+            size += 72*len(self.path_keys)
+        return size + 8*len(self.face_names)
+
+    def edge(self, node):
+        """
+        :param node: index of node, not the root
+        :return: (Bound, Face) that the path of node ends with
+        """
+        if self.edges is None:
+            parent_face = self.faces[self.face_names[self.parents[node]]]
+            return parent_face.bounds[self.bound_indices[node]]
+        return self.edges[node]
+
+    def all_bound_indices(self):
+        """
+        :return: (n,) array, for each node but the root, the index of the bound that its path ends with,
+            in the bounds of the face of its parent
+        """
+        if self.edges is None:
+            return self.bound_indices
+        node_faces = [self.root] + [F for (_, F) in self.edges[1:]]
+        bound_idx = dict()  # face name -> (id of bound -> index of bound)
+        bound_indices = np.zeros(len(self), dtype=int)
+        for node in range(1, len(self)):
+            parent_face = node_faces[self.parents[node]]
+            if parent_face.name not in bound_idx:
+                bound_idx[parent_face.name] = {id(bound): k for k, (bound, _) in enumerate(parent_face.bounds)}
+            bound, _ = self.edges[node]
+            bound_indices[node] = bound_idx[parent_face.name][id(bound)]
+        return bound_indices
+
+    def path_key(self, node):
+        """
+        bound_path_key of the path of a node
+            the keys of every node are made the first time, each from the key of its parent
+        :param node: index of node
+        :return: hashable key
+        """
+        if self.path_keys is None:
+            bound_indices = self.all_bound_indices().tolist()
+            parents = np.asarray(self.parents).tolist()
+            self.path_keys = [(self.root.name,)]
+            for child in range(1, len(self)):
+                self.path_keys.append((self.path_keys[parents[child]], bound_indices[child]))
+        return self.path_keys[node]
+
+    def to_arrays(self, faces):
+        """
+        stores a compressed trie as arrays, so it can be saved with np.savez
+            faces are stored as indices into the face names of the shape,
+            and edges as the index of the bound in the bounds of the parent's face
+        :param faces: dict of (face name -> Face) of the shape the trie was made on
+        :return: dict of (name -> array)
+        """
+        face_idx = {fn: i for i, fn in enumerate(faces)}
+        return {'root': np.array(face_idx[self.root.name]),
+                'faces': np.array([face_idx[fn] for fn in self.face_names], dtype=int),
+                'bounds': self.all_bound_indices(),
+                'parents': self.parents,
+                'depths': self.depths,
+                'reaches': self.reaches,
+                'T': self.T,
+                's': self.s,
+                }
+
+    @staticmethod
+    def from_arrays(faces, arrays):
+        """
+        inverse of to_arrays
+        :param faces: dict of (face name -> Face) of the shape the trie was made on
+        :param arrays: dict of (name -> array) from to_arrays
+        :return: compressed PathTrie
+        """
+        face_names = list(faces)
+        trie = PathTrie(faces[face_names[int(arrays['root'])]])
+        trie.faces = faces
+        trie.edges = None
+        trie.bound_indices = arrays['bounds']
+        trie.face_names = [face_names[i] for i in arrays['faces']]
+        trie.parents = arrays['parents']
+        trie.depths = arrays['depths']
+        trie.reaches = arrays['reaches']
+        trie.T = arrays['T']
+        trie.s = arrays['s']
+        return trie
+
+    def bound_path(self, node):
+        """
+        :param node: index of node
+        :return: BoundPath from root to node
+        """
+        return BoundPath(self, node)
+
+    def translations(self, nodes):
+        """
+        :param nodes: indices of nodes
+        :return: list of (T,s,bound_path) for each node
+        """
+        return [(self.T[node], self.s[node], self.bound_path(node)) for node in nodes]
+
+    def canonical_groups(self, nodes, tol):
+        """
+        groups nodes whose paths give the same translation
+            different face paths often give the same (T,s), and so the same copy of p for every p
+        :param nodes: indices of nodes
+        :param tol: tolerance for two translations to be the same
+        :return: list of arrays of nodes, each sorted by depth, so the first is the shortest path of the group
+        """
+        if len(nodes) == 0:
+            return []
+        nodes = np.asarray(nodes)
+        X = np.concatenate((self.T[nodes].reshape((len(nodes), -1)), self.s[nodes].reshape((len(nodes), -1))),
+                           axis=1)
+        groups = [nodes[group] for group in group_close_rows(X, tol)]
+        return [group[np.argsort(self.depths[group], kind='stable')] for group in groups]
+
+    def canonical_translations(self, groups):
+        """
+        :param groups: list of arrays of nodes with the same translation (see canonical_groups)
+        :return: list of (T,s,bound_paths) for each group, with bound_paths the BoundPath of each node in the group
+        """
+        return [(self.T[group[0]], self.s[group[0]], [self.bound_path(node) for node in group]) for group in groups]
+
+    def stacked_translations(self, groups):
+        """
+        canonical_translations as stacked arrays
+        :param groups: list of arrays of nodes with the same translation (see canonical_groups)
+        :return: (T,s), T is (K,dimension,dimension) and s is (K,dimension), one for each group
+        """
+        nodes = np.array([group[0] for group in groups], dtype=int)
+        return self.T[nodes], self.s[nodes, :, 0]
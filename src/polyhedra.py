@@ -5,10 +5,11 @@ import sympy as sym
 import numpy as np
 
 from src.utils import coltation, get_correct_end_points
-from src.shapes import Shape
+from src.shapes import Shape, augment_point_paths
 from src.face import Face
 from src.bound import Bound
-from src.my_vornoi import voronoi_diagram_calc
+from src.my_vornoi import voronoi_diagram_calc, VoronoiRidges, polyline
+from src.source_unfolding import SourceUnfolding
 
 
 class ConvexPolyhderon(Shape):
@@ -30,25 +31,249 @@ class ConvexPolyhderon(Shape):
                             do_filter=True,
                             intersect_with_face=True,
                             ignore_points_on_locus=False,
+                            prune_face_paths=False,
+                            bound_distance=False,
+                            auto_diameter=False,
                             ):
         """
         implementaiton of algorithm 3
 
         considers a point p and a perticular sink face, finds the cut locus on the sink face
         returns voronoi diagram (set of lines), as well as relevant (points, face bounds, and faces)
+        :param auto_diameter: whether to pick the diameter with settle_diameter, in which case diameter is a cap
+        if self.use_symmetry, p is moved to the representative of the orbit of its face (see get_face_orbits),
+            and the cut locus there is mapped back, so only representative faces need translation tables
+        results are kept in self.memoized_voronoi_diagrams (see DiagramCache), so they are read only
+        """
+        self.check_face_graph()
+        key = self.memoized_voronoi_diagrams.key(p,
+                                                 source_fn,
+                                                 sink_fn,
+                                                 diameter,
+                                                 do_filter,
+                                                 intersect_with_face,
+                                                 ignore_points_on_locus,
+                                                 prune_face_paths,
+                                                 bound_distance,
+                                                 auto_diameter,
+                                                 self.use_symmetry,
+                                                 self.stream_points,
+                                                 self.clip_cells,
+                                                 self.reuse_structure,
+                                                 self.warm_start_filter,
+                                                 )
+        found, voronoi_diagram = self.memoized_voronoi_diagrams.lookup(key)
+        if found:
+            return voronoi_diagram
+        if self.use_symmetry:
+            rep, automorphism = self.get_orbit_representative(source_fn)
+            if rep != source_fn:
+                _, rep_p = automorphism.pull_back_point(source_fn, p)
+                rep_sink_fn = automorphism.preimage_face(sink_fn)
+                voronoi_diagram = self.get_voronoi_diagram(rep_p,
+                                                           rep,
+                                                           rep_sink_fn,
+                                                           diameter,
+                                                           do_filter=do_filter,
+                                                           intersect_with_face=intersect_with_face,
+                                                           ignore_points_on_locus=ignore_points_on_locus,
+                                                           prune_face_paths=prune_face_paths,
+                                                           bound_distance=bound_distance,
+                                                           auto_diameter=auto_diameter,
+                                                           )
+                if auto_diameter:
+                    self.settled_diameters[(source_fn, sink_fn)] = self.settled_diameters[(rep, rep_sink_fn)]
+                return self.memoized_voronoi_diagrams.store(
+                    key, automorphism.map_voronoi_diagram(self.faces, rep, rep_sink_fn, voronoi_diagram))
+        if auto_diameter:
+            diameter = self.settle_diameter(p,
+                                            source_fn,
+                                            sink_fn,
+                                            max_diameter=diameter,
+                                            do_filter=do_filter,
+                                            ignore_points_on_locus=ignore_points_on_locus,
+                                            prune_face_paths=prune_face_paths,
+                                            bound_distance=bound_distance,
+                                            )
+            # settle_diameter needs the distance bounds along face paths, np.inf computes them without skipping paths
+            max_dist = self.get_distance_bound(source_fn) if bound_distance else np.inf
+        else:
+            max_dist = self.get_distance_bound(source_fn) if bound_distance else None
+        voronoi_diagram = self._get_voronoi_diagram(p,
+                                                    source_fn,
+                                                    sink_fn,
+                                                    diameter=diameter,
+                                                    do_filter=do_filter,
+                                                    intersect_with_face=intersect_with_face,
+                                                    ignore_points_on_locus=ignore_points_on_locus,
+                                                    prune_face_paths=prune_face_paths,
+                                                    max_dist=max_dist,
+                                                    )
+        return self.memoized_voronoi_diagrams.store(key, voronoi_diagram)
+
+    def _get_voronoi_diagram(self,
+                             p,
+                             source_fn,
+                             sink_fn,
+                             diameter,
+                             do_filter=True,
+                             intersect_with_face=True,
+                             ignore_points_on_locus=False,
+                             prune_face_paths=False,
+                             max_dist=None,
+                             ):
+        """
+        get_voronoi_diagram with a fixed diameter
+            if self.reuse_structure, the structure of the last cut locus is tried first,
+                compiled (see compile_cut_locus_structure), then clipped again (see reuse_cut_locus_structure)
+        :param max_dist: skip face paths that only allow geodesics longer than this, None if infinite
+        """
+        if self.stream_points and max_dist is None:
+            # the reaches of the copies are only computed with a distance bound
+            max_dist = np.inf
+        if not self.reuse_structure:
+            return self._filter_voronoi_diagram(p,
+                                                source_fn,
+                                                sink_fn,
+                                                diameter=diameter,
+                                                do_filter=do_filter,
+                                                intersect_with_face=intersect_with_face,
+                                                ignore_points_on_locus=ignore_points_on_locus,
+                                                prune_face_paths=prune_face_paths,
+                                                max_dist=max_dist,
+                                                )
+        structure_key = (source_fn, sink_fn, diameter, do_filter, ignore_points_on_locus, prune_face_paths, max_dist)
+        if structure_key in self.cut_locus_structures:
+            structure, compiled = self.cut_locus_structures[structure_key]
+            # the compiled cut locus is checked first, since it is a few array operations
+            reused = None
+            if compiled is not None and do_filter and not ignore_points_on_locus:
+                reused = compiled.evaluate(p)
+            if reused is None:
+                reused = self.reuse_cut_locus_structure(p,
+                                                        source_fn,
+                                                        sink_fn,
+                                                        structure,
+                                                        diameter=diameter,
+                                                        prune=prune_face_paths,
+                                                        max_dist=max_dist,
+                                                        do_filter=do_filter,
+                                                        ignore_points_on_locus=ignore_points_on_locus,
+                                                        )
+            if reused is not None:
+                relevant_points, relevant_bound_paths, relevant_cells, point_pair_to_segment = reused
+                if intersect_with_face:
+                    return point_pair_to_segment, (relevant_points, relevant_bound_paths, relevant_cells)
+                relevant_points, relevant_bound_paths = augment_point_paths(relevant_points, relevant_bound_paths)
+                point_pair_to_segment = voronoi_diagram_calc(points=np.concatenate(relevant_points, axis=1).T)
+                return point_pair_to_segment, (relevant_points, relevant_bound_paths, relevant_cells)
+        voronoi_diagram = self._filter_voronoi_diagram(p,
+                                                       source_fn,
+                                                       sink_fn,
+                                                       diameter=diameter,
+                                                       do_filter=do_filter,
+                                                       intersect_with_face=intersect_with_face,
+                                                       ignore_points_on_locus=ignore_points_on_locus,
+                                                       prune_face_paths=prune_face_paths,
+                                                       max_dist=max_dist,
+                                                       )
+        structure = None
+        if voronoi_diagram is not None:
+            point_pair_to_segment, (_, relevant_bound_paths, _) = voronoi_diagram
+            structure = self.cut_locus_structure(p,
+                                                 source_fn,
+                                                 sink_fn,
+                                                 relevant_bound_paths,
+                                                 point_pair_to_segment,
+                                                 diameter=diameter,
+                                                 prune=prune_face_paths,
+                                                 max_dist=max_dist,
+                                                 )
+        if structure is None:
+            self.cut_locus_structures.pop(structure_key, None)
+        else:
+            self.cut_locus_structures[structure_key] = (structure,
+                                                        self.compile_cut_locus_structure(p,
+                                                                                         source_fn,
+                                                                                         sink_fn,
+                                                                                         structure,
+                                                                                         diameter=diameter,
+                                                                                         prune=prune_face_paths,
+                                                                                         max_dist=max_dist,
+                                                                                         ))
+        return voronoi_diagram
+
+    def _filter_voronoi_diagram(self,
+                                p,
+                                source_fn,
+                                sink_fn,
+                                diameter,
+                                do_filter=True,
+                                intersect_with_face=True,
+                                ignore_points_on_locus=False,
+                                prune_face_paths=False,
+                                max_dist=None,
+                                ):
+        """
+        computes the cut locus of _get_voronoi_diagram by filtering every copy of p
         """
         # TODO: use this for everything
-        vp, bound_paths = self.get_voronoi_points_from_face_paths(p, source_fn, sink_fn, diameter=diameter)
+        if self.stream_points:
+            vp, bound_paths, reaches = self.get_streamed_voronoi_points(p,
+                                                                        source_fn,
+                                                                        sink_fn,
+                                                                        diameter=diameter,
+                                                                        prune=prune_face_paths,
+                                                                        max_dist=max_dist,
+                                                                        )
+        else:
+            vp, bound_paths = self.get_voronoi_points_from_face_paths(p,
+                                                                      source_fn,
+                                                                      sink_fn,
+                                                                      diameter=diameter,
+                                                                      prune=prune_face_paths,
+                                                                      max_dist=max_dist,
+                                                                      )
 
         if len(vp) >= 2:  # if there is only one point, the cut locus does not exist on this face
-            relevant_points, relevant_bound_paths, relevant_cells = self.filter_out_points(
-                vp,
-                bound_paths,
-                self.faces[source_fn],
-                self.faces[sink_fn],
-                do_filter=do_filter,
-                ignore_points_on_locus=ignore_points_on_locus,
-            )
+            if self.stream_points:
+                relevant_points, relevant_bound_paths, relevant_cells = self.filter_out_streamed_points(
+                    vp,
+                    bound_paths,
+                    reaches,
+                    self.faces[source_fn],
+                    self.faces[sink_fn],
+                    do_filter=do_filter,
+                    ignore_points_on_locus=ignore_points_on_locus,
+                )
+            elif self.clip_cells:
+                (relevant_points,
+                 relevant_bound_paths,
+                 relevant_cells,
+                 point_pair_to_segment) = self.filter_out_clipped_points(vp,
+                                                                         bound_paths,
+                                                                         self.faces[source_fn],
+                                                                         self.faces[sink_fn],
+                                                                         do_filter=do_filter,
+                                                                         ignore_points_on_locus=ignore_points_on_locus,
+                                                                         )
+                if relevant_points is None:
+                    return None
+                if intersect_with_face:
+                    return point_pair_to_segment, (relevant_points, relevant_bound_paths, relevant_cells)
+                # the lines outside the sink face still need a voronoi diagram of the relevant points
+                relevant_points, relevant_bound_paths = augment_point_paths(relevant_points, relevant_bound_paths)
+            else:
+                hint_key = (source_fn, sink_fn, diameter, do_filter, ignore_points_on_locus, prune_face_paths, max_dist)
+                relevant_points, relevant_bound_paths, relevant_cells = self.filter_out_points(
+                    vp,
+                    bound_paths,
+                    self.faces[source_fn],
+                    self.faces[sink_fn],
+                    do_filter=do_filter,
+                    ignore_points_on_locus=ignore_points_on_locus,
+                    hint=self.filter_hints.setdefault(hint_key, set()) if self.warm_start_filter else None,
+                )
             if relevant_points is None:
                 return None
             points = np.concatenate(relevant_points, axis=1)
@@ -62,6 +287,126 @@ class ConvexPolyhderon(Shape):
             return point_pair_to_segment, (relevant_points, relevant_bound_paths, relevant_cells)
         return None
 
+    def settle_diameter(self,
+                        p,
+                        source_fn,
+                        sink_fn,
+                        max_diameter=None,
+                        do_filter=True,
+                        ignore_points_on_locus=False,
+                        prune_face_paths=False,
+                        bound_distance=False,
+                        ):
+        """
+        finds a diameter so that longer face paths cannot change the cut locus on the sink face
+            deepens the diameter one step at a time, stopping once this is certified:
+            every point of the sink face has a copy of p at most r away,
+                and this is largest at a vertex of the sink face or an endpoint of the cut locus
+            any copy from a longer face path is at least get_frontier_reach away from every point of the sink face,
+                so if this is more than r, no longer face path gives a closer copy
+        also records the diameter in self.settled_diameters
+        :param max_diameter: cap on the diameter, None if infinite
+            since face paths are simple, the search always ends by the number of faces
+        :return: diameter
+        """
+        max_dist = self.get_distance_bound(source_fn) if bound_distance else np.inf
+        sink = self.faces[sink_fn]
+        diameter = 0
+        while max_diameter is None or diameter < max_diameter:
+            voronoi_diagram = self._get_voronoi_diagram(p,
+                                                        source_fn,
+                                                        sink_fn,
+                                                        diameter=diameter,
+                                                        do_filter=do_filter,
+                                                        intersect_with_face=True,
+                                                        ignore_points_on_locus=ignore_points_on_locus,
+                                                        prune_face_paths=prune_face_paths,
+                                                        max_dist=max_dist,
+                                                        )
+            candidates = [v for (v, _) in sink.get_vertices()]
+            if voronoi_diagram is None:
+                points, _ = self.get_voronoi_points_from_face_paths(p,
+                                                                    source_fn,
+                                                                    sink_fn,
+                                                                    diameter=diameter,
+                                                                    prune=prune_face_paths,
+                                                                    max_dist=max_dist,
+                                                                    )
+                if len(points) != 1:
+                    # either no copies yet, or filtering threw out every copy
+                    points = []
+            else:
+                point_pair_to_segment, (relevant_points, relevant_bound_paths, _) = voronoi_diagram
+                # ignore the far away points added by filter_out_points
+                points = [pt for (pt, pth) in zip(relevant_points, relevant_bound_paths) if pth is not None]
+                for (_, (a, b)) in point_pair_to_segment.values():
+                    candidates.append(a.reshape(-1, 1))
+                    candidates.append(b.reshape(-1, 1))
+            frontier_reach = self.get_frontier_reach(source_fn,
+                                                     diameter,
+                                                     prune=prune_face_paths,
+                                                     max_dist=max_dist,
+                                                     )
+            if frontier_reach == np.inf:
+                # there are no longer face paths
+                break
+            if points:
+                r = max(min(np.linalg.norm(q - pt) for pt in points) for q in candidates)
+                if frontier_reach > r + self.tol:
+                    break
+            diameter += 1
+        self.settled_diameters[(source_fn, sink_fn)] = diameter
+        return diameter
+
+    def source_unfolding(self,
+                         p,
+                         source_fn,
+                         diameter,
+                         do_filter=True,
+                         ignore_points_on_locus=False,
+                         prune_face_paths=False,
+                         bound_distance=False,
+                         auto_diameter=False,
+                         sink_fns=None,
+                         ):
+        """
+        the cut locus on every sink face from p at once, unfolded around p in coordinates of the source face
+            every sink face is found from the same search of face paths from the source face,
+            and the result is shared by everything plotted for this p
+        :param sink_fns: sink faces to include, None for every face
+        other params are the same as get_voronoi_diagram
+        :return: SourceUnfolding
+        """
+        if sink_fns is None:
+            sink_fns = list(self.faces)
+        diagrams = dict()
+        lone_copies = dict()
+        for sink_fn in sink_fns:
+            diagrams[sink_fn] = self.get_voronoi_diagram(p=p,
+                                                         source_fn=source_fn,
+                                                         sink_fn=sink_fn,
+                                                         diameter=diameter,
+                                                         do_filter=do_filter,
+                                                         intersect_with_face=True,
+                                                         ignore_points_on_locus=ignore_points_on_locus,
+                                                         prune_face_paths=prune_face_paths,
+                                                         bound_distance=bound_distance,
+                                                         auto_diameter=auto_diameter,
+                                                         )
+            if diagrams[sink_fn] is None:
+                # the whole face may be the cell of a single copy
+                vp, bound_paths = self.get_voronoi_points_from_face_paths(
+                    p,
+                    source_fn,
+                    sink_fn,
+                    diameter=self.settled_diameters.get((source_fn, sink_fn)) if auto_diameter else diameter,
+                    prune=prune_face_paths,
+                    max_dist=self.get_distance_bound(source_fn) if bound_distance else None,
+                )
+                if len(vp) == 1:
+                    lone_copies[sink_fn] = (vp[0], bound_paths[0][0])
+        return SourceUnfolding(p, source_fn, self.faces, diagrams, lone_copies=lone_copies)
+
     def plot_voronoi_star_unfolding(self,
                                     p,
                                     source_fn,
@@ -69,141 +414,51 @@ class ConvexPolyhderon(Shape):
                                     do_filter=True,
                                     diameter=None,
                                     ignore_points_on_locus=False,
+                                    prune_face_paths=False,
+                                    bound_distance=False,
+                                    auto_diameter=False,
                                     ):
         """
         unfold fixing the source face
-        must check the voronoi plot on every face to do this
+        must check the voronoi plot on every face to do this, which is done once with source_unfolding
 
         """
         if ax is None:
             ax = plt.gca()
 
-        all_stuff = []
-        for sink_fn in self.faces:
-            if sink_fn != source_fn:
-                voronoi_diagram = self.get_voronoi_diagram(p=p,
-                                                           source_fn=source_fn,
-                                                           sink_fn=sink_fn,
-                                                           diameter=diameter,
-                                                           do_filter=do_filter,
-                                                           intersect_with_face=True,
-                                                           ignore_points_on_locus=ignore_points_on_locus,
-                                                           )
-                if voronoi_diagram is not None:
-                    point_pair_to_segment, (relevant_points, _, _) = voronoi_diagram
-                    point_pair_to_segment = {point_pair: (a.reshape((2, 1)), b.reshape((2, 1)))
-                                             for point_pair, (_, (a, b)) in point_pair_to_segment.items()
-                                             }
-                    relevant_points = np.concatenate(relevant_points, axis=1)
-                    all_stuff.append((point_pair_to_segment, relevant_points))
-        contributing_points = [p.flatten()]
-        for sink_fn in self.faces:
-            if sink_fn != source_fn:
-                voronoi_diagram = self.get_voronoi_diagram(p=p,
-                                                           source_fn=source_fn,
-                                                           sink_fn=sink_fn,
-                                                           diameter=diameter,
-                                                           do_filter=do_filter,
-                                                           intersect_with_face=True,
-                                                           ignore_points_on_locus=ignore_points_on_locus,
-                                                           )
-                if voronoi_diagram is not None:
-                    (point_pair_to_segment,
-                     (relevant_points, relevant_bound_paths, relevant_cells)
-                     ) = voronoi_diagram
-                    # keep track of these to figure out which one is our original one
-                    relevant_points = np.concatenate(relevant_points, axis=1)
-
-                    for path in relevant_bound_paths:
-                        temp_points = relevant_points.copy()
-
-                        # TODO: maybe track all possible faces and check if any points line up?
-                        #  if any do, add the thingy
-                        temp_stuff = [({p_p: (a.copy(), b.copy()) for p_p, (a, b) in ppts.items()},
-                                       rp.copy())
-                                      for (ppts, rp) in all_stuff]
-
-                        possible_stuff = []
-                        if path is not None:
-                            segments = dict()
-                            for point_pair in point_pair_to_segment:
-                                (_, (a, b)) = point_pair_to_segment[point_pair]
-                                segments[point_pair] = (a.reshape((2, 1)), b.reshape((2, 1)))
-                            T, s = np.identity(2), np.zeros((2, 1))
-
-                            # list of (v,2) arrays where each column is a vertex
-                            vertex_cycles = []
-                            rotations = []
-                            centers = []
-                            names = []
-
-                            for bnd, F in path[::-1]:  # start with sink face
-                                bnd: Bound
-                                bnd = bnd.get_inverse_bound()
-                                T, s = bnd.concatenate_with(T, s)
-                                num_v = len(F.vertices)
-                                vertex_cycles.append(np.concatenate(
-                                    [F.vertices[i%num_v][0]
-                                     for i in range(1 + num_v)]
-                                    , axis=1))
-                                rotations.append(np.identity(2))  # x vec, y vec
-                                centers.append(F.basepoint.copy())
-                                names.append(str(F.name))
-
-                                # shift point works on arrays as well
-                                vertex_cycles = [bnd.shift_point(vc) for vc in vertex_cycles]
-                                rotations = [bnd.shift_vec(rt) for rt in rotations]
-                                centers = [bnd.shift_point(c) for c in centers]
-                                temp_points = bnd.shift_point(temp_points)
-                                segments = {point_pair: (bnd.shift_point(a), bnd.shift_point(b))
-                                            for point_pair, (a, b) in segments.items()}
-                            distances = np.linalg.norm(temp_points - p, axis=0).flatten()
-                            for point in temp_points.T:
-
-                                if all([np.linalg.norm(cont_pt - point) > self.tol for cont_pt in contributing_points]):
-                                    contributing_points.append(point)
-                            best_indices = np.where(distances <= self.tol)[0]
-                            plot_faces = False
-                            for point_pair, (a, b) in segments.items():
-                                if any([best_idx in point_pair for best_idx in best_indices]):
-                                    plot_faces = True
-
-                                    ax.plot((a[0], b[0]), (a[1], b[1]), color='black', alpha=1, lw=3, zorder=9)
-                                    # ax.scatter((a[0], b[0]), (a[1], b[1]), color='black')
-                            if plot_faces:
-                                for vertices_cycle, rot, c, name in zip(vertex_cycles, rotations, centers, names):
-                                    ax.plot(vertices_cycle[0], vertices_cycle[1], color='blue', alpha=1, lw=1)
-                                    continue
-                                    self._plot_label_face(ax=ax,
-                                                          face=None,
-                                                          name=name,
-                                                          center=c,
-                                                          rot_v=rot[:, (0,)],  # x vector after rotation
-                                                          color='blue',
-                                                          linewidth=1,
-                                                          plot_face=False,
-                                                          )
+        unfolding = self.source_unfolding(p=p,
+                                          source_fn=source_fn,
+                                          diameter=diameter,
+                                          do_filter=do_filter,
+                                          ignore_points_on_locus=ignore_points_on_locus,
+                                          prune_face_paths=prune_face_paths,
+                                          bound_distance=bound_distance,
+                                          auto_diameter=auto_diameter,
+                                          sink_fns=[fn for fn in self.faces if fn != source_fn],
+                                          )
+        cut_locus = []
+        for piece_idx, (_, _, unfolded) in enumerate(unfolding.pieces):
+            segments = unfolding.piece_segments(piece_idx)
+            cut_locus.extend((np.ravel(a), np.ravel(b)) for (a, b) in segments.values())
+            if segments:
+                # plot the faces that the geodesics to this cell go through
+                for F, T, s in unfolded:
+                    num_v = len(F.get_vertices())
+                    vertices_cycle = np.concatenate([F.get_vertices()[i%num_v][0] for i in range(1 + num_v)], axis=1)
+                    vertices_cycle = T@vertices_cycle + s
+                    ax.plot(vertices_cycle[0], vertices_cycle[1], color='blue', alpha=1, lw=1)
+        # every segment of the cut locus at once
+        X, Y = polyline(np.array(cut_locus))
+        ax.plot(X, Y, color='black', alpha=1, lw=3, zorder=9)
         source = self.faces[source_fn]
-        num_v = len(source.vertices)
-        vertices_cycle = [source.vertices[i%num_v][0]
+        num_v = len(source.get_vertices())
+        vertices_cycle = [source.get_vertices()[i%num_v][0]
                           for i in range(1 + num_v)]
         vertices_cycle = np.concatenate(vertices_cycle, axis=1)
         ax.plot(vertices_cycle[0], vertices_cycle[1],
                 color='red')
         ax.scatter(p[0], p[1], color='purple', s=40, zorder=10)  # TODO: mess with zorder
 
-        xlim, ylim = ax.get_xlim(), ax.get_ylim()
-
-        contributing_points = np.stack(contributing_points[1:])
-        # ax.scatter(contributing_points[:, 0],
-        #           contributing_points[:, 1],
-        #           s=10,
-        #           color='purple',
-        #           )
-
-        ax.set_xlim(xlim)
-        ax.set_ylim(ylim)
-
     def _plot_label_face(self,
                          ax,
                          face,
@@ -245,6 +500,9 @@ class ConvexPolyhderon(Shape):
                                  line_label_dist=.3,
                                  point_names=None,
                                  ignore_points_on_locus=False,
+                                 prune_face_paths=False,
+                                 bound_distance=False,
+                                 auto_diameter=False,
                                  ):
         # TODO: maybe do the same thing as above method, calculate cut locus for all faces, paste them together
         """
@@ -259,6 +517,10 @@ class ConvexPolyhderon(Shape):
         :param orient_string: string to add to face annotation to show orientation
         :param do_filter: Whether to filter voronoi cell points based on correctness of paths
                 should probably always be true, unless we are not looking at polyhedra
+        :param prune_face_paths: whether to skip face paths that no straight line passes through
+        :param bound_distance: whether to skip face paths that only allow geodesics longer than get_distance_bound
+        :param auto_diameter: whether to pick the diameter with settle_diameter, in which case diameter is a cap
+            (uses the bound for the whole shape, so one search from the source covers every sink face)
         :param label_diagram: whether to label points and lines
         :param p_label_shift: how to shift the point labels if they exist
         :param point_names: names of the points, list or None
@@ -274,6 +536,9 @@ class ConvexPolyhderon(Shape):
                                                    do_filter=do_filter,
                                                    intersect_with_face=False,
                                                    ignore_points_on_locus=ignore_points_on_locus,
+                                                   prune_face_paths=prune_face_paths,
+                                                   bound_distance=bound_distance,
+                                                   auto_diameter=auto_diameter,
                                                    )
         if voronoi_diagram is None:
             # cut locus does not exist on this face
@@ -435,6 +700,10 @@ class ConvexPolyhderon(Shape):
                      plot_endpoints=False,
                      zorder=None,
                      ignore_points_on_locus=False,
+                     prune_face_paths=False,
+                     bound_distance=False,
+                     auto_diameter=False,
+                     unfolding=None,
                      ):
         """
         creates a voronoi plot for the sink face from p on a souce face
@@ -445,23 +714,35 @@ class ConvexPolyhderon(Shape):
         :param ax: plot to plot on (pyplot, or ax object)
         :param do_filter: Whether to filter voronoi cell points based on correctness of paths
                 should probably always be true, unless we are not looking at polyhedra
+        :param prune_face_paths: whether to skip face paths that no straight line passes through
+        :param bound_distance: whether to skip face paths that only allow geodesics longer than get_distance_bound
+        :param auto_diameter: whether to pick the diameter with settle_diameter, in which case diameter is a cap
+            (uses the bound for the whole shape, so one search from the source covers every sink face)
+        :param unfolding: SourceUnfolding of p to take the cut locus from, computed for just this face if None
         :return: whether we were successful
         """
-        voronoi_diagram = self.get_voronoi_diagram(p=p,
-                                                   source_fn=source_fn,
-                                                   sink_fn=sink_fn,
-                                                   diameter=diameter,
-                                                   do_filter=do_filter,
-                                                   intersect_with_face=True,
-                                                   ignore_points_on_locus=ignore_points_on_locus,
-                                                   )
+        if unfolding is not None:
+            voronoi_diagram = unfolding.cut_locus(sink_fn)
+        else:
+            voronoi_diagram = self.get_voronoi_diagram(p=p,
+                                                       source_fn=source_fn,
+                                                       sink_fn=sink_fn,
+                                                       diameter=diameter,
+                                                       do_filter=do_filter,
+                                                       intersect_with_face=True,
+                                                       ignore_points_on_locus=ignore_points_on_locus,
+                                                       prune_face_paths=prune_face_paths,
+                                                       bound_distance=bound_distance,
+                                                       auto_diameter=auto_diameter,
+                                                       )
         if voronoi_diagram is not None:
             point_pair_to_seg, _ = voronoi_diagram
-            for point_pair in point_pair_to_seg:
-                _, (p, q) = point_pair_to_seg[point_pair]
-                ax.plot((p[0], q[0]), (p[1], q[1]), color='black', lw=2, alpha=1, zorder=zorder)
-                if plot_endpoints:
-                    ax.scatter((p[0], q[0]), (p[1], q[1]), color='black', alpha=1, s=6.9, zorder=zorder)
+            ridges = VoronoiRidges.from_dict(point_pair_to_seg)
+            X, Y = ridges.polyline()
+            ax.plot(X, Y, color='black', lw=2, alpha=1, zorder=zorder)
+            if plot_endpoints:
+                ends = ridges.segments().reshape((-1, 2))
+                ax.scatter(ends[:, 0], ends[:, 1], color='black', alpha=1, s=6.9, zorder=zorder)
             return True
         return False
 
@@ -560,6 +841,9 @@ class ConvexPolyhderon(Shape):
                                 do_filter=True,
                                 font_size=None,
                                 ignore_points_on_locus=False,
+                                prune_face_paths=False,
+                                bound_distance=False,
+                                auto_diameter=False,
                                 mark_points=(),
                                 ):
         """
@@ -577,6 +861,10 @@ class ConvexPolyhderon(Shape):
             (none if not saved)
         :param do_filter: Whether to filter voronoi cell points based on correctness of paths
                 should probably always be true, unless we are not looking at polyhedra
+        :param prune_face_paths: whether to skip face paths that no straight line passes through
+        :param bound_distance: whether to skip face paths that only allow geodesics longer than get_distance_bound
+        :param auto_diameter: whether to pick the diameter with settle_diameter, in which case diameter is a cap
+            (uses the bound for the whole shape, so one search from the source covers every sink face)
         :param font_size: font size to use for plot (default if None)
         :param mark_points: points to always mark, list of (face id, x, y, color)
         """
@@ -619,6 +907,15 @@ class ConvexPolyhderon(Shape):
             ax.scatter(p[0, 0], p[1, 0], color='purple')
 
             source_fn = fc.name
+            unfolding = self.source_unfolding(p,
+                                              source_fn,
+                                              diameter=diameter,
+                                              do_filter=do_filter,
+                                              ignore_points_on_locus=ignore_points_on_locus,
+                                              prune_face_paths=prune_face_paths,
+                                              bound_distance=bound_distance,
+                                              auto_diameter=auto_diameter,
+                                              )
 
             for i in range(n):
                 for j in range(m):
@@ -634,6 +931,10 @@ class ConvexPolyhderon(Shape):
                                           plot_endpoints=False,
                                           zorder=10,
                                           ignore_points_on_locus=ignore_points_on_locus,
+                                          prune_face_paths=prune_face_paths,
+                                          bound_distance=bound_distance,
+                                          auto_diameter=auto_diameter,
+                                          unfolding=unfolding,
                                           )
                         for (mpx, mpy), c in mark_dict.get(str(face.name), []):
                             if c is not None:
@@ -678,6 +979,11 @@ class ConvexPolyhderon(Shape):
                         if face.name == fn:
                             I, J = i, j
             full_v_plot_from_point_axis(p, ploot(I, J))
+            if auto_diameter:
+                print('diameter settled on for each sink face:')
+                for sink_fn in self.faces:
+                    if (fn, sink_fn) in self.settled_diameters:
+                        print('\t' + str(sink_fn) + ':', self.settled_diameters[(fn, sink_fn)])
         if save is not None:
             plt.savefig(save)
             print('saving to', save)
@@ -703,6 +1009,9 @@ class ConvexPolyhderon(Shape):
                            point_names=None,
                            voronoi_star=False,
                            ignore_points_on_locus=False,
+                           prune_face_paths=False,
+                           bound_distance=False,
+                           auto_diameter=False,
                            ):
         """
         :param figsize: initial figure size (inches)
@@ -720,6 +1029,10 @@ class ConvexPolyhderon(Shape):
         :param orient_string: string to add onto face annotation to show orientation
         :param do_filter: Whether to filter voronoi cell points based on correctness of paths
                 should probably always be true, unless we are not looking at polyhedra
+        :param prune_face_paths: whether to skip face paths that no straight line passes through
+        :param bound_distance: whether to skip face paths that only allow geodesics longer than get_distance_bound
+        :param auto_diameter: whether to pick the diameter with settle_diameter, in which case diameter is a cap
+            (uses the bound for the whole shape, so one search from the source covers every sink face)
         :param font_size: font size to use for plot (default if None)
         :param label_diagram: whether to label points and lines
         :param p_label_shift: how to shift the point labels if they exist
@@ -785,6 +1098,9 @@ class ConvexPolyhderon(Shape):
                                                      do_filter=do_filter,
                                                      diameter=diameter,
                                                      ignore_points_on_locus=ignore_points_on_locus,
+                                                     prune_face_paths=prune_face_paths,
+                                                     bound_distance=bound_distance,
+                                                     auto_diameter=auto_diameter,
                                                      )
 
                     plt.xticks([])
@@ -806,7 +1122,13 @@ class ConvexPolyhderon(Shape):
                         line_label_dist=line_label_dist,
                         point_names=point_names,
                         ignore_points_on_locus=ignore_points_on_locus,
+                        prune_face_paths=prune_face_paths,
+                        bound_distance=bound_distance,
+                        auto_diameter=auto_diameter,
                     )
+                    if auto_diameter:
+                        print('diameter settled on:', self.settled_diameters[(self.extra_data['unwrap_source_fn'],
+                                                                             self.extra_data['unwrap_sink_fn'])])
                     print('point locations:')
                     for i, (zero, xvec, yvec, p) in enumerate(all_trans_shown):
                         if point_names is not None and i < len(point_names):
@@ -846,6 +1168,15 @@ class ConvexPolyhderon(Shape):
                         for j in range(m):
                             ploot(i, j).cla()
                     self.plot_face_boundaries(axs, legend=legend)
+                    unfolding = self.source_unfolding(self.extra_data['p'],
+                                                      self.extra_data['unwrap_source_fn'],
+                                                      diameter=diameter,
+                                                      do_filter=do_filter,
+                                                      ignore_points_on_locus=ignore_points_on_locus,
+                                                      prune_face_paths=prune_face_paths,
+                                                      bound_distance=bound_distance,
+                                                      auto_diameter=auto_diameter,
+                                                      )
                     for i in range(n):
                         for j in range(m):
                             face = face_map(i, j)
@@ -857,6 +1188,10 @@ class ConvexPolyhderon(Shape):
                                                   ax=ploot(i, j),
                                                   do_filter=do_filter,
                                                   ignore_points_on_locus=ignore_points_on_locus,
+                                                  prune_face_paths=prune_face_paths,
+                                                  bound_distance=bound_distance,
+                                                  auto_diameter=auto_diameter,
+                                                  unfolding=unfolding,
                                                   )
                                 ploot(i, j).set_xlim(xlim)
                                 ploot(i, j).set_ylim(ylim)
@@ -904,6 +1239,15 @@ class ConvexPolyhderon(Shape):
             ax.scatter(p[0, 0], p[1, 0], color='purple', alpha=.5)
 
             source_fn = fc.name
+            unfolding = self.source_unfolding(p,
+                                              source_fn,
+                                              diameter=diameter,
+                                              do_filter=do_filter,
+                                              ignore_points_on_locus=ignore_points_on_locus,
+                                              prune_face_paths=prune_face_paths,
+                                              bound_distance=bound_distance,
+                                              auto_diameter=auto_diameter,
+                                              )
 
             for i in range(n):
                 for j in range(m):
@@ -917,6 +1261,10 @@ class ConvexPolyhderon(Shape):
                                           ax=ploot(i, j),
                                           do_filter=do_filter,
                                           ignore_points_on_locus=ignore_points_on_locus,
+                                          prune_face_paths=prune_face_paths,
+                                          bound_distance=bound_distance,
+                                          auto_diameter=auto_diameter,
+                                          unfolding=unfolding,
                                           )
                         ploot(i, j).set_xlim(xlim)
                         ploot(i, j).set_ylim(ylim)
@@ -944,6 +1292,9 @@ class ConvexPolyhderon(Shape):
                    voronoi=None,
                    do_filter=True,
                    ignore_points_on_locus=False,
+                   prune_face_paths=False,
+                   bound_distance=False,
+                   auto_diameter=False,
                    ):
         """
         plots all faces of graph
@@ -954,6 +1305,10 @@ class ConvexPolyhderon(Shape):
         :param voronoi: list of (p, source face, diameter) points to use in the vornoi plot
         :param do_filter: Whether to filter voronoi cell points based on correctness of paths
                 should probably always be true, unless we are not looking at polyhedra
+        :param prune_face_paths: whether to skip face paths that no straight line passes through
+        :param bound_distance: whether to skip face paths that only allow geodesics longer than get_distance_bound
+        :param auto_diameter: whether to pick the diameter with settle_diameter, in which case diameter is a cap
+            (uses the bound for the whole shape, so one search from the source covers every sink face)
         """
         face_map, n, m = self.faces_to_plot_n_m()
 
@@ -986,6 +1341,9 @@ class ConvexPolyhderon(Shape):
                                                                 ax=ploot(i, j),
                                                                 do_filter=do_filter,
                                                                 ignore_points_on_locus=ignore_points_on_locus,
+                                                                prune_face_paths=prune_face_paths,
+                                                                bound_distance=bound_distance,
+                                                                auto_diameter=auto_diameter,
                                                                 )
                         ploot(i, j).set_xlim(xlim)
                         ploot(i, j).set_ylim(ylim)
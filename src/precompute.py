@@ -0,0 +1,97 @@
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+import numpy as np
+
+from src.path_trie import PathTrie
+
+# shape of the worker processes, set once by _init_worker so it is not sent with each task
+_worker_shape = None
+
+
+def _init_worker(shape):
+    global _worker_shape
+    _worker_shape = shape
+
+
+def _to_shared(arrays):
+    """
+    copies arrays into shared memory blocks
+    :param arrays: dict of (name -> array)
+    :return: dict of (name -> (block name, shape, dtype)), small enough to send back to the parent
+    """
+    out = dict()
+    for name, arr in arrays.items():
+        # not ascontiguousarray, which makes 0-d arrays (like the root of a PathTrie) 1-d
+        arr = np.asarray(arr, order='C')
+        block = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+        np.ndarray(arr.shape, dtype=arr.dtype, buffer=block.buf)[...] = arr
+        out[name] = (block.name, arr.shape, arr.dtype.str)
+        block.close()
+        # the parent process unlinks the block once it is read, so the worker must not clean it up when it exits
+        resource_tracker.unregister(block._name, 'shared_memory')
+    return out
+
+
+def _from_shared(handles):
+    """
+    inverse of _to_shared, frees the shared memory blocks
+    :param handles: dict of (name -> (block name, shape, dtype))
+    :return: dict of (name -> array)
+    """
+    out = dict()
+    for name, (block_name, shape, dtype) in handles.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        out[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf).copy()
+        block.close()
+        block.unlink()
+    return out
+
+
+def _source_translations(source_fn, diameter, prune, max_dist):
+    """
+    worker task, builds the PathTrie of one source face and groups its nodes by sink face
+    :return: shared memory handles of the arrays of the trie (see PathTrie.to_arrays),
+        along with 'nodes_i' and 'offsets_i' for the groups of the i-th sink face
+    """
+    shape = _worker_shape
+    trie, sink_nodes = shape.get_path_trie(source_fn, diameter=diameter, prune=prune, max_dist=max_dist)
+    arrays = trie.to_arrays(shape.faces)
+    for i, fn in enumerate(shape.faces):
+        groups = trie.canonical_groups(sink_nodes[fn], tol=shape.tol)
+        arrays['nodes_' + str(i)] = np.concatenate(groups) if groups else np.zeros(0, dtype=int)
+        arrays['offsets_' + str(i)] = np.cumsum([0] + [len(group) for group in groups])
+    return _to_shared(arrays)
+
+
+def precompute_translations(shape, diameter, workers=None, prune=False, bound_distance=False):
+    """
+    fills in the memo of shape.get_voronoi_translations for every (source, sink) pair of faces
+        spreads the source faces across a pool of processes, since each source is a separate search
+        the tables come back through shared memory as arrays, instead of pickling Bound objects
+    uses the same memo keys as ConvexPolyhderon.get_voronoi_diagram, so later calls with these arguments are hits
+    :param shape: Shape
+    :param diameter: cap on length of face path to consider, None if infinite
+    :param workers: number of processes, None uses every core
+    :param prune: whether to skip face paths that no straight line passes through
+    :param bound_distance: whether to skip face paths that only allow geodesics longer than get_distance_bound
+    """
+    face_names = list(shape.faces)
+    # with shape.use_symmetry, only the orbit representatives are searched, and the rest are mapped from them
+    source_fns = list(shape.get_face_orbits()) if shape.use_symmetry else face_names
+    max_dists = {source_fn: (shape.get_distance_bound(source_fn) if bound_distance else None)
+                 for source_fn in face_names}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(shape,)) as pool:
+        futures = {source_fn: pool.submit(_source_translations, source_fn, diameter, prune, max_dists[source_fn])
+                   for source_fn in source_fns}
+        for source_fn, future in futures.items():
+            arrays = _from_shared(future.result())
+            trie = PathTrie.from_arrays(shape.faces, arrays)
+            for i, sink_fn in enumerate(face_names):
+                nodes = arrays['nodes_' + str(i)]
+                offsets = arrays['offsets_' + str(i)]
+                groups = [nodes[offsets[j]:offsets[j + 1]] for j in range(len(offsets) - 1)]
+                shape.memoized_face_translations[(source_fn, sink_fn, diameter, prune, max_dists[source_fn])] = (
+                    trie, groups)
+    for source_fn in face_names:
+        if (source_fn, source_fn, diameter, prune, max_dists[source_fn]) not in shape.memoized_face_translations:
+            shape.fill_memo_from_symmetry(source_fn, diameter=diameter, prune=prune, max_dist=max_dists[source_fn])
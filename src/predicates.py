@@ -0,0 +1,61 @@
+from fractions import Fraction
+
+import numpy as np
+
+# machine epsilon of floats, twice the unit roundoff
+EPS = np.finfo(float).eps
+
+
+def exact_array(x):
+    """
+    :param x: float or array of floats
+    :return: object array of Fractions with exactly the values of x (every float is a rational number)
+    """
+    return np.vectorize(Fraction, otypes=[object])(x)
+
+
+def halfspaces_contain(P, M, b, slack=0.):
+    """
+    whether M p<=b+slack for many points and half-spaces, exactly for the float values given
+        evaluated with floats, and again with Fractions only where the float result is within its error bound
+        so the answer does not depend on the order of float operations (e.g. a single point or a batch)
+    :param P: (N,d) array of points
+    :param M: (m,d) array
+    :param b: (m,) array
+    :param slack: scalar added to b, usually a tolerance
+    :return: (N,m) boolean array
+    """
+    MP = P@M.T
+    rhs = b + slack
+    out = MP <= rhs
+    # error of a dot product of length d, and of the sum on the right hand side
+    err = (P.shape[1] + 2)*EPS*(np.abs(P)@np.abs(M).T + np.abs(rhs))
+    unsure = np.abs(MP - rhs) <= err
+    if unsure.any():
+        for n, k in zip(*np.nonzero(unsure)):
+            if np.isfinite(err[n, k]):
+                out[n, k] = (sum(Fraction(m)*Fraction(x) for m, x in zip(M[k], P[n])) <=
+                             Fraction(b[k]) + Fraction(slack))
+    return out
+
+
+def orientation(A, B, C):
+    """
+    sign of (B-A)x(C-A) for rows of A,B,C, exactly for the float values given
+        uses the error bound of Shewchuk's orient2d to decide when the float result is not enough
+    :param A: (N,2) array
+    :param B: (N,2) array
+    :param C: (N,2) array
+    :return: (N,) int array, 1 if C is left of the line A->B, -1 if right, 0 if on it
+    """
+    left = (B[:, 0] - A[:, 0])*(C[:, 1] - A[:, 1])
+    right = (B[:, 1] - A[:, 1])*(C[:, 0] - A[:, 0])
+    det = left - right
+    out = np.sign(det).astype(int)
+    with np.errstate(invalid='ignore'):
+        unsure = (np.abs(det) <= 2*EPS*(np.abs(left) + np.abs(right))) & np.isfinite(det)
+    for n in np.flatnonzero(unsure):
+        a, b, c = (exact_array(X[n]) for X in (A, B, C))
+        exact_det = (b[0] - a[0])*(c[1] - a[1]) - (b[1] - a[1])*(c[0] - a[0])
+        out[n] = (exact_det > 0) - (exact_det < 0)
+    return out
@@ -551,6 +551,9 @@ class Mirror(ConvexPolyhderon):
 
 
 class NTorus(ConvexPolyhderon):
+    # the gluing maps generate a lattice
+    group_paths = True
+
     def __init__(self, n, tolerance=.001):
         """
         makes n-torus, single face
@@ -571,6 +574,9 @@ class NTorus(ConvexPolyhderon):
 
 
 class LargeNTorus(ConvexPolyhderon):
+    # the gluing maps generate a lattice
+    group_paths = True
+
     def __init__(self, n, tolerance=.001):
         """
         makes n-torus, 2^n faces, each dimension is 2 faces long
@@ -1,8 +1,24 @@
+import hashlib
+import heapq
+import json
+from collections import deque
+import os
 import numpy as np
 
-from src.my_vornoi import voronoi_diagram_calc
+from src.my_vornoi import voronoi_diagram_calc, StreamingVoronoi, ClippedVoronoi
 from src.bound import Bound
 from src.face import Face
+from src.path_trie import PathTrie, bound_path_key
+from src.automorphism import find_automorphism
+from src.translation_cache import TranslationCache
+from src.diagram_cache import DiagramCache
+from src.compiled_locus import CompiledCutLocus, path_edges
+from src.predicates import EPS, exact_array, orientation
+from src.utils import group_close_rows
+
+# bound on how much the float error of moving points across one face can grow, in units of EPS times their size
+#   (see check_if_valid)
+PATH_ERROR_GROWTH = 64
 
 
 def project_p_onto_line(p, a, v):
@@ -18,7 +34,82 @@ def project_p_onto_line(p, a, v):
     return a + v*(np.dot(v.T, p - a))/np.square(np.linalg.norm(v))
 
 
+def cell_half_planes(segments, p=None):
+    """
+    writes a convex cell as an intersection of half-planes
+        for each segment (a,b), the half-plane is the side of the line extending (a,b) that has an interior point p
+    :param segments: list of (a,b) line segments making up cell
+    :param p: interior point (column vector), if None, just takes average of vertices in segments
+    :return: (H,c), H is (m,2) and c is (m,), a point v is within the cell iff Hv<=c
+        H is nan for segments of length 0, and 0 for segments whose line goes through p
+    """
+    if not segments:
+        return np.zeros((0, 2)), np.zeros(0)
+    A = np.array([np.ravel(a) for (a, _) in segments])
+    B = np.array([np.ravel(b) for (_, b) in segments])
+    if p is None:
+        p = (A.sum(axis=0) + B.sum(axis=0))/(2*len(segments))
+    p = np.ravel(p)
+    D = B - A
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # vector pointing 'outside' each segment, from p to its projection onto the line extending the segment
+        outside = A + D*(np.sum((p - A)*D, axis=1)/np.sum(D*D, axis=1))[:, np.newaxis] - p
+        norms = np.linalg.norm(outside, axis=1)[:, np.newaxis]
+        H = np.where(norms == 0, 0., outside/norms)
+    return H, np.sum(H*A, axis=1)
+
+
+def points_within_cells(V, half_planes):
+    """
+    checks any number of points against any number of cells at once
+    :param V: (N,2) array of points
+    :param half_planes: list of K (H,c) from cell_half_planes
+    :return: (K,N) boolean array, entry (k,n) is whether V[n] is within cell k
+    """
+    m = max([len(c) for (_, c) in half_planes], default=0)
+    # pad with the half-plane 0<=0, which every point is in
+    H = np.zeros((len(half_planes), m, 2))
+    c = np.zeros((len(half_planes), m))
+    for k, (H_k, c_k) in enumerate(half_planes):
+        H[k, :len(c_k)] = H_k
+        c[k, :len(c_k)] = c_k
+    return np.all(np.einsum('kmd,nd->kmn', H, V) <= c[:, :, np.newaxis], axis=1)
+
+
+def far_points(pts):
+    """
+    4 points in the corners of an extremely large bounding box, far enough away to not affect the voronoi cells of pts
+    :param pts: list of column vector points (must be populated)
+    :return: list of 4 column vectors
+    """
+    large = 69*(sum(np.linalg.norm(p) for p in pts) + 1)
+    shape = pts[0].shape
+    vs = [np.ones(shape)]
+    vs.append(vs[0].copy())
+    vs[1][0, 0] = -vs[1][0, 0]
+    vs.append(-vs[0])
+    vs.append(-vs[1])
+    return [large*v for v in vs]
+
+
+def augment_point_paths(pts, bnd_paths):
+    """
+    adds 4 large points (see far_points) so that the vornoi diagram is always defined
+    :param pts: array of column vector points (must be populated)
+    :param bnd_paths: array of paths (will add 'None' to this)
+    :return (points, bound_paths), both sorted by angle of point for non-augmented points, and augmented at end
+    """
+    together = list(zip(pts, bnd_paths))
+    together.sort(key=lambda x: np.arctan2(x[0][1, 0], x[0][0, 0])%(2*np.pi))
+    for large_pt in far_points(pts):
+        together.append((large_pt, None))
+    return [p for (p, _) in together], [pth for (_, pth) in together]
+
+
 class Shape:
+    # whether the gluing maps generate a discrete group, so get_path_trie lists its elements (see get_group_path_trie)
+    group_paths = False
+
     def __init__(self, tolerance, faces=None):
         """
         A set of faces, representing a shape
@@ -32,7 +123,18 @@ class Shape:
         self.tol = tolerance
         self.faces = {face.name: face for face in faces}
         self.points = {face.name: [] for face in self.faces}
-        self.memoized_face_translations = dict()
+        self.memoized_face_translations = TranslationCache()
+        self.memoized_voronoi_diagrams = DiagramCache()
+        self.settled_diameters = dict()
+        self.use_symmetry = False  # whether to map translation tables from symmetric faces (see get_automorphism)
+        self.stream_points = False  # whether to stream copies of p into the diagram (see filter_out_streamed_points)
+        self.clip_cells = False  # whether to clip cells to the sink face directly (see filter_out_clipped_points)
+        self.reuse_structure = False  # whether to first try the cut locus structure of the last p (see reuse_cut_locus_structure)
+        self.cut_locus_structures = dict()  # key -> (cut_locus_structure, compile_cut_locus_structure of it)
+        self.warm_start_filter = False  # whether to first filter the copies needed last time (see filter_out_hinted_points)
+        self.filter_hints = dict()  # key -> set of bound_path_key of the bound paths needed by the last query
+        self.automorphisms = dict()
+        self.face_orbits = None
         self.seen_bounds = []
         self.extra_legend = None
         self.extra_data = dict()
@@ -98,39 +200,429 @@ class Shape:
         for point in points:
             self.add_point_to_face(point, fn, point_info=point_info)
 
-    def _get_voronoi_translations(self, source_fn, sink_fn, diameter=None):
+    def get_distance_bound(self, source_fn, sink_fn=None):
+        """
+        upper bound on the geodesic distance from any point of the source face to any point of the sink face
+            any path of faces gives a curve from p to q through the basepoint of each face,
+            which is at most twice the circumradius of each face long
+            we find the shortest of these with Dijkstra
+        :param source_fn: face name of source
+        :param sink_fn: face name of sink, if None, bounds the distance to every face
+        :return: scalar
+        """
+        weights = {fn: 2*self.faces[fn].get_circumradius() for fn in self.faces}
+        dist = {source_fn: weights[source_fn]}
+        heap = [(dist[source_fn], 0, source_fn)]
+        counter = 1  # tiebreaker, since face names might not be comparable
+        while heap:
+            d, _, fn = heapq.heappop(heap)
+            if fn == sink_fn:
+                return d
+            if d > dist[fn]:
+                continue
+            for (_, F) in self.faces[fn].bounds:
+                if F.name not in dist or d + weights[F.name] < dist[F.name]:
+                    dist[F.name] = d + weights[F.name]
+                    heapq.heappush(heap, (dist[F.name], counter, F.name))
+                    counter += 1
+        if sink_fn is None:
+            return max(dist.values())
+        return None
+
+    def _path_translation(self, source, path):
+        """
+        composes the bounds along a face path
+        :param source: source face
+        :param path: (Bound,Face) list from source face to sink face
+        :return: (T,s,bound_path) where Tp+s translates p to sink face
+        """
+        T, s = np.identity(source.dimension), np.zeros((source.dimension, 1))
+        bound_path = []
+        for (bound, F) in path:
+            bound: Bound
+            bound_path.append((bound, F))
+            T, s = bound.concatenate_with(T, s)
+        return T, s, bound_path
+
+    def _get_voronoi_translations(self, source_fn, sink_fn, diameter=None, prune=False, max_dist=None):
         """
         full version of get_voronoi_translations
         """
         source: Face = self.faces[source_fn]
         translations = []
-        for path in source.face_paths_to(sink_fn, diameter=diameter):
-            T, s = np.identity(source.dimension), np.zeros((source.dimension, 1))
-            bound_path = []
-            for (bound, F) in path:
-                bound: Bound
-                bound_path.append((bound, F))
-                T, s = bound.concatenate_with(T, s)
-            translations.append((T, s, bound_path))
+        for path in source.face_paths_to(sink_fn, diameter=diameter, prune=prune, max_dist=max_dist):
+            translations.append(self._path_translation(source, path))
         return translations
 
-    def get_voronoi_translations(self, source_fn, sink_fn, diameter=None):
+    def get_path_trie(self, source_fn, diameter=None, prune=False, max_dist=None):
+        """
+        stores every face path from the source face in a PathTrie, with a single search
+        :param source_fn: face name of source
+        :param diameter: cap on length of face path to consider, None if infinite
+        :param prune: whether to skip face paths that no straight line passes through
+        :param max_dist: skip face paths that only allow geodesics longer than this, None if infinite
+            can also be a dict of (sink face name -> max_dist)
+        :return: (PathTrie, dict of (sink face name -> array of indices of the nodes that end on that face))
+            if group_paths, this is get_group_path_trie, and prune is ignored
+        """
+        if self.group_paths:
+            return self.get_group_path_trie(source_fn, diameter=diameter, max_dist=max_dist)
+        source: Face = self.faces[source_fn]
+        if isinstance(max_dist, dict):
+            sink_dists = max_dist
+        else:
+            sink_dists = {fn: max_dist for fn in self.faces}
+        search_dist = None
+        if all(sink_dists.get(fn) is not None for fn in self.faces):
+            search_dist = max(sink_dists.values())
+
+        trie = PathTrie(source)
+        sink_nodes = {fn: [] for fn in self.faces}
+        stack = [0]  # node indices of the prefixes of the current path, paths come in DFS order
+        for path, reach in source.face_paths(diameter=diameter, prune=prune, max_dist=search_dist):
+            if path:
+                del stack[len(path):]
+                bound, F = path[-1]
+                stack.append(trie.add_child(stack[-1], bound, F, reach=reach))
+            node = stack[-1]
+            sink_fn = trie.face_names[node]
+            if sink_dists.get(sink_fn) is not None and reach > sink_dists[sink_fn] + source.tol:
+                continue
+            sink_nodes[sink_fn].append(node)
+        trie.compress()
+        return trie, {fn: np.array(nodes, dtype=int) for fn, nodes in sink_nodes.items()}
+
+    def get_group_path_trie(self, source_fn, diameter=None, max_dist=None):
+        """
+        get_path_trie for shapes whose gluing maps generate a discrete group (like a lattice or a reflection group)
+            on flat shapes like tori, face paths are words in the gluing maps,
+            and many words give the same element (F,T,s) of the group
+            this searches words breadth first and keeps only the first word of each element,
+            so it takes time proportional to the number of copies of p within max_dist,
+            instead of the number of face paths (which also are not simple on these shapes)
+        a word is skipped once its last bound is farther than max_dist from the (unfolded) source face
+        :param source_fn: face name of source
+        :param diameter: cap on length of word to consider, None if infinite
+        :param max_dist: skip words that only allow geodesics longer than this,
+            if None, uses get_distance_bound, since the group is infinite
+            can also be a dict of (sink face name -> max_dist)
+        :return: (PathTrie, dict of (sink face name -> array of indices of the nodes that end on that face))
+        """
+        source: Face = self.faces[source_fn]
+        if isinstance(max_dist, dict):
+            max_dist = max(d for d in max_dist.values() if d is not None) if any(
+                d is not None for d in max_dist.values()) else None
+        if max_dist is None:
+            max_dist = self.get_distance_bound(source_fn)
+        radius = source.get_circumradius()
+
+        def element(fn, T, s):
+            return (fn,) + tuple(np.round(np.concatenate((T.flatten(), s.flatten()))/self.tol).astype(int))
+
+        trie = PathTrie(source)
+        sink_nodes = {fn: [] for fn in self.faces}
+        sink_nodes[source_fn].append(0)
+        seen = {element(source_fn, trie.T[0], trie.s[0])}
+        queue = deque([0])
+        while queue:
+            node = queue.popleft()
+            if diameter is not None and trie.depths[node] >= diameter:
+                continue
+            face = self.faces[trie.face_names[node]]
+            center = trie.T[node]@source.basepoint + trie.s[node]
+            for (bound, F) in face.bounds:
+                # a geodesic leaving through bound crosses the plane of bound (|m|=1)
+                reach = max(trie.reaches[node], abs((bound.m@center)[0, 0] - bound.b) - radius)
+                if reach > max_dist + self.tol:
+                    continue
+                T, s = bound.concatenate_with(trie.T[node], trie.s[node])
+                key = element(F.name, T, s)
+                if key in seen:
+                    continue
+                seen.add(key)
+                child = trie.add_child(node, bound, F, reach=reach)
+                sink_nodes[F.name].append(child)
+                queue.append(child)
+        trie.compress()
+        return trie, {fn: np.array(nodes, dtype=int) for fn, nodes in sink_nodes.items()}
+
+    def get_all_voronoi_translations(self, source_fn, diameter=None, prune=False, max_dist=None):
+        """
+        _get_voronoi_translations for every sink face, with a single search from the source face
+        :param source_fn: face name of source
+        :param diameter: cap on length of face path to consider, None if infinite
+        :param prune: whether to skip face paths that no straight line passes through
+        :param max_dist: skip face paths that only allow geodesics longer than this, None if infinite
+            can also be a dict of (sink face name -> max_dist)
+        :return: dict of (sink face name -> list of (T,s,bound_path))
+        """
+        trie, sink_nodes = self.get_path_trie(source_fn, diameter=diameter, prune=prune, max_dist=max_dist)
+        return {fn: trie.translations(nodes) for fn, nodes in sink_nodes.items()}
+
+    def get_voronoi_translations(self, source_fn, sink_fn, diameter=None, prune=False, max_dist=None):
         """
         memoized _get_voronoi_translations
+            on a miss, fills in every sink face with get_path_trie,
+            since plots usually ask for every sink face of the same source
+            the memo keeps (PathTrie, groups of node indices), so the paths to every sink share prefixes and translations
+            face paths with the same translation are grouped into one entry (see PathTrie.canonical_groups)
         Gets translations of p on the source
             considers every possible face path from source face to sink face
         :param source_fn: face name of source
         :param sink_fn: face name of sink
         :param diameter: cap on length of face path to consider, None if infinite
-        :return: list of (T,s) translation matrix and shift such that each Tp+s translates p to sink face
+        :param prune: whether to skip face paths that no straight line passes through (see Face.face_paths_to)
+        :param max_dist: skip face paths that only allow geodesics longer than this, None if infinite
+            copies of p farther than any geodesic from the sink face cannot affect its cut locus,
+            so get_distance_bound(source_fn, sink_fn) is a safe value
+        :return: list of (T,s,bound_paths), T translation matrix and shift s such that each Tp+s translates p to sink face
+            bound_paths is every face path with this translation, shortest first
+        """
+        trie, groups = self._get_memoized_groups(source_fn, sink_fn, diameter=diameter, prune=prune, max_dist=max_dist)
+        return trie.canonical_translations(groups)
+
+    def _get_memoized_groups(self, source_fn, sink_fn, diameter=None, prune=False, max_dist=None):
+        """
+        looks up (or fills in) the memo of get_voronoi_translations
+        :return: (PathTrie, list of arrays of nodes with the same translation)
+        """
+        self.check_face_graph()
+        key = (source_fn, sink_fn, diameter, prune, max_dist)
+        value = self.memoized_face_translations.lookup(key)
+        if value is None and self.use_symmetry:
+            if self.fill_memo_from_symmetry(source_fn, diameter=diameter, prune=prune, max_dist=max_dist):
+                value = self.memoized_face_translations[key] if key in self.memoized_face_translations else None
+        if value is None:
+            trie, sink_nodes = self.get_path_trie(source_fn, diameter=diameter, prune=prune, max_dist=max_dist)
+            for fn, nodes in sink_nodes.items():
+                groups = trie.canonical_groups(nodes, tol=self.tol)
+                if fn == sink_fn:
+                    # kept here, since a small budget may evict it before the loop ends
+                    value = (trie, groups)
+                self.memoized_face_translations[(source_fn, fn, diameter, prune, max_dist)] = (trie, groups)
+        return value
+
+    def face_graph_signature(self):
+        """
+        summary of the faces and how they are glued, which changes with add_face and Face.add_boundary_paired
+        :return: tuple of (face name, number of bounds) for each face
+        """
+        return tuple((fn, len(face.bounds)) for fn, face in self.faces.items())
+
+    def check_face_graph(self):
+        """
+        clears everything computed from the face graph if it changed since the last call
+            (translation tables, cut loci, symmetries, and settled diameters)
+        """
+        if self.memoized_face_translations.validate(self.face_graph_signature()):
+            self.memoized_voronoi_diagrams.clear()
+            self.cut_locus_structures = dict()
+            self.filter_hints = dict()
+            self.automorphisms = dict()
+            self.face_orbits = None
+            self.settled_diameters = dict()
+
+    def get_automorphism(self, source_fn, image_fn):
+        """
+        symmetry of the shape that sends source face to image face, found by find_automorphism and memoized
+        :param source_fn: face name
+        :param image_fn: face name
+        :return: Automorphism, or None if there is none
+        """
+        self.check_face_graph()
+        if (source_fn, image_fn) not in self.automorphisms:
+            self.automorphisms[(source_fn, image_fn)] = find_automorphism(self.faces, source_fn, image_fn, tol=self.tol)
+        return self.automorphisms[(source_fn, image_fn)]
+
+    def get_face_orbits(self):
+        """
+        splits faces into orbits of the symmetry group
+        :return: dict of (representative face name -> list of face names in its orbit)
+        """
+        self.check_face_graph()
+        if self.face_orbits is not None:
+            return self.face_orbits
+        orbits = dict()
+        for fn in self.faces:
+            for rep in orbits:
+                if self.get_automorphism(rep, fn) is not None:
+                    orbits[rep].append(fn)
+                    break
+            else:
+                orbits[fn] = [fn]
+        self.face_orbits = orbits
+        return orbits
+
+    def get_orbit_representative(self, fn):
+        """
+        :param fn: face name
+        :return: (representative face name of the orbit of fn, Automorphism sending the representative to fn)
+        """
+        for rep, orbit in self.get_face_orbits().items():
+            if fn in orbit:
+                return rep, self.get_automorphism(rep, fn)
+
+    def fill_memo_from_symmetry(self, source_fn, diameter=None, prune=False, max_dist=None):
+        """
+        fills the memo of get_voronoi_translations for source face, by mapping the translations of a symmetric face
+            a symmetry sends face paths to face paths, so their images are exactly the face paths from source face
+            only uses faces memoized with the same diameter, prune, and max_dist
+        :return: whether a symmetric face was found
+        """
+        memo = dict(self.memoized_face_translations.items())
+        for (fn, sink_fn, d, pr, md), (trie, _) in memo.items():
+            if sink_fn != fn or (d, pr) != (diameter, prune):
+                continue
+            # distance bounds of symmetric faces are equal, up to rounding
+            if md != max_dist and (md is None or max_dist is None or abs(md - max_dist) > self.tol):
+                continue
+            automorphism = self.get_automorphism(fn, source_fn)
+            if automorphism is None:
+                continue
+            image_trie = automorphism.map_trie(trie, self.faces)
+            for G in self.faces:
+                if (fn, G, d, pr, md) not in memo:
+                    # evicted from the cache
+                    continue
+                _, groups = memo[(fn, G, d, pr, md)]
+                self.memoized_face_translations[(source_fn, automorphism.face_map[G], diameter, prune, max_dist)] = (
+                    image_trie, groups)
+            return True
+        return False
+
+    def fingerprint(self):
+        """
+        hash of the faces, bounds, and tolerance of the shape
+            the translation tables only depend on these, so this names the cache file
+        :return: hex string
+        """
+        h = hashlib.sha1()
+        h.update((type(self).__name__ + repr(self.tol)).encode())
+        for fn, face in self.faces.items():
+            h.update((repr(fn) + repr(face.tol)).encode())
+            for (bound, F) in face.bounds:
+                h.update(repr(F.name).encode())
+                for arr in (bound.m, bound.b, bound.s, bound.T, bound.si):
+                    h.update(np.asarray(arr, dtype=float).tobytes())
+        return h.hexdigest()
+
+    def translation_cache_file(self, cache_dir):
+        """
+        :param cache_dir: directory of cache files
+        :return: file that the translation tables of this shape are cached in
+        """
+        return os.path.join(cache_dir, type(self).__name__ + '_' + self.fingerprint() + '.npz')
+
+    def save_translation_cache(self, cache_dir):
+        """
+        saves every memoized translation table (see get_voronoi_translations) to an npz file
+            each PathTrie is saved once as arrays, and each memo key as the groups of nodes it uses
+            the diameter, prune, and max_dist of each memo key are saved with it
+        :param cache_dir: directory of cache files, created if it does not exist
+        :return: file saved to
+        """
+        face_idx = {fn: i for i, fn in enumerate(self.faces)}
+        arrays = dict()
+        trie_idx = dict()
+        keys = []
+        for k, (key, (trie, groups)) in enumerate(self.memoized_face_translations.items()):
+            source_fn, sink_fn, diameter, prune, max_dist = key
+            if id(trie) not in trie_idx:
+                trie_idx[id(trie)] = len(trie_idx)
+                for name, arr in trie.to_arrays(self.faces).items():
+                    arrays['trie' + str(trie_idx[id(trie)]) + '_' + name] = arr
+            keys.append([face_idx[source_fn], face_idx[sink_fn], diameter, prune, max_dist, trie_idx[id(trie)]])
+            arrays['key' + str(k) + '_nodes'] = np.concatenate(groups) if groups else np.zeros(0, dtype=int)
+            arrays['key' + str(k) + '_offsets'] = np.cumsum([0] + [len(group) for group in groups])
+        arrays['keys'] = np.array(json.dumps(keys))
+
+        os.makedirs(cache_dir, exist_ok=True)
+        filename = self.translation_cache_file(cache_dir)
+        # write to a temporary file first, so an interrupted save does not leave a broken cache
+        with open(filename + '.tmp', 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(filename + '.tmp', filename)
+        return filename
+
+    def load_translation_cache(self, cache_dir):
+        """
+        loads translation tables saved by save_translation_cache into the memo
+            only loads a file made from a shape with the same fingerprint
+        :param cache_dir: directory of cache files
+        :return: number of memo keys loaded (0 if there is no cache for this shape)
+        """
+        filename = self.translation_cache_file(cache_dir)
+        if not os.path.exists(filename):
+            return 0
+        face_names = list(self.faces)
+        tries = dict()
+        with np.load(filename) as data:
+            keys = json.loads(str(data['keys']))
+            for k, (source_idx, sink_idx, diameter, prune, max_dist, j) in enumerate(keys):
+                if j not in tries:
+                    prefix = 'trie' + str(j) + '_'
+                    tries[j] = PathTrie.from_arrays(self.faces, {name[len(prefix):]: data[name]
+                                                                 for name in data.files if name.startswith(prefix)})
+                nodes = data['key' + str(k) + '_nodes']
+                offsets = data['key' + str(k) + '_offsets']
+                groups = [nodes[offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1)]
+                key = (face_names[source_idx], face_names[sink_idx], diameter, prune, max_dist)
+                self.memoized_face_translations.setdefault(key, (tries[j], groups))
+        return len(keys)
+
+    def get_frontier_reach(self, source_fn, diameter, prune=False, max_dist=np.inf):
+        """
+        lower bound on the length of a geodesic along any face path longer than diameter
+            every such path starts with a path of length diameter+1, and the bound only grows along a path
+        :param source_fn: face name of source
+        :param diameter: cap on length of face path that is already considered
+        :param prune: whether to skip face paths that no straight line passes through
+        :param max_dist: skip face paths that only allow geodesics longer than this
+            the bound is only computed if this is not None (np.inf computes it without skipping anything)
+        :return: scalar, np.inf if there are no longer paths
+        """
+        trie, _ = self._get_memoized_groups(source_fn, source_fn, diameter=diameter + 1, prune=prune, max_dist=max_dist)
+        frontier = trie.depths == diameter + 1
+        if not np.any(frontier):
+            return np.inf
+        return np.min(trie.reaches[frontier])
+
+    def get_stacked_voronoi_translations(self, source_fn, sink_fn, diameter=None, prune=False, max_dist=None):
+        """
+        get_voronoi_translations as stacked arrays
+        :param source_fn: face name of source
+        :param sink_fn: face name of sink
+        :param diameter: cap on length of face path to consider, None if infinite
+        :param prune: whether to skip face paths that no straight line passes through
+        :param max_dist: skip face paths that only allow geodesics longer than this, None if infinite
+        :return: (T,s,bound_paths), T is (K,dimension,dimension), s is (K,dimension),
+            and bound_paths is a list of K lists of face paths with that translation
         """
-        if (source_fn, sink_fn, diameter) not in self.memoized_face_translations:
-            self.memoized_face_translations[(source_fn, sink_fn, diameter)] = self._get_voronoi_translations(source_fn,
-                                                                                                             sink_fn,
-                                                                                                             diameter=diameter)
-        return self.memoized_face_translations[(source_fn, sink_fn, diameter)]
+        trie, groups = self._get_memoized_groups(source_fn, sink_fn, diameter=diameter, prune=prune, max_dist=max_dist)
+        T, s = trie.stacked_translations(groups)
+        return T, s, [[trie.bound_path(node) for node in group] for group in groups]
 
-    def get_voronoi_points_from_face_paths(self, p, source_fn, sink_fn, diameter=None):
+    def get_voronoi_point_batch(self, P, source_fn, sink_fn, diameter=None, prune=False, max_dist=None):
+        """
+        copies of many points on the source face at once
+        :param P: (N,dimension) array of points on the source face
+        :param source_fn: face name of source
+        :param sink_fn: face name of sink
+        :param diameter: cap on length of face path to consider, None if infinite
+        :param prune: whether to skip face paths that no straight line passes through
+        :param max_dist: skip face paths that only allow geodesics longer than this, None if infinite
+        :return: (N,K,dimension) array, entry (n,k) is the copy of P[n] along translation k,
+            and bound_paths as in get_stacked_voronoi_translations
+        """
+        T, s, bound_paths = self.get_stacked_voronoi_translations(source_fn,
+                                                                  sink_fn,
+                                                                  diameter=diameter,
+                                                                  prune=prune,
+                                                                  max_dist=max_dist,
+                                                                  )
+        return np.einsum('kij,nj->nki', T, P) + s[np.newaxis, :, :], bound_paths
+
+    def get_voronoi_points_from_face_paths(self, p, source_fn, sink_fn, diameter=None, prune=False, max_dist=None):
         """
         Gets voronoi points spawned by p on the source
             considers every possible face path from source face to sink face
@@ -138,50 +630,488 @@ class Shape:
         :param source_fn: face name of source
         :param sink_fn: face name of sink
         :param diameter: cap on length of face path to consider, None if infinite
-        :return: list of column vector voronoi points, list of bounds that connect source to sink
+        :param prune: whether to skip face paths that no straight line passes through
+        :param max_dist: skip face paths that only allow geodesics longer than this, None if infinite
+        :return: list of column vector voronoi points, list of (list of bound paths that connect source to sink)
+            copies of p that are within tolerance are merged, keeping the bound paths of each
+            (this happens with different translations as well, for example if p is fixed by a rotation)
+        """
+        copies, bound_paths = self.get_voronoi_point_batch(p.reshape((1, -1)),
+                                                           source_fn,
+                                                           sink_fn,
+                                                           diameter=diameter,
+                                                           prune=prune,
+                                                           max_dist=max_dist,
+                                                           )
+        copies = copies[0]
+        if not len(copies):
+            return [], []
+        groups = group_close_rows(copies, self.tol)
+        return ([copies[[group[0]]].T for group in groups],
+                [[bound_path for i in group for bound_path in bound_paths[i]] for group in groups])
+
+    def get_streamed_voronoi_points(self, p, source_fn, sink_fn, diameter=None, prune=False, max_dist=np.inf):
+        """
+        get_voronoi_points_from_face_paths, sorted by how close the copies can get to the sink face
+            the reach of a copy is the lower bound on the length of a geodesic along its face paths (Face.face_paths),
+            which is at most its distance to any point of the sink face
+        :param max_dist: skip face paths that only allow geodesics longer than this
+            the reaches are only computed if this is not None (np.inf computes them without skipping anything)
+        :return: (list of column vector voronoi points, list of (list of bound paths), array of reaches), by reach
+        """
+        trie, groups = self._get_memoized_groups(source_fn, sink_fn, diameter=diameter, prune=prune, max_dist=max_dist)
+        if not groups:
+            return [], [], np.zeros(0)
+        T, s = trie.stacked_translations(groups)
+        copies = np.einsum('kij,j->ki', T, p.flatten()) + s
+        reaches = np.array([np.min(trie.reaches[group]) for group in groups])
+        merged = group_close_rows(copies, self.tol)
+        merged_reaches = np.array([np.min(reaches[group]) for group in merged])
+        order = np.argsort(merged_reaches, kind='stable')
+        return ([copies[[merged[k][0]]].T for k in order],
+                [[trie.bound_path(node) for i in merged[k] for node in groups[i]] for k in order],
+                merged_reaches[order])
+
+    def filter_out_streamed_points(self,
+                                   points,
+                                   bound_paths,
+                                   reaches,
+                                   source,
+                                   sink,
+                                   do_filter=True,
+                                   ignore_points_on_locus=False,
+                                   batch_size=16,
+                                   ):
+        """
+        filter_out_points, adding the points to a StreamingVoronoi in batches, closest to the sink face first
+            added and invalid points only recompute the cells around them, and only those cells are checked again
+            after each batch, every point of the sink face is at most r from its point,
+                where r is largest at a vertex of the sink face or an endpoint of the cut locus (as in settle_diameter)
+                once the next points are farther than r from the sink face, no later point can change the cells there,
+                so the rest are never added
+            since cells shrink as points are added, points removed in earlier batches are added again with each batch
+        :param points: list of column vectors, sorted by reach
+        :param bound_paths: list of (list of alternative bound paths for each point)
+        :param reaches: array of lower bounds on the distance from each point to the sink face, increasing
+        :param source: source face
+        :param sink: sink face
+        :param do_filter: whether to filter the points
+        :param ignore_points_on_locus: whether to ignore single points on cut locus
+        :param batch_size: number of points in the first batch, each batch after is twice as large
+        :return: same as filter_out_points
         """
-        points = []
-        bound_paths = []
-        for (T, s, bound_path) in self.get_voronoi_translations(source_fn, sink_fn, diameter=diameter):
-            points.append(T@p + s)
-            bound_paths.append(bound_path)
-        return points, bound_paths
+        far = far_points(points)
+        diagram = StreamingVoronoi(np.concatenate(far, axis=1).T)
+        diagram_paths = [None for _ in far]
+        removed = []  # indices in points of points removed from the diagram
+        idx_to_point = dict()  # index in diagram -> index in points, for every point added in any batch
+        relevant = dict()  # index in diagram of relevant point -> (cell, first valid bound path)
+        start = 0
+        while start < len(points):
+            end = min(start + batch_size, len(points))
+            batch_size *= 2
+            added = removed + list(range(start, end))
+            removed = []
+            idxs, to_check = diagram.add_points(np.concatenate([points[i] for i in added], axis=1).T)
+            idx_to_point.update(zip(idxs, added))
+            diagram_paths += [bound_paths[i] for i in added]
+            start = end
+            # only the cells around added points change, so the rest keep their entries in relevant
+            while True:
+                to_check = [idx for idx in to_check if diagram_paths[idx] is not None]
+                cells = [diagram.cell(idx) for idx in to_check]
+                meets = self.cells_meet_face(cells, sink, ignore_points_on_locus=ignore_points_on_locus)
+                for idx, cell_segment, meet in zip(to_check, cells, meets):
+                    if not meet:
+                        relevant.pop(idx, None)
+                    elif do_filter:
+                        relevant[idx] = (cell_segment, self.first_valid_path(diagram.points[[idx]].T,
+                                                                             source,
+                                                                             diagram_paths[idx],
+                                                                             cell_segment,
+                                                                             ))
+                    else:
+                        relevant[idx] = (cell_segment, diagram_paths[idx][0])
+                bad_idxs = [idx for idx, (_, valid_path) in relevant.items() if valid_path is None]
+                if not bad_idxs:
+                    break
+                # removing points only grows the other cells, so every invalid point can be removed at once
+                #   (unless every relevant point is invalid, as in filter_out_points)
+                if len(bad_idxs) == len(relevant):
+                    bad_idxs = bad_idxs[:1]
+                # only the cells next to removed points change, so only those are checked again
+                to_check = diagram.remove_points(bad_idxs)
+                for idx in bad_idxs:
+                    del relevant[idx]
+                    removed.append(idx_to_point[idx])
+            if relevant and start < len(points):
+                candidates = [v.flatten() for (v, _) in sink.get_vertices()]
+                for cell_segment, _ in relevant.values():
+                    for a, b in cell_segment:
+                        seg = sink.get_segment_within_bounds(a.reshape((2, 1)), b.reshape((2, 1)))
+                        if seg is not None:
+                            candidates += [q.flatten() for q in seg if q is not None]
+                kept = diagram.points[list(relevant)]
+                r = np.max(np.min(np.linalg.norm(np.array(candidates)[:, np.newaxis, :] - kept[np.newaxis, :, :],
+                                                 axis=2),
+                                  axis=1))
+                if reaches[start] > r + self.tol:
+                    break
+        if not relevant:
+            print("ERROR NO RELEVANT POINTS")
+            return None, None, None
+        points, bound_paths = augment_point_paths([diagram.points[[idx]].T for idx in relevant],
+                                                  [valid_path for (_, valid_path) in relevant.values()])
+        return points, bound_paths, [cell_segment for (cell_segment, _) in relevant.values()]
+
+    def filter_out_clipped_points(self,
+                                  points,
+                                  bound_paths,
+                                  source,
+                                  sink,
+                                  do_filter=True,
+                                  ignore_points_on_locus=False,
+                                  ):
+        """
+        filter_out_points, using a ClippedVoronoi of the points instead of a voronoi diagram of every point
+            each cell is only computed within the sink face, so cells are bounded and there are no far away points
+            removing invalid points only clips again the cells that shared an edge with them
+        :param points: list of column vectors
+        :param bound_paths: list of (list of alternative bound paths for each point)
+        :param source: source face
+        :param sink: sink face
+        :param do_filter: whether to filter the points
+        :param ignore_points_on_locus: whether to ignore points whose cells meet the sink face at a single point
+        :return: (list of points, bound paths, and cells that are relevant, dict of cut locus segments)
+            the cells are the parts of the voronoi cells within the sink face,
+            and the segments are in the format of voronoi_diagram_calc (with face), indexed by the relevant points
+        """
+        diagram = ClippedVoronoi(np.concatenate(points, axis=1).T, sink)
+        relevant = dict()  # index of relevant point -> (cell, first valid bound path)
+        to_check = set(diagram.cells)
+        while True:
+            for idx in to_check:
+                cell_segment = diagram.cell(idx)
+                if not cell_segment or (ignore_points_on_locus and
+                                        np.ptp(diagram.cells[idx][0], axis=0).max() <= self.tol):
+                    relevant.pop(idx, None)
+                elif do_filter:
+                    relevant[idx] = (cell_segment, self.first_valid_path(points[idx],
+                                                                         source,
+                                                                         bound_paths[idx],
+                                                                         cell_segment,
+                                                                         ))
+                else:
+                    relevant[idx] = (cell_segment, bound_paths[idx][0])
+            bad_idxs = [idx for idx, (_, valid_path) in relevant.items() if valid_path is None]
+            if not bad_idxs:
+                break
+            # removing points only grows the other cells, so every invalid point can be removed at once
+            #   (unless every relevant point is invalid, as in filter_out_points)
+            if len(bad_idxs) == len(relevant):
+                bad_idxs = bad_idxs[:1]
+            for idx in bad_idxs:
+                del relevant[idx]
+            to_check = diagram.remove_points(bad_idxs)
+        if not relevant:
+            print("ERROR NO RELEVANT POINTS")
+            return None, None, None, None
+        order = sorted(relevant)
+        position = {idx: k for k, idx in enumerate(order)}
+        point_pair_to_segment = {(position[i], position[j]): segment
+                                 for (i, j), segment in diagram.ridges(tol=self.tol).items()
+                                 if i in position and j in position}
+        return ([points[idx] for idx in order],
+                [relevant[idx][1] for idx in order],
+                [relevant[idx][0] for idx in order],
+                point_pair_to_segment)
+
+    def _conflicting_copies(self, diagram, copies, others, slack=0.):
+        """
+        finds the copies that would take part of the sink face from the cells of a ClippedVoronoi
+            a copy takes part of a convex cell iff it is closer than the point of the cell at some vertex of the cell
+        :param diagram: ClippedVoronoi
+        :param copies: (K,2) array of copies of p
+        :param others: indices of copies that are not in the diagram
+        :param slack: copies at most this much farther than the point of a cell at one of its vertices also count
+        :return: array of indices (from others) of copies that are closer than every point of diagram somewhere
+        """
+        if not len(others) or not diagram.cells:
+            return np.zeros(0, dtype=int)
+        X = np.concatenate([V for (V, _) in diagram.cells.values()], axis=0)
+        r = np.min(np.linalg.norm(X[:, np.newaxis, :] - diagram.points[np.newaxis, :, :], axis=2), axis=1)
+        D = np.linalg.norm(X[:, np.newaxis, :] - copies[np.newaxis, others, :], axis=2)
+        # only copies that are the same up to rounding are ignored, since thin cells still change the cut locus
+        return others[np.any(D < r[:, np.newaxis] + slack - 1e-9*(1 + r[:, np.newaxis]), axis=0)]
+
+    def cut_locus_structure(self,
+                            p,
+                            source_fn,
+                            sink_fn,
+                            relevant_bound_paths,
+                            point_pair_to_segment,
+                            diameter=None,
+                            prune=False,
+                            max_dist=None,
+                            ):
+        """
+        combinatorial structure of a cut locus, which usually stays the same when p moves a little
+            (see reuse_cut_locus_structure)
+        :param p: column vector, point on source face
+        :param source_fn: face name of source
+        :param sink_fn: face name of sink
+        :param relevant_bound_paths: bound paths of the relevant points of the cut locus (None for far away points)
+        :param point_pair_to_segment: cut locus segments, keyed by pairs of positions in relevant_bound_paths
+        diameter, prune, and max_dist are the same as get_voronoi_points_from_face_paths
+        :return: (list of (translation index, alternative index) of each copy kept with a cell in the sink face,
+                    set of pairs of positions in that list that share an edge,
+                    set of translation indices of copies that were filtered out, but take part of the sink face
+                        (within tolerance),
+                    dict of (translation index -> bound_path_key of its first path) for every translation index above)
+            translation indices are the indices of get_stacked_voronoi_translations,
+            or None if the cut locus was not made from these translations,
+                or has a segment of a copy that only meets the sink face within tolerance
+        """
+        copies, bound_paths = self.get_voronoi_point_batch(p.reshape((1, -1)),
+                                                           source_fn,
+                                                           sink_fn,
+                                                           diameter=diameter,
+                                                           prune=prune,
+                                                           max_dist=max_dist,
+                                                           )
+        copies = copies[0]
+        source = self.faces[source_fn]
+        path_idxs = {bound_path_key(bound_path, source): (k, alt) for k, alternatives in enumerate(bound_paths)
+                     for alt, bound_path in enumerate(alternatives)}
+        positions = [i for i, pth in enumerate(relevant_bound_paths) if pth is not None]
+        kept = [path_idxs.get(bound_path_key(relevant_bound_paths[i], source)) for i in positions]
+        if not kept or None in kept:
+            return None
+        diagram = ClippedVoronoi(copies[[k for (k, _) in kept]], self.faces[sink_fn])
+        # copies whose cells only meet the sink face within tolerance are left out,
+        #   unless they have a segment of the cut locus, since whether the filter keeps them depends on p
+        touching = [t for t in range(len(kept)) if t not in diagram.cells or t in diagram.flat]
+        on_locus = set(i for pair, (_, (a, b)) in point_pair_to_segment.items()
+                       if np.linalg.norm(np.ravel(b) - np.ravel(a)) > self.tol for i in pair)
+        if any(positions[t] in on_locus for t in touching):
+            return None
+        kept = [kept[t] for t in range(len(kept)) if t not in touching]
+        diagram = ClippedVoronoi(copies[[k for (k, _) in kept]], self.faces[sink_fn])
+        if not kept or len(diagram.cells) < len(kept) or diagram.flat:
+            return None
+        others = np.setdiff1d(np.arange(len(copies)), [k for (k, _) in kept])
+        filtered = set(int(k) for k in self._conflicting_copies(diagram, copies, others, slack=self.tol))
+        # the translation tables may be made again in another order (see reuse_cut_locus_structure)
+        keys = {k: bound_path_key(bound_paths[k][0], source) for k in {k for (k, _) in kept} | filtered}
+        return kept, set(diagram.ridges()), filtered, keys
+
+    def reuse_cut_locus_structure(self,
+                                  p,
+                                  source_fn,
+                                  sink_fn,
+                                  structure,
+                                  diameter=None,
+                                  prune=False,
+                                  max_dist=None,
+                                  do_filter=True,
+                                  ignore_points_on_locus=False,
+                                  ):
+        """
+        cut locus on the sink face from the structure of the cut locus of a nearby point
+            the copies kept last time are moved to p, and their cells are clipped in the sink face
+            this is used if the cells have the same edges (and none only meet the sink face within tolerance),
+                every copy is still valid, and every other copy that takes part of the sink face (within tolerance)
+                was filtered out last time and is still invalid
+        :param p: column vector, point on source face
+        :param source_fn: face name of source
+        :param sink_fn: face name of sink
+        :param structure: result of cut_locus_structure for a nearby point
+        :param do_filter: whether to check the paths of the copies
+        :param ignore_points_on_locus: whether the cut locus ignores points whose cells are a single point
+        diameter, prune, and max_dist are the same as get_voronoi_points_from_face_paths
+        :return: (list of points, bound paths, cells, dict of cut locus segments), as filter_out_clipped_points,
+            or None if the structure changed
+        """
+        kept, pairs, filtered, keys = structure
+        source, sink = self.faces[source_fn], self.faces[sink_fn]
+        copies, bound_paths = self.get_voronoi_point_batch(p.reshape((1, -1)),
+                                                           source_fn,
+                                                           sink_fn,
+                                                           diameter=diameter,
+                                                           prune=prune,
+                                                           max_dist=max_dist,
+                                                           )
+        copies = copies[0]
+        if any(k >= len(copies) or bound_path_key(bound_paths[k][0], source) != key for k, key in keys.items()):
+            # the translation tables were evicted and made again (or mapped from a symmetric face) in another order
+            return None
+        P = copies[[k for (k, _) in kept]]
+        gaps = np.linalg.norm(P[:, np.newaxis, :] - P[np.newaxis, :, :], axis=2)
+        if np.any(gaps[np.triu_indices(len(P), 1)] <= self.tol):
+            # two copies merged
+            return None
+        diagram = ClippedVoronoi(P, sink)
+        if len(diagram.cells) < len(P) or diagram.flat or set(diagram.ridges()) != pairs:
+            return None
+        if ignore_points_on_locus and any(np.ptp(V, axis=0).max() <= self.tol for (V, _) in diagram.cells.values()):
+            return None
+        points = [P[[i]].T for i in range(len(P))]
+        paths = [bound_paths[k][alt] for (k, alt) in kept]
+        cells = [diagram.cell(i) for i in range(len(P))]
+        if do_filter and not all(self.check_if_valid(pt, source, pth, cell)
+                                 for pt, pth, cell in zip(points, paths, cells)):
+            return None
+        others = np.setdiff1d(np.arange(len(copies)), [k for (k, _) in kept])
+        for k in self._conflicting_copies(diagram, copies, others, slack=self.tol):
+            if k not in filtered or not do_filter:
+                return None
+            # the copy must still be filtered out, when it is the only one added
+            with_k = ClippedVoronoi(np.concatenate((P, copies[[k]]), axis=0), sink)
+            cell = with_k.cell(len(P))
+            if cell and self.first_valid_path(copies[[k]].T, source, bound_paths[k], cell) is not None:
+                return None
+        return points, paths, cells, diagram.ridges(tol=self.tol)
+
+    def compile_cut_locus_structure(self, p, source_fn, sink_fn, structure, diameter=None, prune=False, max_dist=None):
+        """
+        CompiledCutLocus of a cut locus structure, so the cut locus for p with the same structure is a few array operations
+        :param p: column vector, point on source face that the structure is from
+        :param source_fn: face name of source
+        :param sink_fn: face name of sink
+        :param structure: result of cut_locus_structure for p
+        diameter, prune, and max_dist are the same as get_voronoi_points_from_face_paths
+        :return: CompiledCutLocus, or None if its checks do not pass at p
+        """
+        kept, _, filtered, _ = structure
+        source, sink = self.faces[source_fn], self.faces[sink_fn]
+        T, s, bound_paths = self.get_stacked_voronoi_translations(source_fn,
+                                                                  sink_fn,
+                                                                  diameter=diameter,
+                                                                  prune=prune,
+                                                                  max_dist=max_dist,
+                                                                  )
+        copies = T@p.flatten() + s
+        diagram = ClippedVoronoi(copies[[k for (k, _) in kept]], sink)
+        if len(diagram.cells) < len(kept) or diagram.flat:
+            return None
+        paths = [bound_paths[k][alt] for (k, alt) in kept]
+        compiled = CompiledCutLocus(T,
+                                    s,
+                                    [k for (k, _) in kept],
+                                    paths,
+                                    diagram,
+                                    [path_edges(source, pth) for pth in paths],
+                                    {k: [path_edges(source, pth) for pth in bound_paths[k]] for k in filtered},
+                                    tol=self.tol,
+                                    )
+        if compiled.evaluate(p) is None:
+            return None
+        return compiled
+
+    def filter_out_hinted_points(self,
+                                 points,
+                                 bound_paths,
+                                 source,
+                                 sink,
+                                 hint,
+                                 ignore_points_on_locus=False,
+                                 remove_all_invalid=True,
+                                 ):
+        """
+        filter_out_points, starting with only the points with a bound path in hint (usually much fewer than every point)
+            every point kept passes check_if_valid, since it went through the filter
+            the result is used once it also covers the sink face: no point that was left out takes part of the sink face,
+                and every point that was filtered out but takes part of the sink face is also removed by the full filter
+            otherwise, these points are added and filtered again, and if that does not work, every point is filtered
+        params are the same as filter_out_points
+        :param hint: set of bound_path_key, replaced by the keys of the points that were needed
+            (the points kept, and the points that were filtered out but take part of the sink face)
+        :return: same as filter_out_points
+        """
+        keys = [[bound_path_key(pth, source) for pth in alternatives] for alternatives in bound_paths]
+        copies = np.concatenate(points, axis=1).T
+        candidates = np.array([any(key in hint for key in alt_keys) for alt_keys in keys], dtype=bool)
+
+        def needed(relevant_points, relevant_bound_paths, left_out):
+            # indices of points kept, and of points in left_out that take part of the sink face
+            kept = np.concatenate([pt for (pt, pth) in zip(relevant_points, relevant_bound_paths) if pth is not None],
+                                  axis=1).T
+            # points within tolerance of a kept point were merged with it
+            near = np.min(np.linalg.norm(copies[:, np.newaxis, :] - kept[np.newaxis, :, :], axis=2), axis=1) <= self.tol
+            # copies that only touch the cells within tolerance may still be kept by the filter
+            conflicting = self._conflicting_copies(ClippedVoronoi(kept, sink),
+                                                   copies,
+                                                   np.flatnonzero(left_out & ~near),
+                                                   slack=self.tol,
+                                                   )
+            return np.flatnonzero(near), conflicting
+
+        result = None
+        while 2 <= np.sum(candidates) < len(points):
+            idxs = np.flatnonzero(candidates)
+            result = self.filter_out_points([points[i] for i in idxs],
+                                            [bound_paths[i] for i in idxs],
+                                            source,
+                                            sink,
+                                            ignore_points_on_locus=ignore_points_on_locus,
+                                            remove_all_invalid=remove_all_invalid,
+                                            )
+            if result[0] is None:
+                result = None
+                break
+            _, conflicting = needed(result[0], result[1], ~candidates)
+            if not len(conflicting):
+                # candidates that were filtered out had other cells than in the full filter,
+                #   which first drops every point whose cell among every point misses the sink face,
+                #   and then only removes points, so it can only keep points that are valid with that (smallest) cell
+                _, dropped = needed(result[0], result[1], candidates)
+                if len(dropped):
+                    every_point = np.concatenate([copies] + [pt.T for pt in far_points(points)], axis=0)
+                    point_to_segments = voronoi_diagram_calc(points=every_point, as_arrays=True).point_segments()
+                    cells = [point_to_segments.get(i, []) for i in dropped]
+                    meets = self.cells_meet_face(cells, sink, ignore_points_on_locus=ignore_points_on_locus)
+                    if any(self.first_valid_path(points[dropped[t]], source, bound_paths[dropped[t]], cells[t]) is not None
+                           for t in np.flatnonzero(meets)):
+                        result = None
+                break
+            candidates[conflicting] = True
+            result = None
+        if result is None:
+            result = self.filter_out_points(points,
+                                            bound_paths,
+                                            source,
+                                            sink,
+                                            ignore_points_on_locus=ignore_points_on_locus,
+                                            remove_all_invalid=remove_all_invalid,
+                                            )
+        hint.clear()
+        if result[0] is not None:
+            kept, conflicting = needed(result[0], result[1], np.ones(len(points), dtype=bool))
+            hint.update(key for i in np.concatenate((kept, conflicting)) for key in keys[i])
+        return result
 
     def point_within_cell(self, v, segments, p=None):
         """
         checks whether v is within the cell bounded by segments
             takes an interior point and checking whether v is on the same side of each bound as this point
+            sides are exact orientation tests of the segment endpoints (see orientation),
+            so points on a bound are always within the cell (see points_within_cells for many points and cells)
         :param v: column vector (np array of dimension (self.dimension,1))
         :param segments: list of (a,b) line segments making up cell
         :param p: interior point to check, if None, just takes average of vertices in segments
         :return: whether v is within cell
         """
+        if not segments:
+            return True
+        A = np.array([np.ravel(a) for (a, _) in segments])
+        B = np.array([np.ravel(b) for (_, b) in segments])
         if p is None:
-            p = np.zeros(2)  # point that is in center of C
-            for a, b in segments:
-                p += a + b
-            p = p.reshape((2, 1))/(2*len(segments))
-
-        for (a, b) in segments:
-            a = a.reshape((len(a), 1))
-            b = b.reshape((len(b), 1))
-
-            outside_dir = project_p_onto_line(p, a, b - a) - p
-            # this is a vector pointing 'outside' segment (a,b)
-            # uses the fact that (a,b) bounds a cell containing p, and that p*-p points out of the cell
-            #   (where p* is p's projection onto line extending (a,b))
-            vertex_dir = project_p_onto_line(v, a, b - a) - v
-            # this is a vector pointing from vertex v to its projection on line extending (a,b)
-            if np.dot(outside_dir.T, vertex_dir) >= -self.tol*np.linalg.norm(vertex_dir)*np.linalg.norm(outside_dir):
-                # equivalent to outside_dir*vertex_dir/(|outside_dir||vertex_dir|)>=-tol
-                # we multiply since vertex_dir may be 0 (outside_dir should not be 0)
-                # if this is nonnegative then they point the same direction and v is inside this bound
-                continue
-            else:
-                return False
-        return True
+            p = (A.sum(axis=0) + B.sum(axis=0))/(2*len(segments))
+        V = np.tile(np.ravel(v), (len(segments), 1))
+        P = np.tile(np.ravel(p), (len(segments), 1))
+        return bool(np.all(orientation(A, B, V)*orientation(A, B, P) >= 0))
 
-    def check_if_valid(self, p, source, bound_path, segments):
+    def check_if_valid(self, p, source, bound_path, segments, half_planes=None):
         """
         pick a face F and p have vornonoi cell C,
             this method returns true if all paths p to (C intersect F) are 'correct'
@@ -200,108 +1130,209 @@ class Shape:
         :param bound_path: list of (bound, F) representing the path of bounds from source face (with p on it) to sink face
             Must have at least one element, this doesnt make sense if the source is the sink face
         :param segments: list of (a,b) line segments making up voronoi cell of p
+        :param half_planes: cell_half_planes of segments, if already computed
         :return: list of points that are relevant on intersection of C and F
         """
-        checking_pts = []  # points to check
         (_, sink) = bound_path[-1]
         sink: Face
         source: Face
 
         # all vertices of C that are in F
         # also all boundary intersections
-        for (a, b) in segments:
-            a = a.reshape((len(a), 1))
-            b = b.reshape((len(b), 1))
-
-            # check if a or b is within F, and add them to points to check
-            for q in (a, b):
-                if sink.within_bounds(q) and not any(np.array_equal(q, q1) for q1 in checking_pts):
-                    checking_pts.append(q)
+        checking_pts = []  # arrays of points to check
+        if segments:
+            A = np.array([np.ravel(a) for (a, _) in segments])
+            B = np.array([np.ravel(b) for (_, b) in segments])
+            ends = np.concatenate((A, B), axis=0)
+            checking_pts.append(ends[sink.within_bounds_batch(ends)])
             # check if either the line ab or ba exits F, and add them to points to check
-            for q in (sink.get_exit_point(a, b - a), sink.get_exit_point(b, a - b)):
-                if q is not None and not any(np.array_equal(q, q1) for q1 in checking_pts):
-                    checking_pts.append(q)
+            exits, exists = sink.get_exit_points(ends, np.concatenate((B - A, A - B), axis=0))
+            checking_pts.append(exits[exists])
         # all vertices of F that are in C
-        for (v, _) in sink.get_vertices():
-            # if self.point_within_cell(v, segments, p=p):
-            if self.point_within_cell(v, segments, p=None):
-                checking_pts.append(v)
-
-        # now go through and check each point
-        for q in checking_pts:
-            q_orig = q.copy()
-            p_temp = p.copy()
-            # this is a little annoying since bound path goes from p to q,
-            #   but it is much easier to check in the opposite direction
-            for (inv_bound, face) in bound_path[::-1]:
-                face: Face
-                # since bound goes from p to q, we need to invert it to go the other way
-                inv_bound: Bound
-                bound = inv_bound.get_inverse_bound()
-                if not face.within_bounds(q):
-                    # if the end that we check is outside of the face, we fail
-                    print(p.flatten(), 'invalid with point ', q_orig.flatten())
-                    return False
-
-                # set new q to the point where qp exits the current face
-                q_temp = face.get_exit_point(q, p_temp - q)
-                # now update p and q for the next face
-                if q_temp is None:
-                    # EDGE CASE: p is on the same face as q
-                    # this is a literal edge case, as p is on the boundary of the face
-                    # then we can simply set p and q to the same value and continue to the next step
-                    # the next check will make sure the boundary that p sits on is actually the correct boundary
-                    q_temp = p_temp
-                q = bound.shift_point(q_temp)
-                p_temp = bound.shift_point(p_temp)
-            # here, we do one last check to see if our last q is actually in the source face
-            if not source.within_bounds(q):
-                print(p.flatten(), 'invalid with point ', q.flatten())
-                return False
+        if half_planes is None:
+            half_planes = cell_half_planes(segments)
+        # a cell with no area (a segment or a point, see ClippedVoronoi) has no interior point to take half-planes from,
+        #   and any vertex of F on it is already one of its ends
+        if not segments or np.linalg.matrix_rank(ends - ends[0], tol=sink.tol) == 2:
+            V = np.concatenate([v.T for (v, _) in sink.get_vertices()], axis=0)
+            checking_pts.append(V[points_within_cells(V, [half_planes])[0]])
+        Q = np.unique(np.concatenate(checking_pts, axis=0), axis=0)
+
+        # now check every point at once, as rows of Q
+        # if any point comes closer to the boundary of a face than the float error of moving it there,
+        #   the float result may be wrong, so every point is checked again with exact arithmetic
+        bad, close_call = self._follow_bound_path(p.flatten(), source, bound_path, Q)
+        if close_call:
+            bad, _ = self._follow_bound_path(exact_array(p.flatten()), source, bound_path, exact_array(Q))
+        if bad is not None:
+            print(p.flatten(), 'invalid with point ', Q[bad])
+            return False
         return True
 
-    def filter_out_points(self, points, bound_paths, source, sink, do_filter=True, ignore_points_on_locus=False):
+    def _follow_bound_path(self, p, source, bound_path, Q):
+        """
+        moves points on the sink face back along a bound path to the source face, on the lines to p
+            if p and Q are object arrays of Fractions (see exact_array), every step is exact
+        :param p: (self.dimension,) array, p with the sink face as the origin
+        :param source: source face
+        :param bound_path: list of (bound, F) representing the path of bounds from source face to sink face
+        :param Q: (N,self.dimension) array of points on the sink face
+        :return: (index of a point that leaves the faces of the path or None,
+            whether any point was closer to the boundary of a face than the float error of getting there)
+        """
+        exact = Q.dtype == object
+        close_call = False
+        # this is a little annoying since bound path goes from p to q,
+        #   but it is much easier to check in the opposite direction
+        p_temp = p
+        for step, (inv_bound, face) in enumerate(bound_path[::-1]):
+            face: Face
+            # since bound goes from p to q, we need to invert it to go the other way
+            inv_bound: Bound
+            bound = inv_bound.get_inverse_bound()
+            inside = face.within_bounds_batch(Q)
+            if not exact and step > 0:
+                close_call |= self._near_face_boundary(face, Q, step)
+            if not np.all(inside):
+                # if the end that we check is outside of the face, we fail
+                return np.argmin(inside), close_call
+
+            # set new q to the point where qp exits the current face
+            Q_temp, exists = face.get_exit_points(Q, p_temp - Q)
+            # EDGE CASE: p is on the same face as q
+            # this is a literal edge case, as p is on the boundary of the face
+            # then we can simply set p and q to the same value and continue to the next step
+            # the next check will make sure the boundary that p sits on is actually the correct boundary
+            Q_temp[~exists] = p_temp
+            # now update p and q for the next face (shift_point works on arrays of column vectors)
+            Q = bound.shift_point(Q_temp.T).T
+            p_temp = bound.shift_point(p_temp.reshape((-1, 1))).flatten()
+        # here, we do one last check to see if our last q is actually in the source face
+        inside = source.within_bounds_batch(Q)
+        if not exact:
+            close_call |= self._near_face_boundary(source, Q, len(bound_path))
+        if not np.all(inside):
+            return np.argmin(inside), close_call
+        return None, close_call
+
+    def _near_face_boundary(self, face, Q, steps):
+        """
+        :param face: Face
+        :param Q: (N,self.dimension) array of points, after some steps of _follow_bound_path
+        :param steps: number of faces the points were moved across
+        :return: whether any point is within the float error of these steps of the boundary of the face (with tolerance)
+        """
+        err = PATH_ERROR_GROWTH*EPS*steps*(1 + np.max(np.abs(Q), axis=1))
+        return bool(np.any(np.abs(face.bound_margins(Q)) <= err))
+
+    def cells_meet_face(self, cells, sink, ignore_points_on_locus=False):
+        """
+        checks which voronoi cells intersect the sink face
+            to check this, we can split into two cases
+             (1): a line from the vornoi cell lies within the face
+             (2): the face lies completely within the voronoi cell
+            there are no other ways for this intersection to happen
+        :param cells: list of cells, each a list of (a,b) line segments
+        :param sink: sink face
+        :param ignore_points_on_locus: whether to ignore cells that only meet the face at a single point
+        :return: (len(cells),) boolean array
+        """
+        meets = np.zeros(len(cells), dtype=bool)
+        if sink.bound_M is None:
+            sink._create_bound_arrays()
+        for k, segments in enumerate(cells):
+            if not segments:
+                continue
+            # lines with both ends outside the same bound (beyond float error) cannot be in the face,
+            #   which is most lines, so they are skipped at once
+            ends = np.array([(np.ravel(a), np.ravel(b)) for (a, b) in segments])
+            gaps = sink.bound_rhs[:, 0] - ends@sink.bound_M.T
+            err = sink.bound_err*(1 + np.abs(ends).max(axis=2))
+            outside = np.any(np.all(gaps < -err[:, :, np.newaxis], axis=1), axis=1)
+            for (a, b), out in zip(segments, outside):
+                if out:
+                    continue
+                # if any line of the point's voronoi cell is in face F, we call this point relevant
+                if sink.line_within_bounds(a.reshape((2, 1)),
+                                           b.reshape((2, 1)),
+                                           ignore_points=ignore_points_on_locus,
+                                           ):
+                    meets[k] = True
+                    break
+        # check edge case:
+        # the sink face F is completely within cell C
+        # to check this, we only need to test if an arbitrary vertex of F is in C
+        # this is done for every remaining cell at once
+        rest = np.flatnonzero(~meets)
+        if len(rest):
+            (v, _) = sink.get_vertices()[0]
+            meets[rest] = points_within_cells(v.T, [cell_half_planes(cells[k]) for k in rest])[:, 0]
+        return meets
+
+    def first_valid_path(self, p, source, alternatives, segments):
+        """
+        first bound path of a point that passes check_if_valid
+        :param p: column vector
+        :param source: source face
+        :param alternatives: list of alternative bound paths of p
+        :param segments: list of (a,b) line segments making up voronoi cell of p
+        :return: bound path, or None if none are valid
+        """
+        half_planes = cell_half_planes(segments)
+        for bound_path in alternatives:
+            if self.check_if_valid(p, source, bound_path, segments, half_planes=half_planes):
+                return bound_path
+        return None
+
+    def filter_out_points(self,
+                          points,
+                          bound_paths,
+                          source,
+                          sink,
+                          do_filter=True,
+                          ignore_points_on_locus=False,
+                          remove_all_invalid=True,
+                          hint=None,
+                          ):
         """
         repeatedly makes voronoi complices, looks at relevant points, then filters out points that do not pass through correct faces
         Note: this augments points by placing 4 very distant points that do not affect the relevant section of the complex
             (artifact of voronoi complex implementation)
         :param points: list of column vectors
-        :param bound_paths: list of (list of (bound, F) representing the path of bounds from source face (with p on it) to sink face)
+        :param bound_paths: list of (list of alternative bound paths for each point)
+            each bound path is a list of (bound, F) representing the path of bounds from source face (with p on it) to sink face
+            a point is kept if any of its alternatives passes check_if_valid
         :param source: source face
         :param sink: sink face
         :param do_filter: whether to filter the points
                     probably only set to false when surface is not polyhedra (i.e. torus or mirror)
         :param ignore_points_on_locus: whether to ignore single points on cut locus
+        :param remove_all_invalid: whether to check every relevant point and remove all invalid ones in the same pass
+            removing points only grows the other cells, so an invalid point stays invalid, and this usually takes
+            one or two voronoi complices instead of one for each invalid point
+            if every relevant point is invalid, only the first is removed, as in the one at a time mode
+            (points whose cells only reach the sink face after the removal are checked in the next pass)
+        :param hint: set of bound_path_key of bound paths that were needed by a nearby query, or None
+            if given, the points with these bound paths are filtered first, and hint is updated for the next query
+            (see filter_out_hinted_points)
         :return: list of points and bound paths that are relevant, augmented by four bounding points that are very far away
+            the bound path of each point is the first of its alternatives that is valid
         """
+        if hint is not None and do_filter:
+            return self.filter_out_hinted_points(points,
+                                                 bound_paths,
+                                                 source,
+                                                 sink,
+                                                 hint,
+                                                 ignore_points_on_locus=ignore_points_on_locus,
+                                                 remove_all_invalid=remove_all_invalid,
+                                                 )
 
-        def augment_point_paths(pts, bnd_paths):
-            """
-            adds 4 large points so that the vornoi diagram is always defined
-                puts them in corners of extremely large bounding box
-            :param pts: array of column vector points (must be populated)
-            :param bnd_paths: array of paths (will add 'None' to this)
-            :return (points, bound_paths), both sorted by angle of point for non-augmented points, and augmented at end
-            """
-            large = 69*(sum(np.linalg.norm(p) for p in pts) + 1)
-            shape = pts[0].shape
-            vs = [np.ones(shape)]
-            vs.append(vs[0].copy())
-            vs[1][0, 0] = -vs[1][0, 0]
-            vs.append(-vs[0])
-            vs.append(-vs[1])
-
-            together = list(zip(pts, bnd_paths))
-            together.sort(key=lambda x: np.arctan2(x[0][1, 0], x[0][0, 0])%(2*np.pi))
-            for i in range(4):
-                large_pt = large*vs[i]
-                # pts.append(large_pt)
-                # bnd_paths.append(None)
-                together.append((large_pt, None))
-            # together = list(zip(pts, bnd_paths))
-            # together.sort(key=lambda x: np.arctan2(x[0][1, 0], x[0][0, 0])%(2*np.pi))
-            return [p for (p, _) in together], [pth for (_, pth) in together]
+        def point_keys(pts):
+            return sorted(tuple(np.round(pt.flatten()/self.tol).astype(int)) for pt in pts)
 
+        # (relevant points, bound paths, index of first invalid point, keys of points kept) of the last batch removal
+        last_batch = None
         bad_point_found = True
         while bad_point_found:
             bad_point_found = False
@@ -313,93 +1344,73 @@ class Shape:
             points = np.concatenate(vp, axis=1)
             points = points.T
             # find the cell complex of them
-            point_to_segments = dict()
-            for point_pair, (seg_type, (a, b)) in voronoi_diagram_calc(points=points).items():
-                for pt in point_pair:
-                    if pt not in point_to_segments:
-                        point_to_segments[pt] = list()
-                    if seg_type == 'segment':
-                        point_to_segments[pt].append((a, b))
-                    elif seg_type == 'ray':
-                        point_to_segments[pt].append((a, a + b))
-                    else:
-                        raise NotImplementedError
+            point_to_segments = voronoi_diagram_calc(points=points, as_arrays=True).point_segments()
 
             # gather the relevant points: the ones whose cells intersect the sink face
-            # to check this, we can split into two cases
-            #  (1): a line from the vornoi cell lies within the face
-            #  (2): the face lies completely within the voronoi cell
-            # there are no other ways for this intersection to happen
             relevant_points = []
             relevant_bound_paths = []
             relevant_cells = []
 
-            duplicates = []
-            for p_idx in point_to_segments:
+            p_idxs = list(point_to_segments)
+            meets = self.cells_meet_face([point_to_segments[p_idx] for p_idx in p_idxs],
+                                         sink,
+                                         ignore_points_on_locus=ignore_points_on_locus,
+                                         )
+            for p_idx in np.array(p_idxs)[meets]:
                 point = points[(p_idx,), :]  # row vector of point that created this
-                point_included = False
-                if len(point_to_segments[p_idx]) == 0:
-                    # edge case: point does not have a voronoi cell
-                    # this happens with duplicate or very close points
-                    # need to be careful here
-                    # if the duplicate is not a 'bad point' then we are fine, as any of them would have the same voronoi complex
-                    # (i.e. now there are just more possible face paths to get the same cell)
-                    # if the duplicate is a 'bad point', we need to remove just that point and start over
-                    # its possible that the duplicates have different face paths,
-                    #   and in this case we need to just remove the one that we confirm is bad
-                    duplicates.append((point.T, bound_paths[p_idx], point_to_segments[p_idx]))
-                    # we will save all duplicates, and if we fail anything, we will add back all of them
+                relevant_points.append(point.T)
+                relevant_bound_paths.append(bound_paths[p_idx])
+                relevant_cells.append(point_to_segments[p_idx])
+            if last_batch is not None:
+                batch_points, batch_bound_paths, first_bad, kept_keys = last_batch
+                last_batch = None
+                if point_keys(pt for (pt, pth) in zip(relevant_points, relevant_bound_paths)
+                              if pth is not None) != kept_keys:
+                    # the removal changed which cells touch the sink face,
+                    # so undo it and remove one point at a time from here on
+                    remove_all_invalid = False
+                    points = batch_points[:first_bad] + batch_points[first_bad + 1:]
+                    bound_paths = batch_bound_paths[:first_bad] + batch_bound_paths[first_bad + 1:]
+                    bad_point_found = True
                     continue
-                for a, b in point_to_segments[p_idx]:
-                    # if any line of the point's voronoi cell is in face F, we call this point relevant and continue
-                    if sink.line_within_bounds(a.reshape((2, 1)),
-                                               b.reshape((2, 1)),
-                                               ignore_points=ignore_points_on_locus,
-                                               ):
-                        relevant_points.append(point.T)
-                        relevant_bound_paths.append(bound_paths[p_idx])
-                        relevant_cells.append(point_to_segments[p_idx])
-                        point_included = True
-                        break
-                if not point_included:
-                    # check edge case:
-                    # the sink face F is completely within cell C
-                    # if this is true, we also add the point
-                    # to check this, we only need to test if an arbitrary vertex of F is in C
-                    (v, _) = sink.get_vertices()[0]
-
-                    # if self.point_within_cell(v,point_to_segments[p_idx],p=point.T):
-                    if self.point_within_cell(v, point_to_segments[p_idx], p=None):
-                        # if this is actually what is happening, we consider this relevant and continue
-                        relevant_points.append(point.reshape((2, 1)))
-                        relevant_bound_paths.append(bound_paths[p_idx])
-                        relevant_cells.append(point_to_segments[p_idx])
             if not relevant_points:
                 print("ERROR NO RELEVANT POINTS")
                 # this should not happen as we only fully skip repeats
                 return None, None, None
             if not do_filter:
-                points, bound_paths = augment_point_paths(relevant_points, relevant_bound_paths)
+                points, bound_paths = augment_point_paths(relevant_points,
+                                                          [alternatives[0] for alternatives in relevant_bound_paths])
                 return points, bound_paths, relevant_cells
 
             # now iterate through relevant points and see if they actually have the property we want
             # i.e. points on their voronoi cell intersect the sink face are actually in the path of faces we say they are
-            # if any fail, we remove it and restart loop
+            # a point has this property if any of its alternative bound paths does, so we keep the first that passes
+            # if all alternatives fail, we remove the point (or every such point) and restart loop
             # if all succeed, we return the relevant points, bound paths, and segments
-            for idx, (pt, bound_path, cell_segment) in enumerate(
+            valid_paths = []
+            bad_idxs = []
+            for idx, (pt, alternatives, cell_segment) in enumerate(
                     zip(relevant_points, relevant_bound_paths, relevant_cells)):
-                if not self.check_if_valid(pt, source, bound_path, cell_segment):
+                valid_path = self.first_valid_path(pt, source, alternatives, cell_segment)
+                if valid_path is None:
                     bad_point_found = True
-
-                    # remove this point and continue the loop
-                    relevant_points.pop(idx)
-                    relevant_bound_paths.pop(idx)
-
-                    points = relevant_points + [dup_pt for (dup_pt, _, _) in duplicates]
-                    bound_paths = relevant_bound_paths + [dup_pth for (_, dup_pth, _) in duplicates]
-                    break
+                    bad_idxs.append(idx)
+                    if not remove_all_invalid:
+                        break
+                valid_paths.append(valid_path)
             if bad_point_found:
+                if len(bad_idxs) == len(relevant_points):
+                    bad_idxs = bad_idxs[:1]
+                # remove these points and continue the loop
+                points = [pt for idx, pt in enumerate(relevant_points) if idx not in bad_idxs]
+                bound_paths = [pth for idx, pth in enumerate(relevant_bound_paths) if idx not in bad_idxs]
+                if len(bad_idxs) > 1:
+                    last_batch = (relevant_points,
+                                  relevant_bound_paths,
+                                  bad_idxs[0],
+                                  point_keys(pt for (pt, pth) in zip(points, bound_paths) if pth is not None),
+                                  )
                 continue
             # otherwise, no bad point is found, we can just augment and return here
-            points, bound_paths = augment_point_paths(relevant_points, relevant_bound_paths)
+            points, bound_paths = augment_point_paths(relevant_points, valid_paths)
             return points, bound_paths, relevant_cells
@@ -0,0 +1,95 @@
+import numpy as np
+
+
+def unfold_path(path):
+    """
+    unfolds the faces along a bound path into the coordinates of the source face
+    :param path: list of (bound, F) representing the path of bounds from source face to sink face
+    :return: list of (F, T, s) for each face along the path (ending with the sink face),
+        a point x in coordinates of F is T x + s in coordinates of the source face
+    """
+    unfolded = []
+    T, s = None, None
+    for bnd, F in path:
+        # map from F to the previous face along the path
+        A, a = bnd.get_inverse_bound().concatenate_with()
+        if T is None:
+            T, s = A, a
+        else:
+            T, s = T@A, T@a + s
+        unfolded.append((F, T, s))
+    return unfolded
+
+
+class SourceUnfolding:
+    def __init__(self, p, source_fn, faces, diagrams, lone_copies=None):
+        """
+        source unfolding of a shape around a point p: the cells of the copies of p on every sink face,
+            unfolded along their bound paths into the coordinates of the source face
+            the copy of p on each cell is unfolded onto p, and every point of the shape is on some cell,
+            with the geodesic from p being the straight line in the unfolding
+        :param p: column vector, point on source face
+        :param source_fn: source face name
+        :param faces: dict of (face name -> Face) of the shape
+        :param diagrams: dict of (sink face name -> result of ConvexPolyhderon.get_voronoi_diagram)
+            may have None for faces with no cut locus
+        :param lone_copies: dict of (sink face name -> (point, bound path)) for faces with only one copy of p,
+            whose cell is the whole face
+        """
+        self.p = p
+        self.source_fn = source_fn
+        self.faces = faces
+        self.diagrams = diagrams
+        # list of (sink face name, index of copy in diagram, unfold_path of its bound path)
+        self.pieces = []
+        # for each piece, (T,s) so that T y + s is in the source frame for y on the sink face
+        self.maps = []
+        for sink_fn, diagram in diagrams.items():
+            if diagram is None:
+                continue
+            _, (relevant_points, relevant_bound_paths, _) = diagram
+            for idx, (pt, path) in enumerate(zip(relevant_points, relevant_bound_paths)):
+                if path is None:
+                    # far away points
+                    continue
+                self._add_piece(sink_fn, idx, path, pt)
+        if lone_copies is not None:
+            for sink_fn, (pt, path) in lone_copies.items():
+                self._add_piece(sink_fn, 0, path, pt)
+
+    def _add_piece(self, sink_fn, idx, path, pt):
+        """
+        :param sink_fn: sink face name
+        :param idx: index of copy in the diagram of the sink face
+        :param path: bound path of copy
+        :param pt: copy of p, column vector
+        """
+        unfolded = unfold_path(path)
+        if unfolded:
+            _, T, s = unfolded[-1]
+        else:
+            T, s = np.identity(len(pt)), np.zeros(pt.shape)
+        self.pieces.append((sink_fn, idx, unfolded))
+        self.maps.append((T, s))
+
+    def cut_locus(self, sink_fn):
+        """
+        :param sink_fn: sink face name
+        :return: cut locus on the sink face, in the format of ConvexPolyhderon.get_voronoi_diagram
+        """
+        return self.diagrams.get(sink_fn)
+
+    def piece_segments(self, piece_idx):
+        """
+        :param piece_idx: index of piece
+        :return: dict of (point pair -> (a,b)) of cut locus segments on the boundary of the cell of the piece,
+            with column vector endpoints in coordinates of the source face
+        """
+        sink_fn, idx, _ = self.pieces[piece_idx]
+        T, s = self.maps[piece_idx]
+        if self.diagrams.get(sink_fn) is None:
+            return dict()
+        point_pair_to_segment, _ = self.diagrams[sink_fn]
+        return {point_pair: (T@a.reshape((-1, 1)) + s, T@b.reshape((-1, 1)) + s)
+                for point_pair, (_, (a, b)) in point_pair_to_segment.items()
+                if idx in point_pair}
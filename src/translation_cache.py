@@ -0,0 +1,128 @@
+from collections import OrderedDict
+
+# default byte budget of a shape's translation cache
+DEFAULT_MAX_BYTES = 2**30
+
+
+class TranslationCache:
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        """
+        memo of Shape.get_voronoi_translations, with keys (source_fn, sink_fn, diameter, prune, max_dist)
+            and values (PathTrie, list of arrays of nodes with the same translation)
+        evicts the least recently used keys once the values take more than max_bytes
+            every sink of a source shares one PathTrie, so a trie is counted once, and freed with its last key
+        cleared when the faces or bounds of the shape change (see validate)
+        :param max_bytes: byte budget, None if unbounded
+        """
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> (trie, groups), least recently used first
+        self.trie_refs = dict()  # id of trie -> [number of keys using it, bytes of trie]
+        self.nbytes = 0
+        self.signature = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __getitem__(self, key):
+        self.entries.move_to_end(key)
+        return self.entries[key]
+
+    def __setitem__(self, key, value):
+        if key in self.entries:
+            self._remove(key)
+        trie, groups = value
+        if id(trie) not in self.trie_refs:
+            self.trie_refs[id(trie)] = [0, trie.nbytes()]
+            self.nbytes += self.trie_refs[id(trie)][1]
+        self.trie_refs[id(trie)][0] += 1
+        self.nbytes += sum(group.nbytes for group in groups)
+        self.entries[key] = value
+        self._evict()
+
+    def __delitem__(self, key):
+        self._remove(key)
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def keys(self):
+        return self.entries.keys()
+
+    def items(self):
+        return self.entries.items()
+
+    def setdefault(self, key, value):
+        if key not in self.entries:
+            self[key] = value
+        return self.entries.get(key, value)
+
+    def lookup(self, key):
+        """
+        gets a value, counting a hit or a miss
+        :param key: (source_fn, sink_fn, diameter, prune, max_dist)
+        :return: (PathTrie, groups), or None if key is not cached
+        """
+        if key in self.entries:
+            self.hits += 1
+            return self[key]
+        self.misses += 1
+        return None
+
+    def _remove(self, key):
+        trie, groups = self.entries.pop(key)
+        self.nbytes -= sum(group.nbytes for group in groups)
+        refs = self.trie_refs[id(trie)]
+        refs[0] -= 1
+        if refs[0] == 0:
+            self.nbytes -= refs[1]
+            del self.trie_refs[id(trie)]
+
+    def _evict(self):
+        """
+        removes least recently used keys until the budget is met
+        """
+        if self.max_bytes is None:
+            return
+        while self.entries and self.nbytes > self.max_bytes:
+            self._remove(next(iter(self.entries)))
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+        self.trie_refs.clear()
+        self.nbytes = 0
+
+    def validate(self, signature):
+        """
+        clears the cache if the shape changed since the last call
+        :param signature: hashable summary of the faces and bounds of the shape (see Shape.face_graph_signature)
+        :return: whether the signature changed
+        """
+        if signature == self.signature:
+            return False
+        if self.signature is not None and self.entries:
+            self.clear()
+            self.invalidations += 1
+        self.signature = signature
+        return True
+
+    def stats(self):
+        """
+        :return: dict of counters and memory use
+        """
+        return {'entries': len(self.entries),
+                'tries': len(self.trie_refs),
+                'bytes': self.nbytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                }
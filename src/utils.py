@@ -1,4 +1,7 @@
 import numpy as np
+from scipy.spatial import cKDTree
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
 
 # rotation matrices
 def rotation_T(theta):
@@ -29,6 +32,37 @@ def rowtation(theta):
     return coltation(theta).T
 
 
+def point_segment_distance(p, a, b):
+    """
+    distance from point p to the segment a->b
+    :param p: column vector
+    :param a: column vector
+    :param b: column vector
+    :return: scalar
+    """
+    v = b - a
+    vv = np.dot(v.T, v)[0, 0]
+    t = 0. if vv == 0 else np.clip(np.dot(v.T, p - a)[0, 0]/vv, 0., 1.)
+    return np.linalg.norm(p - (a + v*t))
+
+
+def group_close_rows(X, tol):
+    """
+    groups rows of X that are within tol of each other (or connected by a chain of such rows)
+    :param X: (n,k) array
+    :param tol: tolerance
+    :return: list of index arrays, one per group, each increasing and ordered by their first index
+    """
+    n = len(X)
+    pairs = cKDTree(X).query_pairs(r=tol, output_type='ndarray')
+    graph = coo_matrix((np.ones(len(pairs)), (pairs[:, 0], pairs[:, 1])), shape=(n, n))
+    _, labels = connected_components(graph, directed=False)
+    # relabel so that groups are ordered by their first index
+    _, first, labels = np.unique(labels, return_index=True, return_inverse=True)
+    order = np.argsort(first)
+    return [np.flatnonzero(labels == i) for i in order]
+
+
 def flatten(L):
     """
     flattens a list of lists
@@ -0,0 +1,205 @@
+import numpy as np
+
+
+def line_through(x, y):
+    """
+    line through x and y, oriented from x to y
+    :param x: column vector (np array of dimension (2,1))
+    :param y: column vector (np array of dimension (2,1))
+    :return: (w_1,w_2,c) representing the line {z : wz=c}, where wz>=c is the left side of x->y
+    """
+    d = (y - x).flatten()
+    w = np.array([-d[1], d[0]])
+    return np.array([w[0], w[1], np.dot(w, x.flatten())])
+
+
+def _convex_hull_2d(X):
+    """
+    :param X: (n,2) array of points
+    :return: indices of the vertices of the convex hull of X, in counterclockwise order (monotone chain)
+    """
+    order = np.lexsort((X[:, 1], X[:, 0]))
+
+    def half(idxs):
+        out = []
+        for i in idxs:
+            while len(out) >= 2:
+                u, v = X[out[-1]] - X[out[-2]], X[i] - X[out[-2]]
+                if u[0]*v[1] - u[1]*v[0] > 0:
+                    break
+                out.pop()
+            out.append(i)
+        return out
+
+    lower, upper = half(order), half(order[::-1])
+    hull = lower[:-1] + upper[:-1]
+    return hull if hull else [order[0]]
+
+
+def _cone_hull(rays):
+    """
+    smallest convex cone containing some rays
+    :param rays: (m,3) array of unit rays
+    :return: (m',3) array of extreme rays in cyclic order,
+        or None if the rays are not all strictly on one side of some plane through the origin
+    """
+    g = rays.sum(axis=0)
+    if np.linalg.norm(g) == 0:
+        return None
+    g = g/np.linalg.norm(g)
+    heights = rays@g
+    if np.any(heights <= 1e-9):
+        return None
+    # central projection onto the plane g.r=1, where the cone is a convex polygon
+    # orthonormal basis of the plane
+    e1 = np.cross(g, np.identity(3)[np.argmin(np.abs(g))])
+    e1 = e1/np.linalg.norm(e1)
+    e2 = np.cross(g, e1)
+    X = np.stack((rays@e1, rays@e2), axis=1)/heights[:, np.newaxis]
+    hull = _convex_hull_2d(X)
+    out = g + X[hull, :1]*e1 + X[hull, 1:]*e2
+    return out/np.linalg.norm(out, axis=1, keepdims=True)
+
+
+class Window:
+    def __init__(self, entry, rays=None, flipped=False, tol=0.):
+        """
+        window of straight lines that can follow a path of faces
+            if this is empty, no geodesic can follow the path, so we can stop searching it
+        a line {x : wx=c} is represented as (w_1,w_2,c), where wx>=c is the left side of the direction of travel
+            the lines that cross a sequence of edges (each in the direction of the path) form a convex polyhedral cone,
+            which we store as its extreme rays in cyclic order
+
+        :param entry: (a,b) endpoints of the last edge crossed, column vectors in coordinates of the current face
+        :param rays: (m,3) array of extreme rays of the cone of lines, in coordinates of the current face
+            if None, only one edge has been crossed, and the window is every line crossing entry
+        :param flipped: whether the orientation of the current face is reversed from the face the cone was made in
+        :param tol: tolerance for clipping, larger tolerance keeps more paths
+        """
+        self.entry = entry
+        self.rays = rays
+        self.flipped = flipped
+        self.tol = tol
+
+    def is_empty(self):
+        return self.rays is not None and len(self.rays) == 0
+
+    def _clip(self, rays, h, tol=None):
+        """
+        clips cone by the half space h.r>=0 (Sutherland-Hodgman, but with rays instead of points)
+        :param rays: (m,3) array of extreme rays in cyclic order
+        :param h: (3,) normal of half space
+        :param tol: tolerance for clipping, self.tol if None
+        :return: (m',3) array of extreme rays in cyclic order (empty if the cone is empty)
+        """
+        if tol is None:
+            tol = self.tol
+        vals = rays@h/np.sqrt(h@h)
+        inside = vals >= -tol
+        if np.all(inside):
+            return rays
+        if not np.any(inside):
+            return np.zeros((0, 3))
+        # for each ray i (and the next ray j), in order: ray i if it is inside,
+        #   then where the side from i to j leaves or enters the half space
+        rays_j, vals_j, inside_j = np.roll(rays, -1, axis=0), np.roll(vals, -1), np.roll(inside, -1)
+        candidates = np.stack((rays,
+                               vals[:, np.newaxis]*rays_j - vals_j[:, np.newaxis]*rays,
+                               vals_j[:, np.newaxis]*rays - vals[:, np.newaxis]*rays_j,
+                               ), axis=1)
+        keep = np.stack((inside,
+                         inside & ~inside_j & (vals > 0),
+                         inside_j & ~inside & (vals_j > 0),
+                         ), axis=1)
+        out = candidates[keep]
+        return out/np.linalg.norm(out, axis=1, keepdims=True)
+
+    def cross(self, a, b, basepoint, margin=0.):
+        """
+        restricts window to lines that also leave the current face through edge (a,b)
+            faces are checked with tolerance (see Shape.check_if_valid), so a line may also pass within margin
+            of an endpoint of the edge instead, even crossing the line of the edge outside the face
+            (near a vertex, such a line crosses the edges of the face in the other order)
+            the window is then the smallest cone containing both sets of lines
+        :param a: column vector, endpoint of edge
+        :param b: column vector, other endpoint of edge
+        :param basepoint: column vector, point inside the current face
+        :param margin: distance from an endpoint within which lines are kept
+        :return: Window, in coordinates of the current face
+        """
+        if self.rays is None:
+            # second edge crossed, the cone is spanned by lines through an endpoint of each edge
+            #   lines within margin of a or b pass through the squares around them, so their corners are used as well
+            corners = [np.zeros((2, 1))] + [margin*np.array([[x], [y]]) for x in (-1, 1) for y in (-1, 1)]
+            rays = [line_through(x, v + corner) for x in self.entry for v in (a, b) for corner in corners]
+            # if the edges share a vertex, one of these is not a line
+            rays = [r/np.linalg.norm(r) for r in rays if np.linalg.norm(r[:2]) > self.tol]
+            rays = _cone_hull(np.stack(rays))
+            if rays is None:
+                return Window(entry=(a, b), rays=None, flipped=False, tol=self.tol)
+            return Window(entry=(a, b), rays=rays, flipped=False, tol=self.tol)
+
+        left, right = self._left_right(a, b, basepoint, flipped=self.flipped)
+        h_left, h_right = np.append(left.flatten(), -1.), np.append(-right.flatten(), 1.)
+        rays = self._clip(self.rays, h_left)
+        if len(rays):
+            rays = self._clip(rays, h_right)
+        if margin > 0:
+            # lines within margin of each endpoint (|wv-c|<=margin|w|, and |w|<=1 for unit rays)
+            near = [np.zeros((0, 3))]
+            for v in (a, b):
+                h = np.append(v.flatten(), -1.)
+                vals = self.rays@h/np.sqrt(h@h)
+                if np.all(vals > margin) or np.all(vals < -margin):
+                    # every line of the cone is farther than margin from v
+                    continue
+                near_v = self._clip(self.rays, h, tol=margin)
+                if len(near_v):
+                    near.append(self._clip(near_v, -h, tol=margin))
+            near = np.concatenate(near)
+            # lines near an endpoint that also cross the edge are already in the cone
+            crossing = ((near@h_left >= -self.tol*np.linalg.norm(h_left)) &
+                        (near@h_right >= -self.tol*np.linalg.norm(h_right)))
+            if not np.all(crossing):
+                rays = _cone_hull(np.concatenate((rays, near)))
+                if rays is None:
+                    # the lines are not all on one side of a plane, so this edge does not restrict the window
+                    rays = self.rays
+        return Window(entry=(a, b), rays=rays, flipped=self.flipped, tol=self.tol)
+
+    @staticmethod
+    def _left_right(a, b, basepoint, flipped):
+        """
+        orders endpoints of an edge into (left, right) wrt direction of travel when exiting face through edge
+        :return: (left, right) column vectors
+        """
+        ab = (b - a).flatten()
+        ao = (basepoint - a).flatten()
+        if (ab[0]*ao[1] - ab[1]*ao[0] > 0) != flipped:
+            # basepoint is left of a->b, so we are travelling to the right of a->b
+            return b, a
+        return a, b
+
+    def shift(self, bound):
+        """
+        puts window in coordinates of neighboring face according to bound
+        :param bound: Bound that the window passes through
+        :return: Window
+        """
+        entry = (bound.shift_point(self.entry[0]), bound.shift_point(self.entry[1]))
+        if self.rays is None:
+            return Window(entry=entry, rays=None, flipped=self.flipped, tol=self.tol)
+        # x'=Tx+t, so wx=c becomes (T^-T w)x'=c+(T^-T w)t
+        Ti_T = np.linalg.inv(bound.T).T
+        t = bound.shift_point(np.zeros((2, 1)))
+        M = np.zeros((3, 3))
+        M[:2, :2] = Ti_T
+        M[2, :2] = (Ti_T.T@t).flatten()
+        M[2, 2] = 1
+        rays = self.rays@M.T
+        rays = rays/np.linalg.norm(rays, axis=1, keepdims=True)
+        return Window(entry=entry,
+                      rays=rays,
+                      flipped=self.flipped != (np.linalg.det(bound.T) < 0),
+                      tol=self.tol,
+                      )
@@ -0,0 +1,204 @@
+import contextlib
+import io
+import json
+import os
+
+import numpy as np
+import pytest
+
+from src.polyhedra import ConvexPolyhderon
+from src.shape_creation import Tetrahedron, Cube, Icosahedron, Dodecahedron
+
+# cut loci of the original implementation, for p=0 on face 0 with no diameter
+with open(os.path.join(os.path.dirname(__file__), 'data', 'cut_loci_p0.json')) as f:
+    CUT_LOCI_P0 = json.load(f)
+
+SHAPES = {'Tetrahedron': Tetrahedron,
+          'Cube': Cube,
+          'Icosahedron': Icosahedron,
+          'Dodecahedron': Dodecahedron,
+          }
+
+
+def make_shape(name, **attrs):
+    """
+    :param name: key of SHAPES
+    :param attrs: feature flags to set on the shape
+    :return: ConvexPolyhderon
+    """
+    shape = SHAPES[name]()
+    for attr, value in attrs.items():
+        setattr(shape, attr, value)
+    return shape
+
+
+def irregular_tetrahedron():
+    """
+    tetrahedron with no two edges of the same length, so it has no symmetries
+        each face is a triangle in coordinates centered on its centroid, glued to its neighbors along shared edges
+    :return: ConvexPolyhderon
+    """
+    V = np.array([[0., 0., 0.], [1.3, 0., 0.], [.4, 1.1, 0.], [.3, .5, .9]])
+    triangles = [(0, 2, 1), (0, 1, 3), (1, 2, 3), (0, 3, 2)]  # counterclockwise seen from outside
+    shape = ConvexPolyhderon(tolerance=.001)
+    corners = []  # vertex index -> column vector in coordinates of each face
+    for tri in triangles:
+        P = V[list(tri)]
+        center = P.mean(axis=0)
+        e1 = (P[1] - P[0])/np.linalg.norm(P[1] - P[0])
+        normal = np.cross(P[1] - P[0], P[2] - P[0])
+        e2 = np.cross(normal/np.linalg.norm(normal), e1)
+        corners.append({v: np.array([[(V[v] - center)@e1], [(V[v] - center)@e2]]) for v in tri})
+        shape.add_face()
+    for i, tri in enumerate(triangles):
+        for j in range(i + 1, len(triangles)):
+            for k in range(3):
+                u, v = tri[k], tri[(k + 1)%3]
+                if u not in corners[j] or v not in corners[j]:
+                    continue
+                # the gluing is the rotation sending the edge on face i to the same edge on face j
+                a, b = corners[i][u], corners[i][v]
+                d, d_j = (b - a).flatten(), (corners[j][v] - corners[j][u]).flatten()
+                angle = np.arctan2(d_j[1], d_j[0]) - np.arctan2(d[1], d[0])
+                R = np.array([[np.cos(angle), -np.sin(angle)], [np.sin(angle), np.cos(angle)]])
+                m = np.array([[d[1], -d[0]]])
+                shape.faces[i].add_boundary_paired(shape.faces[j], m, (m@a)[0, 0], np.zeros((2, 1)), R,
+                                                   corners[j][u] - R@a)
+    return shape
+
+
+def cut_locus(shape, p, sink_fn, diameter=None, prune=False, source_fn=0):
+    """
+    :param prune: whether to prune face paths with windows
+    :param source_fn: face that p is on
+    :return: list of segments (a,b) of the cut locus on the sink face, longer than the rounding of CUT_LOCI_P0,
+        None if there is no cut locus
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        voronoi_diagram = shape.get_voronoi_diagram(np.reshape(p, (2, 1)), source_fn, sink_fn, diameter, prune_face_paths=prune)
+    if voronoi_diagram is None:
+        return None
+    return [(np.ravel(a), np.ravel(b)) for (_, (a, b)) in voronoi_diagram[0].values()
+            if np.linalg.norm(np.ravel(a) - np.ravel(b)) > 1e-3]
+
+
+def assert_same_segments(expected, actual, atol=1e-4):
+    """
+    checks that two lists of segments are the same, up to order and direction of segments
+    """
+    if expected is None or actual is None:
+        assert expected is None and actual is None, (expected, actual)
+        return
+    expected = [(np.array(a), np.array(b)) for (a, b) in expected if np.linalg.norm(np.subtract(a, b)) > 1e-3]
+    unmatched = list(actual)
+    for a, b in expected:
+        for i, (c, d) in enumerate(unmatched):
+            if (np.allclose(a, c, atol=atol) and np.allclose(b, d, atol=atol) or
+                    np.allclose(a, d, atol=atol) and np.allclose(b, c, atol=atol)):
+                unmatched.pop(i)
+                break
+        else:
+            raise AssertionError('missing segment {} (got {})'.format((a, b), actual))
+    assert not unmatched, 'extra segments {}'.format(unmatched)
+
+
+@pytest.mark.parametrize('name', ['Icosahedron', 'Dodecahedron'])
+def test_cut_locus_p0(name):
+    shape = make_shape(name)
+    for sink_fn in shape.faces:
+        assert_same_segments(CUT_LOCI_P0[name][str(sink_fn)], cut_locus(shape, np.zeros(2), sink_fn))
+
+
+@pytest.mark.parametrize('name', ['Tetrahedron', 'Cube'])
+def test_clipped_cells_p0(name):
+    # bisectors on the edges of these faces must still give ridges
+    shape = make_shape(name, clip_cells=True)
+    for sink_fn in shape.faces:
+        assert_same_segments(CUT_LOCI_P0[name][str(sink_fn)], cut_locus(shape, np.zeros(2), sink_fn))
+
+
+@pytest.mark.parametrize('p', [(0., 0.), (.13, -.21), (.3, .1)])
+def test_streamed_points(p):
+    shape = make_shape('Dodecahedron')
+    streamed = make_shape('Dodecahedron', stream_points=True)
+    for sink_fn in shape.faces:
+        assert_same_segments(cut_locus(shape, p, sink_fn), cut_locus(streamed, p, sink_fn))
+
+
+@pytest.mark.parametrize('name', ['Tetrahedron', 'Cube', 'Icosahedron', 'Dodecahedron'])
+def test_reused_structure(name):
+    # p moves a little each time, so later cut loci come from the structure of the last one
+    reused = make_shape(name, reuse_structure=True)
+    for p in [(.1, .2), (.11, .2), (.12, .21), (.13, -.21)]:
+        shape = make_shape(name)
+        for sink_fn in shape.faces:
+            assert_same_segments(cut_locus(shape, p, sink_fn), cut_locus(reused, p, sink_fn))
+
+
+@pytest.mark.parametrize('p, sink_fn', [((.13, -.21), 9), ((.3, .1), 6)])
+def test_warm_started_filter(p, sink_fn):
+    # the filter starts from the copies needed for p=0
+    shape = make_shape('Dodecahedron')
+    warm = make_shape('Dodecahedron', warm_start_filter=True)
+    cut_locus(warm, (0., 0.), sink_fn)
+    assert_same_segments(cut_locus(shape, p, sink_fn), cut_locus(warm, p, sink_fn))
+
+
+@pytest.mark.parametrize('p', [(.05, .02), (.13, -.21), (.3, .1)])
+def test_pruned_face_paths(p):
+    # near p=(.05,.02), some geodesics to face 6 pass within tolerance of a vertex
+    shape = make_shape('Dodecahedron')
+    for sink_fn in shape.faces:
+        assert_same_segments(cut_locus(shape, p, sink_fn, diameter=5), cut_locus(shape, p, sink_fn, diameter=5, prune=True))
+
+
+def test_warm_started_filter_on_mapped_tables():
+    # the translation tables of face 0 are made again from those of face 1, which number the paths differently,
+    #   so the same copies must still give the same hint
+    shape = make_shape('Cube')
+    warm = make_shape('Cube', warm_start_filter=True, use_symmetry=True)
+    p, sink_fn = (.1, .2), 3
+    cut_locus(warm, p, sink_fn)
+    hints = {key: set(hint) for key, hint in warm.filter_hints.items()}
+    warm.memoized_face_translations.clear()
+    warm.memoized_voronoi_diagrams.clear()
+    warm.get_voronoi_translations(1, 1)
+    assert_same_segments(cut_locus(shape, p, sink_fn), cut_locus(warm, p, sink_fn))
+    assert warm.filter_hints == hints
+
+
+@pytest.mark.parametrize('name, source_fn', [('Cube', 4), ('Icosahedron', 7)])
+def test_symmetry(name, source_fn):
+    # the source face is not the representative of its orbit, so every cut locus is mapped from face 0
+    shape = make_shape(name)
+    symmetric = make_shape(name, use_symmetry=True)
+    for sink_fn in shape.faces:
+        assert_same_segments(cut_locus(shape, (.13, -.21), sink_fn, source_fn=source_fn),
+                             cut_locus(symmetric, (.13, -.21), sink_fn, source_fn=source_fn))
+    assert {key[0] for key in symmetric.memoized_face_translations.keys()} == {0}
+
+
+def test_symmetry_of_irregular_shape():
+    shape = irregular_tetrahedron()
+    symmetric = irregular_tetrahedron()
+    symmetric.use_symmetry = True
+    assert symmetric.get_face_orbits() == {fn: [fn] for fn in shape.faces}
+    for source_fn in shape.faces:
+        for sink_fn in shape.faces:
+            assert_same_segments(cut_locus(shape, (.05, .02), sink_fn, source_fn=source_fn),
+                                 cut_locus(symmetric, (.05, .02), sink_fn, source_fn=source_fn))
+
+
+def test_diagram_cache_flags():
+    # every feature flag is part of the key of a cut locus, so turning one on computes it again
+    shape = make_shape('Cube')
+    cut_locus(shape, (.1, .2), 3)
+    for flag in ['use_symmetry', 'stream_points', 'clip_cells', 'reuse_structure', 'warm_start_filter']:
+        misses = shape.memoized_voronoi_diagrams.misses
+        setattr(shape, flag, True)
+        cut_locus(shape, (.1, .2), 3)
+        setattr(shape, flag, False)
+        assert shape.memoized_voronoi_diagrams.misses > misses, flag
+    hits = shape.memoized_voronoi_diagrams.hits
+    cut_locus(shape, (.1, .2), 3)
+    assert shape.memoized_voronoi_diagrams.hits == hits + 1
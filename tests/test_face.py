@@ -0,0 +1,43 @@
+import itertools
+
+import numpy as np
+
+from src.face import Face
+from src.shape_creation import Prism, Dodecahedron, LargeNTorus
+
+
+def brute_force_vertices(face):
+    """
+    vertices of a face from every set of face.dimension bounds, as the fallback of Face._create_vertices
+    :return: dict of (indices of bounds -> vertex)
+    """
+    vertices = dict()
+    for rows in itertools.combinations(range(len(face.bounds)), face.dimension):
+        sub_M = face.bound_M[rows, :]
+        if abs(np.linalg.det(sub_M)) > face.tol:
+            vertex = np.linalg.solve(sub_M, face.bound_b[rows, :])
+            if face.within_bounds(vertex):
+                vertices[rows] = vertex
+    return vertices
+
+
+def test_intersect_halfspaces():
+    for shape in (Prism(7), Dodecahedron(), LargeNTorus(3)):
+        for face in shape.faces.values():
+            face.get_vertices()
+            vertices = face._intersect_halfspaces()
+            assert vertices is not None
+            expected = brute_force_vertices(face)
+            assert sorted(rows for (_, rows) in vertices) == sorted(expected)
+            for vertex, rows in vertices:
+                assert np.allclose(vertex, expected[rows])
+
+
+def test_intersect_unbounded():
+    # a strip, which has no vertices and is not bounded
+    shape = Prism(3)
+    face = Face('strip', tolerance=shape.tol)
+    face.add_boundary(shape.faces[0].bounds[0][0], shape.faces[1])
+    face.add_boundary(shape.faces[0].bounds[1][0], shape.faces[2])
+    face._create_bound_arrays()
+    assert face._intersect_halfspaces() is None
@@ -0,0 +1,43 @@
+import numpy as np
+
+from scipy.spatial import Voronoi
+
+from src.my_vornoi import StreamingVoronoi, voronoi_ridges
+from src.shapes import far_points
+
+
+def assert_same_diagram(diagram):
+    """
+    checks that the ridges of a StreamingVoronoi are those of a qhull diagram of its active points
+    """
+    idx = np.flatnonzero(diagram.active)
+    expected = {frozenset((idx[i], idx[j])): ridge
+                for (i, j), ridge in voronoi_ridges(Voronoi(diagram.points[idx])).items()}
+    actual = {frozenset(pair): ridge for pair, ridge in diagram.ridges.items()}
+    assert set(expected) == set(actual)
+    for pair, (seg_type, (a, b)) in expected.items():
+        other_type, (c, d) = actual[pair]
+        assert seg_type == other_type
+        if seg_type == 'segment' and not np.allclose(a, c, atol=1e-6):
+            c, d = d, c
+        assert np.allclose(a, c, atol=1e-6) and np.allclose(b, d, atol=1e-6)
+
+
+def test_streamed_diagram():
+    rng = np.random.default_rng(0)
+    far = far_points([np.zeros((2, 1))])
+    diagram = StreamingVoronoi(np.concatenate(far, axis=1).T)
+    for n in [1, 4, 16, 64]:
+        idxs, changed = diagram.add_points(rng.normal(size=(n, 2)))
+        assert set(idxs.tolist()) <= changed
+        assert_same_diagram(diagram)
+        diagram.remove_points(rng.choice(idxs, size=n//2, replace=False))
+        assert_same_diagram(diagram)
+
+
+def test_remove_from_small_neighborhood():
+    # the points around the removed one are too few for qhull, so the whole diagram is rebuilt
+    diagram = StreamingVoronoi(np.array([[2., 3.], [1., 3.], [1., 3.], [0., 1.]]))
+    changed = diagram.remove_points([1])
+    assert changed == {0, 2, 3}
+    assert_same_diagram(diagram)
@@ -0,0 +1,17 @@
+from src.path_trie import PathTrie, bound_path_key
+from src.shape_creation import Cube
+
+
+def test_bound_path_key():
+    # the same paths from a search, from a trie mapped from a symmetric face, and from a saved trie
+    shape = Cube()
+    source = shape.faces[1]
+    trie, _ = shape.get_path_trie(1, diameter=3)
+    mapped = shape.get_automorphism(0, 1).map_trie(shape.get_path_trie(0, diameter=3)[0], shape.faces)
+    loaded = PathTrie.from_arrays(shape.faces, trie.to_arrays(shape.faces))
+    keys = [bound_path_key(trie.bound_path(node), source) for node in range(len(trie))]
+    assert len(set(keys)) == len(trie)
+    assert set(keys) == {bound_path_key(mapped.bound_path(node), source) for node in range(len(mapped))}
+    for node, key in enumerate(keys):
+        assert bound_path_key(loaded.bound_path(node), source) == key
+        assert bound_path_key(list(trie.bound_path(node)), source) == key
@@ -0,0 +1,15 @@
+import numpy as np
+
+from src.precompute import _to_shared, _from_shared
+
+
+def test_shared_round_trip():
+    arrays = {'root': np.array(3),
+              'empty': np.zeros(0, dtype=int),
+              'strided': np.arange(12.).reshape((3, 4)).T,
+              }
+    out = _from_shared(_to_shared(arrays))
+    assert out.keys() == arrays.keys()
+    for name, arr in arrays.items():
+        assert out[name].shape == arr.shape and out[name].dtype == arr.dtype, name
+        assert np.array_equal(out[name], arr), name
@@ -0,0 +1,43 @@
+from fractions import Fraction
+
+import numpy as np
+
+from src.predicates import halfspaces_contain, orientation
+
+
+def exact_orientation(a, b, c):
+    a, b, c = ([Fraction(x) for x in v] for v in (a, b, c))
+    det = (b[0] - a[0])*(c[1] - a[1]) - (b[1] - a[1])*(c[0] - a[0])
+    return (det > 0) - (det < 0)
+
+
+def test_orientation():
+    # points within a few ulps of the line through (.5,.5) and (12,12), where the float determinant is often wrong
+    rng = np.random.default_rng(0)
+    N = 200
+    A = np.tile([.5, .5], (N, 1))
+    B = np.tile([12., 12.], (N, 1))
+    t = rng.uniform(0, 24, N)
+    C = np.stack((t, np.nextafter(t, t + rng.choice([-1, 0, 1], N))), axis=1)
+    C[:10] = np.stack((np.arange(10.), np.arange(10.)), axis=1)  # exactly on the line
+    out = orientation(A, B, C)
+    assert list(out) == [exact_orientation(a, b, c) for a, b, c in zip(A, B, C)]
+    assert np.all(out[:10] == 0)
+    # the same answer for each point on its own
+    assert all(orientation(A[[n]], B[[n]], C[[n]])[0] == out[n] for n in range(N))
+
+
+def test_halfspaces_contain():
+    rng = np.random.default_rng(1)
+    M = rng.normal(size=(4, 2))
+    b = rng.normal(size=4)
+    # points on the first line, a few ulps off it
+    x = rng.uniform(-3, 3, 100)
+    y = (b[0] - M[0, 0]*x)/M[0, 1]
+    P = np.stack((x, np.nextafter(y, y + rng.choice([-1, 1], 100))), axis=1)
+    for slack in (0., 1e-3):
+        out = halfspaces_contain(P, M, b, slack=slack)
+        expected = [[sum(Fraction(m)*Fraction(p) for m, p in zip(M[k], P[n])) <= Fraction(b[k]) + Fraction(slack)
+                     for k in range(len(M))] for n in range(len(P))]
+        assert out.tolist() == expected
+        assert all(np.array_equal(halfspaces_contain(P[[n]], M, b, slack=slack)[0], out[n]) for n in range(len(P)))
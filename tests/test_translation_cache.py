@@ -0,0 +1,94 @@
+import numpy as np
+
+from src.path_trie import bound_path_key
+from src.shape_creation import Cube, Dodecahedron
+from src.translation_cache import TranslationCache
+
+
+def test_save_and_load(tmp_path):
+    shape = Cube()
+    for source_fn in shape.faces:
+        shape.get_voronoi_translations(source_fn, 0, diameter=3, max_dist=4.)
+    filename = shape.save_translation_cache(str(tmp_path))
+
+    loaded = Cube()
+    assert loaded.translation_cache_file(str(tmp_path)) == filename
+    assert loaded.load_translation_cache(str(tmp_path)) == len(shape.memoized_face_translations)
+    assert set(loaded.memoized_face_translations.keys()) == set(shape.memoized_face_translations.keys())
+    for (source_fn, sink_fn, diameter, prune, max_dist) in list(shape.memoized_face_translations.keys()):
+        expected = shape.get_voronoi_translations(source_fn, sink_fn, diameter=diameter, prune=prune, max_dist=max_dist)
+        actual = loaded.get_voronoi_translations(source_fn, sink_fn, diameter=diameter, prune=prune, max_dist=max_dist)
+        assert len(expected) == len(actual)
+        for (T, s, paths), (T_loaded, s_loaded, paths_loaded) in zip(expected, actual):
+            assert np.array_equal(T, T_loaded) and np.array_equal(s, s_loaded)
+            assert ([bound_path_key(pth, shape.faces[source_fn]) for pth in paths] ==
+                    [bound_path_key(pth, loaded.faces[source_fn]) for pth in paths_loaded])
+
+
+def test_load_other_shape(tmp_path):
+    # a shape with other faces or tolerance has another fingerprint, so it does not load the file
+    shape = Cube()
+    shape.get_voronoi_translations(0, 0, diameter=3)
+    shape.save_translation_cache(str(tmp_path))
+    assert Cube(tolerance=.002).load_translation_cache(str(tmp_path)) == 0
+    assert Dodecahedron().load_translation_cache(str(tmp_path)) == 0
+
+
+def tables(shape, source_fn):
+    """
+    :return: dict of (memo key -> (PathTrie, groups)) for every sink face, sharing one PathTrie
+    """
+    trie, sink_nodes = shape.get_path_trie(source_fn, diameter=3)
+    return {(source_fn, fn, 3, False, None): (trie, trie.canonical_groups(nodes, tol=shape.tol))
+            for fn, nodes in sink_nodes.items()}
+
+
+def test_byte_accounting():
+    shape = Cube()
+    cache = TranslationCache(max_bytes=None)
+    values = tables(shape, 0)
+    trie, _ = next(iter(values.values()))
+    for key, value in values.items():
+        cache[key] = value
+    # the trie is counted once
+    assert cache.stats()['tries'] == 1
+    assert cache.nbytes == trie.nbytes() + sum(group.nbytes for (_, groups) in values.values() for group in groups)
+    for key in values:
+        del cache[key]
+    assert cache.nbytes == 0 and cache.stats()['tries'] == 0
+
+
+def test_eviction():
+    shape = Cube()
+    values = tables(shape, 0)
+    keys = list(values)
+    trie, _ = values[keys[0]]
+    total = trie.nbytes() + sum(group.nbytes for (_, groups) in values.values() for group in groups)
+    # one byte short of every key
+    cache = TranslationCache(max_bytes=total - 1)
+    for key in keys[:-1]:
+        cache[key] = values[key]
+    assert cache.evictions == 0
+    # the first key is used again, so the second is the least recently used
+    assert cache.lookup(keys[0]) is not None
+    cache[keys[-1]] = values[keys[-1]]
+    assert cache.evictions == 1
+    assert keys[1] not in cache and all(key in cache for key in keys if key != keys[1])
+    assert cache.nbytes == total - sum(group.nbytes for group in values[keys[1]][1])
+    # a second trie does not fit with the first, so every key of the first is evicted
+    key, value = next(iter(tables(shape, 1).items()))
+    cache[key] = value
+    assert list(cache) == [key] and cache.stats()['tries'] == 1
+    assert cache.lookup(keys[0]) is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_invalidation():
+    cache = TranslationCache()
+    assert cache.validate('faces')
+    for key, value in tables(Cube(), 0).items():
+        cache[key] = value
+    assert not cache.validate('faces')
+    assert len(cache)
+    assert cache.validate('other faces')
+    assert len(cache) == 0 and cache.nbytes == 0 and cache.invalidations == 1
@@ -26,6 +26,15 @@ display_group.add_argument("--point-names", action='store', nargs='*', required=
 
 args = parse_args(PARSER)
 shape = shape_from_args(args)
+shape.use_symmetry = args.symmetry
+shape.stream_points = args.stream_points
+shape.clip_cells = args.clip_cells
+shape.reuse_structure = args.reuse_structure
+shape.warm_start_filter = args.warm_start
+shape.memoized_face_translations.max_bytes = None if args.cache_mb <= 0 else args.cache_mb*2**20
+shape.memoized_voronoi_diagrams.max_entries = None if args.diagram_cache_size <= 0 else args.diagram_cache_size
+if args.cache_dir is not None:
+    shape.load_translation_cache(args.cache_dir)
 point_names = args.point_names
 
 source_fn_p = get_source_fn_p_from_args(args, shape)
@@ -57,4 +66,9 @@ shape.interactive_unfold(track=not args.no_tracking,
                          point_names=point_names,
                          voronoi_star=args.voronoi_star,
                          ignore_points_on_locus=args.ignore_points,
+                         prune_face_paths=args.prune_paths,
+                         bound_distance=args.bound_distance,
+                         auto_diameter=args.auto_diameter,
                          )
+if args.cache_dir is not None:
+    shape.save_translation_cache(args.cache_dir)
@@ -131,6 +131,38 @@ PARSER.add_argument("--diameter", type=int, required=False, default=-1,
 PARSER.add_argument("--no-filter", action='store_true', required=False,
                     help="Turn off filter on points of voronoi complex. " +
                          "This should fix tolerance errors, but may result in invalid points (might want to check with --single-display)")
+PARSER.add_argument("--prune-paths", action='store_true', required=False,
+                    help="skip paths of faces that no straight line can pass through, " +
+                         "faster for large diameters on shapes like the dodecahedron")
+PARSER.add_argument("--bound-distance", action='store_true', required=False,
+                    help="skip paths of faces that are longer than an upper bound on geodesic distance, " +
+                         "makes the default (infinite) diameter usable on larger shapes")
+PARSER.add_argument("--auto-diameter", action='store_true', required=False,
+                    help="increase diameter until longer paths of faces provably cannot change the cut locus, " +
+                         "prints the diameter it settles on (--diameter is then a cap)")
+PARSER.add_argument("--symmetry", action='store_true', required=False,
+                    help="compute cut loci only on one face of each class of symmetric faces, " +
+                         "and map them to the rest (faster on shapes like prisms and platonic solids)")
+PARSER.add_argument("--stream-points", action='store_true', required=False,
+                    help="add copies of the point to the voronoi diagram closest first, " +
+                         "and stop once farther copies provably cannot change the cut locus")
+PARSER.add_argument("--clip-cells", action='store_true', required=False,
+                    help="compute the cell of each copy of the point inside the sink face directly, " +
+                         "instead of building the voronoi diagram of every copy")
+PARSER.add_argument("--reuse-structure", action='store_true', required=False,
+                    help="when the point moves, first check whether the copies and edges of the last cut locus " +
+                         "are still right, and only filter every copy again if they are not")
+PARSER.add_argument("--warm-start", action='store_true', required=False,
+                    help="filter the copies of the point kept for the last point first, " +
+                         "and only filter every copy if they do not cover the sink face")
+PARSER.add_argument("--cache-dir", action='store', required=False, default=None,
+                    help="directory to cache paths of faces in, so later runs on the same shape start faster")
+PARSER.add_argument("--cache-mb", type=float, required=False, default=1024,
+                    help="memory budget in MB for paths of faces kept in memory, " +
+                         "least recently used ones are dropped past this (0 for no limit)")
+PARSER.add_argument("--diagram-cache-size", type=int, required=False, default=1024,
+                    help="number of cut loci kept in memory, so views of the same point are not recomputed, " +
+                         "least recently used ones are dropped past this (0 for no limit)")
 PARSER.add_argument("--tolerance", type=float, required=False, default=None,
                     help="tolerance for things like intersection and containment, default differs for each shape")
 